@@ -0,0 +1,50 @@
+import sys
+import json
+import argparse
+
+def change(old, new) -> str:
+    if old is None or new is None:
+        return '-'
+    if not old:
+        return f"{new}"
+    return f"{new} ({(new - old) / old * 100:+.1f}%)"
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    """Напечатать разницу двух отчетов run.py; вернуть число ухудшений больше threshold процентов"""
+    print(f"{old.get('git_commit')} ({old['started_at']}) -> {new.get('git_commit')} ({new['started_at']})")
+    regressions = 0
+
+    if 'ingest' in old and 'ingest' in new:
+        print(f"\nзагрузка, строк/с: {old['ingest']['rows_per_sec']} -> "
+              f"{change(old['ingest']['rows_per_sec'], new['ingest']['rows_per_sec'])}")
+        if new['ingest']['rows_per_sec'] < old['ingest']['rows_per_sec'] * (1 - threshold / 100):
+            regressions += 1
+
+    print(f"\n{'семейство':<22}{'метрика':<10}{'было, мс':>12}  стало, мс")
+    rows = [('все', 'answers', old['answers'], new['answers'])]
+    for section, old_families, new_families in [
+        ('answers', old['answers']['families'], new['answers']['families']),
+        ('db', old.get('db', {}), new.get('db', {})),
+    ]:
+        rows.extend((family, section, old_families[family], new_families[family])
+                    for family in new_families if family in old_families)
+
+    for family, section, old_stats, new_stats in rows:
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            before, after = old_stats.get(metric), new_stats.get(metric)
+            label = metric[:-3] if section == 'answers' else f"db {metric[:-3]}"
+            print(f"{family:<22}{label:<10}{str(before):>12}  {change(before, after)}")
+            if before and after and after > before * (1 + threshold / 100):
+                regressions += 1
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Сравнить два JSON-отчета бенчмарка")
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help="ухудшение, %%, после которого код выхода 1")
+    args = parser.parse_args()
+    with open(args.old, encoding='utf-8') as f_old, open(args.new, encoding='utf-8') as f_new:
+        regressions = compare(json.load(f_old), json.load(f_new), args.threshold)
+    print(f"\nУхудшений больше {args.threshold}%: {regressions}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,99 @@
+import os
+import json
+import uuid
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+def creator_weights(creators: int, skew: float):
+    """Доли креаторов по закону Ципфа: у первых креаторов большая часть видео"""
+    return list(accumulate(1 / (rank ** skew) for rank in range(1, creators + 1)))
+
+def generate_video(rng: random.Random, video_id: str, creator_id: str, published: datetime,
+                   snapshots: int, popularity: float) -> dict:
+    """Видео и его почасовые снапшоты с накопленными счетчиками и приращениями"""
+    totals = {'views': 0, 'likes': 0, 'comments': 0, 'reports': 0}
+    rate = rng.lognormvariate(3, 1.5) * popularity
+    records = []
+    moment = published
+    for j in range(snapshots):
+        moment = published + timedelta(hours=j + 1)
+        delta_views = int(rate * rng.uniform(0, 2))
+        delta_likes = int(delta_views * rng.uniform(0.02, 0.15))
+        delta = {
+            'views': delta_views,
+            'likes': delta_likes,
+            'comments': int(delta_likes * rng.uniform(0, 0.3)),
+            'reports': 1 if rng.random() < 0.002 else 0,
+        }
+        for metric in totals:
+            totals[metric] += delta[metric]
+        # Интерес к видео со временем угасает
+        rate *= 0.97
+        stamp = moment.isoformat()
+        records.append({
+            'id': uuid.UUID(int=rng.getrandbits(128)).hex,
+            'video_id': video_id,
+            **{f"{metric}_count": totals[metric] for metric in totals},
+            **{f"delta_{metric}_count": delta[metric] for metric in totals},
+            'created_at': stamp,
+            'updated_at': stamp,
+        })
+    return {
+        'id': video_id,
+        'creator_id': creator_id,
+        'video_created_at': published.isoformat(),
+        **{f"{metric}_count": totals[metric] for metric in totals},
+        'created_at': published.isoformat(),
+        'updated_at': moment.isoformat(),
+        'snapshots': records,
+    }
+
+def generate(path: str, videos: int, snapshots: int, creators: int = 100, skew: float = 1.1,
+             days: int = 28, start: str = '2025-11-01', seed: int = 42) -> dict:
+    """Записать синтетический дамп в формате videos_data.json (потоково, без сборки в памяти)
+
+    snapshots - всего снапшотов; они делятся между видео поровну. Одинаковый seed дает
+    одинаковый файл, поэтому прогоны на нем можно сравнивать.
+    """
+    rng = random.Random(seed)
+    creator_ids = [uuid.UUID(int=rng.getrandbits(128)).hex for _ in range(creators)]
+    weights = creator_weights(creators, skew)
+    # Популярность креатора тоже неравномерна
+    popularity = {creator_id: rng.lognormvariate(0, 1) for creator_id in creator_ids}
+    first_day = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
+    per_video, remainder = divmod(snapshots, videos)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"videos": [')
+        for i in range(videos):
+            creator_id = rng.choices(creator_ids, cum_weights=weights)[0]
+            published = first_day + timedelta(days=rng.randrange(days), hours=rng.randrange(24),
+                                              minutes=rng.randrange(60), seconds=rng.randrange(60))
+            video = generate_video(
+                rng, uuid.UUID(int=rng.getrandbits(128)).hex, creator_id, published,
+                per_video + (1 if i < remainder else 0), popularity[creator_id]
+            )
+            if i:
+                f.write(',\n')
+            f.write(json.dumps(video, ensure_ascii=False))
+        f.write(']}\n')
+
+    print(f"✅ Сгенерировано {videos} видео и {snapshots} снапшотов ({creators} креаторов): {path}")
+    return {'videos': videos, 'snapshots': snapshots, 'creators': creators, 'skew': skew,
+            'days': days, 'start': start, 'seed': seed}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Синтетический videos_data.json для бенчмарков")
+    parser.add_argument('out', nargs='?', default='data/bench_videos_data.json')
+    parser.add_argument('--videos', type=int, default=1000)
+    parser.add_argument('--snapshots', type=int, default=100000, help="всего снапшотов")
+    parser.add_argument('--creators', type=int, default=100)
+    parser.add_argument('--skew', type=float, default=1.1, help="показатель Ципфа для видео по креаторам")
+    parser.add_argument('--days', type=int, default=28, help="публикации в пределах стольких дней")
+    parser.add_argument('--start', default='2025-11-01')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    generate(args.out, args.videos, args.snapshots, args.creators, args.skew, args.days, args.start, args.seed)
@@ -0,0 +1,74 @@
+import time
+import random
+import asyncio
+from typing import Optional
+from aiohttp import web
+from nlp.fast_path import RuleBasedCompiler
+from nlp.query_spec import QuerySpec
+from nlp.prompt_builder import estimate_tokens
+
+# Ответ на вопросы, которые не разбирают и правила
+DEFAULT_SPEC = QuerySpec(aggregation='count')
+
+class StubLLM:
+    """Локальная замена Mistral API (POST /v1/chat/completions) для бенчмарков
+
+    Структуру вопроса (JSON QuerySpec) строят правила быстрого пути без порога
+    уверенности, так что ответ выполним и зависит от вопроса. Задержка и доля ошибок 429 задаются, чтобы
+    имитировать сеть и лимиты, не обращаясь к настоящему API.
+    """
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, error_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.compiler = RuleBasedCompiler(min_confidence=0)
+        self.stats = {"requests": 0, "errors": 0}
+        self._runner: Optional[web.AppRunner] = None
+
+    def answer(self, question: str) -> str:
+        compiled = self.compiler.compile(question)
+        return (compiled.spec if compiled else DEFAULT_SPEC).to_json()
+
+    async def _completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.stats["requests"] += 1
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        if self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"error": {"message": "rate limited"}}, status=429)
+
+        question = next((m["content"] for m in reversed(body["messages"]) if m["role"] == "user"), "")
+        answer = self.answer(question)
+        # Размер промпта - той же оценкой, что и у сборщика промптов (токенизатора модели здесь нет)
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in body["messages"])
+        return web.json_response({
+            "id": f"stub-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": answer},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": estimate_tokens(answer),
+                "total_tokens": prompt_tokens + estimate_tokens(answer),
+            },
+        })
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> str:
+        """Запустить сервер; вернуть base URL для MISTRAL_BASE_URL"""
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
@@ -0,0 +1,155 @@
+import time
+import random
+import asyncio
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, Tuple, Callable, Awaitable
+from sqlalchemy import text
+from nlp.translation_cache import MONTHS_BY_NUMBER
+
+# Семейства типовых вопросов: шаблон и доля в смеси
+FAMILIES = {
+    'total_videos': ("Сколько всего видео есть в системе?", 1),
+    'creator_period': ("Сколько видео у креатора с id {creator} вышло {period}?", 3),
+    'views_threshold': ("Сколько видео набрало больше {threshold} просмотров?", 2),
+    'delta_day': ("На сколько {metric} в сумме выросли все видео {day}?", 3),
+    'creator_delta_period': ("На сколько {metric} выросли видео креатора с id {creator} {period}?", 2),
+    'distinct_new_day': ("Сколько разных видео получали новые {metric} {day}?", 2),
+    'as_of_threshold': ("Сколько видео имели больше {threshold} {metric} на конец дня {day}?", 1),
+    'top_creators_delta': ("Топ 10 креаторов по приросту {metric} {period}", 1),
+    # Правила их не разбирают - вопросы уходят в LLM (в бенчмарке - в заглушку)
+    'llm_average': ("Какое среднее число {metric} у видео креатора с id {creator}?", 1),
+    'llm_top': ("Какой креатор набрал больше всего {metric} {day}?", 1),
+}
+METRIC_WORDS = ('просмотров', 'лайков', 'комментариев')
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+class FakeMessage:
+    """Минимальная замена aiogram Message: текст, отправитель и ответы бота"""
+
+    def __init__(self, text: str, user_id: int):
+        self.text = text
+        self.from_user = FakeUser(user_id)
+        self.chat = FakeChat(user_id)
+        self.answers = []
+
+    async def answer(self, text: str, **kwargs):
+        self.answers.append(text)
+
+    async def answer_document(self, document, **kwargs):
+        self.answers.append(document)
+
+def format_day(day: date) -> str:
+    return f"{day.day} {MONTHS_BY_NUMBER[day.month - 1]} {day.year}"
+
+def format_period(start: date, end: date) -> str:
+    return f"с {start.day} по {end.day} {MONTHS_BY_NUMBER[end.month - 1]} {end.year}"
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 (ближайший ранг) и среднее, в миллисекундах"""
+    if not values:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))] * 1000, 3)
+
+    return {
+        'p50_ms': rank(0.50),
+        'p95_ms': rank(0.95),
+        'p99_ms': rank(0.99),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+async def load_scenario_data(session_factory) -> Dict[str, list]:
+    """Креаторы и дни из загруженных данных - вопросы задаются про то, что есть в базе"""
+    async with session_factory() as session:
+        creators = (await session.execute(text(
+            "SELECT creator_id FROM videos GROUP BY creator_id ORDER BY COUNT(*) DESC, creator_id LIMIT 50"
+        ))).scalars().all()
+        days = (await session.execute(text(
+            "SELECT DISTINCT DATE(created_at) FROM video_snapshots ORDER BY 1"
+        ))).scalars().all()
+    if not creators or not days:
+        raise RuntimeError("В базе нет данных для бенчмарка - сначала загрузите дамп")
+    return {'creators': list(creators), 'days': list(days)}
+
+def build_questions(data: Dict[str, list], count: int, seed: int = 42) -> List[Tuple[str, str]]:
+    """Смесь вопросов (семейство, текст); одинаковый seed дает ту же последовательность"""
+    rng = random.Random(seed)
+    names = list(FAMILIES)
+    weights = [FAMILIES[name][1] for name in names]
+    questions = []
+    for family in rng.choices(names, weights=weights, k=count):
+        start = rng.choice(data['days'])
+        last_day = date(start.year, start.month, calendar.monthrange(start.year, start.month)[1])
+        end = min(start + timedelta(days=rng.randint(1, 6)), last_day)
+        questions.append((family, FAMILIES[family][0].format(
+            creator=rng.choice(data['creators'][:10] if rng.random() < 0.7 else data['creators']),
+            period=format_period(start, end),
+            day=format_day(start),
+            threshold=rng.choice((100, 1000, 10000, 100000)),
+            metric=rng.choice(METRIC_WORDS),
+        )))
+    return questions
+
+async def replay(handle: Callable[[FakeMessage], Awaitable], questions: List[Tuple[str, str]],
+                 concurrency: int = 8, users: int = 20) -> Dict[str, list]:
+    """Прогнать вопросы через обработчик бота в concurrency параллельных потоков
+
+    Возвращает времена ответа (секунды) и число ошибок по семействам.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, item in enumerate(questions):
+        queue.put_nowait((i, item))
+    latencies: Dict[str, List[float]] = {family: [] for family in FAMILIES}
+    errors: Dict[str, int] = {family: 0 for family in FAMILIES}
+
+    async def worker():
+        while not queue.empty():
+            i, (family, question) = queue.get_nowait()
+            message = FakeMessage(question, user_id=1000 + i % users)
+            started = time.perf_counter()
+            await handle(message)
+            latencies[family].append(time.perf_counter() - started)
+            # Ответ-число, таблица или файл - успех; текст с ❌/⛔ - ошибка
+            if not message.answers or isinstance(message.answers[-1], str) \
+                    and message.answers[-1].startswith(('❌', '⛔')):
+                errors[family] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {'latencies': latencies, 'errors': errors}
+
+async def measure_db(parser, session_factory, guard, questions: List[Tuple[str, str]],
+                     per_family: int = 20) -> Dict[str, List[float]]:
+    """Время выполнения SQL в базе по семействам (без кэша результатов, последовательно)"""
+    from database.crud import DatabaseManager
+    from database.guard import QueryRejected
+
+    timings: Dict[str, List[float]] = {family: [] for family in FAMILIES}
+    for family, question in questions:
+        if len(timings[family]) >= per_family:
+            continue
+        parsed = await parser.parse_query(question)
+        if parsed.sql is None:
+            continue
+        async with session_factory() as session:
+            started = time.perf_counter()
+            try:
+                db_manager = DatabaseManager(session, None, guard)
+                if parsed.spec and parsed.spec.group_by:
+                    async for _ in db_manager.stream_rows(parsed.sql, parsed.params):
+                        pass
+                else:
+                    await db_manager.execute_custom_query(parsed.sql, parsed.params)
+            except QueryRejected:
+                continue
+            timings[family].append(time.perf_counter() - started)
+    return timings
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+async def run(args) -> int:
+    """Ответы колоночного снимка против Postgres на одних и тех же вопросах; число расхождений"""
+    from benchmark.load import load_scenario_data, build_questions
+    from database.engine import get_engine, get_session_factory, dispose_engine
+    from database.columnar import ColumnarStore
+    from database.crud import DatabaseManager
+    from database.guard import QueryGuard
+    from nlp.fast_path import RuleBasedCompiler
+    from nlp.query_spec import compile_sql
+
+    engine = get_engine()
+    session_factory = get_session_factory()
+    compiler = RuleBasedCompiler(min_confidence=0)
+    guard = QueryGuard()
+    store = ColumnarStore(engine)
+    mismatches = 0
+    checked = {"db": 0.0, "columnar": 0.0, "questions": 0}
+    try:
+        await store.refresh()
+        data = await load_scenario_data(session_factory)
+        questions = build_questions(data, args.questions, args.seed)
+        # Креатор, которого нет в данных: колонки должны ответить нулем, как и база
+        questions.append(('unknown_creator', 'Сколько видео у креатора с id no-such-creator?'))
+
+        for family, question in questions:
+            compiled = compiler.compile(question)
+            if compiled is None:
+                continue
+            started = time.perf_counter()
+            expected = await store.execute(compiled.spec)
+            checked["columnar"] += time.perf_counter() - started
+            if expected is None:
+                continue
+            sql, params = compile_sql(compiled.spec)
+            async with session_factory() as session:
+                started = time.perf_counter()
+                actual = await DatabaseManager(session, None, guard).execute_custom_query(sql, params)
+                checked["db"] += time.perf_counter() - started
+            checked["questions"] += 1
+            if int(actual or 0) != expected:
+                mismatches += 1
+                print(f"❌ {family}: {question}\n   Postgres: {actual}, колонки: {expected}\n   SQL: {sql} {params}")
+    finally:
+        await store.close()
+        await dispose_engine()
+
+    print(f"📊 Проверено вопросов: {checked['questions']}, расхождений: {mismatches}, "
+          f"Postgres {checked['db']:.2f} с, колонки {checked['columnar']:.2f} с, снимок: {store.stats}")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка колоночного исполнителя с Postgres на текущих данных")
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    os.chdir(APP_DIR)
+    from dotenv import load_dotenv
+    load_dotenv(APP_DIR / '.env')
+
+    mismatches = asyncio.run(run(args))
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def ingest(path: str) -> dict:
+    """Загрузить дамп в пустую базу и замерить скорость"""
+    from database.engine import get_engine
+    from database.init_db import DatabaseInitializer
+    from database.parallel_ingest import ParallelIngestor
+    from database.models import Base
+
+    engine = get_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await DatabaseInitializer(engine).create_tables()
+
+    started = time.perf_counter()
+    stats = await ParallelIngestor(engine).load(path)
+    seconds = time.perf_counter() - started
+    return {
+        'videos': stats['videos'],
+        'snapshots': stats['snapshots'],
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round((stats['videos'] + stats['snapshots']) / seconds, 1),
+        'snapshots_per_sec': round(stats['snapshots'] / seconds, 1),
+    }
+
+async def run(args) -> dict:
+    from benchmark.generate import generate
+    from benchmark.llm_stub import StubLLM
+    from benchmark.load import load_scenario_data, build_questions, replay, measure_db, percentiles, FAMILIES
+    from database.engine import get_session_factory, dispose_engine
+    from database.result_cache import ResultCache
+    from database.guard import QueryGuard
+    from nlp.query_parser import NaturalLanguageParser
+    import main
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key != 'out'},
+    }
+
+    if args.regenerate or not os.path.exists(args.data):
+        report['dataset'] = generate(args.data, args.videos, args.snapshots, args.creators, args.skew, seed=args.seed)
+    else:
+        # Готовый дамп: параметры генерации к нему могут не относиться
+        report['dataset'] = {'reused': True}
+    report['dataset'].update(path=args.data, bytes=os.path.getsize(args.data))
+    if not args.skip_ingest:
+        report['ingest'] = await ingest(args.data)
+        print(f"📥 Загрузка: {report['ingest']['rows_per_sec']} строк/с")
+
+    stub = StubLLM(latency=args.llm_latency, error_rate=args.llm_error_rate, seed=args.seed)
+    await stub.start(port=args.stub_port)
+    session_factory = get_session_factory()
+    result_cache = None if args.no_result_cache else ResultCache.from_config()
+    guard = QueryGuard()
+    nlp_parser = NaturalLanguageParser()
+
+    try:
+        questions = build_questions(await load_scenario_data(session_factory), args.questions, args.seed)
+
+        async def handle(message):
+            await main.handle_text_query(message, session_factory, nlp_parser, result_cache, guard)
+
+        started = time.perf_counter()
+        answers = await replay(handle, questions, args.concurrency, args.users)
+        seconds = time.perf_counter() - started
+        db = await measure_db(nlp_parser, session_factory, guard, questions)
+
+        all_latencies = [value for values in answers['latencies'].values() for value in values]
+        report['answers'] = {
+            'questions': len(questions),
+            'seconds': round(seconds, 3),
+            'throughput_qps': round(len(questions) / seconds, 2),
+            'errors': sum(answers['errors'].values()),
+            **percentiles(all_latencies),
+            'families': {
+                family: {
+                    'count': len(answers['latencies'][family]),
+                    'errors': answers['errors'][family],
+                    **percentiles(answers['latencies'][family]),
+                }
+                for family in FAMILIES if answers['latencies'][family]
+            },
+        }
+        report['db'] = {family: {'count': len(values), **percentiles(values)} for family, values in db.items() if values}
+        report['sql_sources'] = {
+            'fast_path': nlp_parser.fast_path.stats['served'],
+            'translation_cache': nlp_parser.cache.stats['hits'] + nlp_parser.cache.stats['template_hits'],
+            **nlp_parser.stats,
+        }
+        report['llm'] = {**nlp_parser.llm_stats, 'stub': stub.stats}
+        if result_cache:
+            report['result_cache'] = result_cache.stats
+    finally:
+        await stub.stop()
+        await nlp_parser.close()
+        if result_cache:
+            await result_cache.close()
+        await dispose_engine()
+    return report
+
+def print_summary(report: dict):
+    answers = report['answers']
+    print(f"\n📊 {answers['questions']} вопросов за {answers['seconds']} с ({answers['throughput_qps']} в секунду), "
+          f"ошибок: {answers['errors']}")
+    print(f"{'семейство':<22}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'db p50':>10}{'db p95':>10}")
+    for family, stats in answers['families'].items():
+        db = report['db'].get(family, {})
+        print(f"{family:<22}{stats['count']:>6}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+              f"{str(db.get('p50_ms', '-')):>10}{str(db.get('p95_ms', '-')):>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк: синтетические данные, загрузка и ответы бота (мс)")
+    parser.add_argument('--data', default=str(APP_DIR / 'data/bench_videos_data.json'), help="дамп; создается, если его нет")
+    parser.add_argument('--regenerate', action='store_true', help="пересоздать дамп")
+    parser.add_argument('--videos', type=int, default=1000)
+    parser.add_argument('--snapshots', type=int, default=100000)
+    parser.add_argument('--creators', type=int, default=100)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--skip-ingest', action='store_true', help="не перезагружать базу, спрашивать о текущих данных")
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=20, help="разных отправителей вопросов")
+    parser.add_argument('--no-result-cache', action='store_true')
+    parser.add_argument('--llm-latency', type=float, default=0.3, help="задержка заглушки LLM, с")
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help="доля ответов 429 от заглушки")
+    parser.add_argument('--stub-port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=None, help="JSON-отчет (по умолчанию benchmark/results/<время>.json)")
+    args = parser.parse_args()
+    # Пути из командной строки - относительно текущего каталога, запуск - из каталога бота
+    args.data = os.path.abspath(args.data)
+    out = os.path.abspath(args.out or APP_DIR / f"benchmark/results/{datetime.now():%Y%m%d-%H%M%S}.json")
+
+    # Окружение читается конфигом при первом импорте: сначала .env, затем адрес заглушки вместо Mistral
+    os.chdir(APP_DIR)
+    from dotenv import load_dotenv
+    load_dotenv(APP_DIR / '.env')
+    os.environ['MISTRAL_BASE_URL'] = f"http://127.0.0.1:{args.stub_port}/v1"
+    os.environ.setdefault('MISTRAL_API_KEY', 'stub')
+
+    report = asyncio.run(run(args))
+    print_summary(report)
+
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"💾 Отчет: {out}")
+
+if __name__ == '__main__':
+    main()
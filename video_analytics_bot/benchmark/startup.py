@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+# Модули, которые не должны загружаться при импорте main
+DEFERRED_MODULES = ('openai', 'database.init_db', 'database.sync', 'database.parallel_ingest', 'webhook', 'numpy')
+DEFAULT_QUESTION = "Сколько всего видео есть в системе?"
+
+async def measure(mode: str, question: str) -> dict:
+    """Выполняется в отдельном процессе: импорт, фабрика приложения и время до первого ответа"""
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    deferred_loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+
+    from benchmark.load import FakeMessage
+    dp = main.create_app()
+    created = time.perf_counter()
+    engine, readiness = dp["engine"], dp["readiness"]
+
+    background = []
+    try:
+        if mode == "blocking":
+            await main.load_data(engine, readiness)
+        else:
+            background.append(asyncio.create_task(main.load_data_in_background(engine, readiness)))
+
+        # Вопрос повторяется, пока вместо ответа приходит "данные загружаются"
+        first_reply = None
+        while True:
+            message = FakeMessage(question, user_id=1)
+            await main.handle_text_query(
+                message, dp["async_session"], dp["nlp_parser"], dp["result_cache"], dp["query_guard"],
+                readiness=readiness
+            )
+            now = time.perf_counter()
+            first_reply = first_reply or now
+            if message.answers and message.answers[0] != main.NOT_READY_TEXT:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await main.close_app(dp)
+
+    return {
+        'import_s': round(imported - started, 3),
+        'create_app_s': round(created - imported, 3),
+        'first_reply_s': round(first_reply - started, 3),
+        'first_answer_s': round(now - started, 3),
+        'answer': message.answers[0],
+        'deferred_loaded': deferred_loaded,
+    }
+
+def run_child(mode: str, question: str, data: str = None) -> dict:
+    env = dict(os.environ, DATA_LOAD_ON_START=mode, SYNC_INTERVAL='0')
+    if data:
+        env['DATA_FILE'] = data
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', mode, '--question', question],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    # Время процесса целиком: запуск интерпретатора, импорт и первый ответ
+    result['process_s'] = round(time.perf_counter() - started, 3)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска: импорт main и время до первого ответа (с)")
+    parser.add_argument('--repeat', type=int, default=5, help="запусков процесса на каждый режим")
+    parser.add_argument('--modes', default='background,blocking', help="режимы DATA_LOAD_ON_START через запятую")
+    parser.add_argument('--question', default=DEFAULT_QUESTION)
+    parser.add_argument('--data', default=None, help="файл данных для синхронизации при старте (DATA_FILE)")
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--out', default=None, help="JSON-отчет (по умолчанию benchmark/results/startup-<время>.json)")
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.child, args.question)), ensure_ascii=False))
+        return
+
+    out = os.path.abspath(args.out or APP_DIR / f"benchmark/results/startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+    data = os.path.abspath(args.data) if args.data else None
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('out', 'child')},
+        'modes': {},
+    }
+    print(f"{'режим':<12}{'импорт':>10}{'ответ-заглушка':>16}{'первый ответ':>14}{'процесс':>10}")
+    for mode in args.modes.split(','):
+        runs = [run_child(mode, args.question, data) for _ in range(args.repeat)]
+        summary = {
+            key: round(statistics.median(run[key] for run in runs), 3)
+            for key in ('import_s', 'create_app_s', 'first_reply_s', 'first_answer_s', 'process_s')
+        }
+        summary['deferred_loaded'] = runs[0]['deferred_loaded']
+        summary['answer'] = runs[-1]['answer']
+        report['modes'][mode] = {'median': summary, 'runs': runs}
+        print(f"{mode:<12}{summary['import_s']:>10}{summary['first_reply_s']:>16}"
+              f"{summary['first_answer_s']:>14}{summary['process_s']:>10}")
+        if summary['deferred_loaded']:
+            print(f"⚠️ При импорте main загружены: {', '.join(summary['deferred_loaded'])}")
+
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Отчет: {out}")
+
+if __name__ == '__main__':
+    main()
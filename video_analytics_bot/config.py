@@ -9,9 +9,72 @@ class Config:
     # Telegram
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN")
     
+    # Update delivery: "polling" or "webhook"
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")  # public base URL; set_webhook is skipped when empty
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_MAX_CONCURRENCY: int = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "32"))  # updates handled at once, more get 429
+    WEBHOOK_DRAIN_TIMEOUT: float = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))  # seconds
+    
+    # Fair scheduling of questions across users
+    SCHEDULER_MAX_CONCURRENCY: int = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "10"))  # questions processed at once
+    USER_QUEUE_DEPTH: int = int(os.getenv("USER_QUEUE_DEPTH", "3"))  # per user, including running ones
+    SCHEDULER_MAX_QUEUED: int = int(os.getenv("SCHEDULER_MAX_QUEUED", "500"))  # all users together
+    
+    # Batch questions (several lines in one message or a .txt/.csv file)
+    BATCH_MAX_QUESTIONS: int = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+    
+    # Multi-row answers (group_by): small tables inline, larger ones as a file written while the cursor is read
+    TABLE_INLINE_ROWS: int = int(os.getenv("TABLE_INLINE_ROWS", "20"))
+    TABLE_FILE_FORMAT: str = os.getenv("TABLE_FILE_FORMAT", "csv")  # csv | xlsx (needs openpyxl)
+    TABLE_MAX_ROWS: int = int(os.getenv("TABLE_MAX_ROWS", "100000"))  # rows beyond this are cut off
+    TABLE_MAX_BYTES: int = int(os.getenv("TABLE_MAX_BYTES", "20000000"))  # Telegram bots send files up to 50 MB
+    TABLE_FETCH_ROWS: int = int(os.getenv("TABLE_FETCH_ROWS", "1000"))  # rows per server-side cursor fetch
+    
     # Mistral AI
     MISTRAL_API_KEY: str = os.getenv("MISTRAL_API_KEY")
     MISTRAL_MODEL: str = os.getenv("MISTRAL_MODEL", "mistral-medium")
+    MISTRAL_BASE_URL: str = os.getenv("MISTRAL_BASE_URL", "https://api.mistral.ai/v1")
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "15"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE: float = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+    LLM_BACKOFF_MAX: float = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+    
+    # Few-shot prompt: schema parts and the most similar verified examples (TF-IDF) per question
+    LLM_PROMPT_TOKEN_BUDGET: int = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "700"))  # estimated tokens
+    LLM_PROMPT_EXAMPLES: int = int(os.getenv("LLM_PROMPT_EXAMPLES", "2"))
+    PROMPT_EXAMPLES_PATH: str = os.getenv("PROMPT_EXAMPLES_PATH", "")  # JSONL: {"question": ..., "spec": {...}}
+    PROMPT_LIBRARY_SIZE: int = int(os.getenv("PROMPT_LIBRARY_SIZE", "500"))
+    PROMPT_EXAMPLES_PER_SHAPE: int = int(os.getenv("PROMPT_EXAMPLES_PER_SHAPE", "3"))  # learned examples per query shape
+    
+    # NL -> SQL translation cache
+    TRANSLATION_CACHE_SIZE: int = int(os.getenv("TRANSLATION_CACHE_SIZE", "2000"))
+    TRANSLATION_CACHE_TTL: float = float(os.getenv("TRANSLATION_CACHE_TTL", "86400"))
+    TRANSLATION_CACHE_PATH: str = os.getenv("TRANSLATION_CACHE_PATH", "")
+    
+    # Query result cache (keyed by data version; RESULT_CACHE_URL=redis://... to share between replicas)
+    RESULT_CACHE_SIZE: int = int(os.getenv("RESULT_CACHE_SIZE", "5000"))  # 0 disables the local cache
+    RESULT_CACHE_URL: str = os.getenv("RESULT_CACHE_URL", "")
+    RESULT_CACHE_TTL: float = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+    
+    # Guarded query execution
+    QUERY_TIMEOUT_MS: int = int(os.getenv("QUERY_TIMEOUT_MS", "5000"))
+    QUERY_MAX_COST: float = float(os.getenv("QUERY_MAX_COST", "1000000"))  # planner cost units
+    QUERY_MAX_ROWS: float = float(os.getenv("QUERY_MAX_ROWS", "10000000"))  # largest plan node estimate
+    
+    # Rule-based fast path (questions answered without the LLM)
+    FAST_PATH_MIN_CONFIDENCE: float = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))
+    # Answer fast-path questions from an in-memory NumPy copy of the tables (needs numpy)
+    COLUMNAR_ENABLED: bool = os.getenv("COLUMNAR_ENABLED", "0") == "1"
+    
+    # Metrics: Prometheus text format on a local port (0 disables)
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9100"))
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    SLOW_QUERY_SECONDS: float = float(os.getenv("SLOW_QUERY_SECONDS", "1.0"))  # logged with SQL
     
     # Database
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
@@ -20,8 +83,32 @@ class Config:
     DB_USER: str = os.getenv("DB_USER", "postgres")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "postgres")
     
+    # Database pool (one engine per process)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_PREWARM: int = int(os.getenv("DB_POOL_PREWARM", "5"))
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+    
+    # Ingestion
+    INGEST_MODE: str = os.getenv("INGEST_MODE", "bulk")  # bulk | orm
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))
+    INGEST_WRITERS: int = int(os.getenv("INGEST_WRITERS", "4"))
+    DATA_FILE: str = os.getenv("DATA_FILE", "data/videos_data.json")
+    SYNC_INTERVAL: float = float(os.getenv("SYNC_INTERVAL", "300"))  # seconds, 0 disables
+    # Data load at bot start: background (answer once loaded) | blocking (before polling) | off (use ingest.py);
+    # any other value stops the bot at startup
+    DATA_LOAD_ON_START: str = os.getenv("DATA_LOAD_ON_START", "background")
+    
     @property
     def database_url(self) -> str:
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+    
+    @property
+    def async_database_url(self) -> str:
+        return self.database_url.replace("postgresql://", "postgresql+asyncpg://")
 
 config = Config()
\ No newline at end of file
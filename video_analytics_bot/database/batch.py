@@ -0,0 +1,130 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# SELECT <агрегат> FROM <таблица> [<алиас>] [WHERE <условие>]
+_SIMPLE_AGGREGATE = re.compile(
+    r"^\s*select\s+(?P<select>.+?)\s+from\s+(?P<table>[a-z_][a-z0-9_]*)"
+    r"(?:\s+(?:as\s+)?(?!(?:where|join|inner|left|right|full|cross|group|order|limit)\b)(?P<alias>[a-z_][a-z0-9_]*))?"
+    r"(?:\s+where\s+(?P<where>.+?))?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+# Один агрегат, возможно в COALESCE(..., значение) и с алиасом колонки
+_AGGREGATE_EXPRESSION = re.compile(
+    r"^(?P<pre>coalesce\s*\(\s*)?"
+    r"(?P<aggregate>(?:count|sum|avg|min|max)\s*\((?:[^()]|\([^()]*\))*\))"
+    r"(?(pre)\s*,\s*(?P<default>[^(),]+?)\s*\))"
+    r"(?:\s+as\s+[a-z_][a-z0-9_]*)?$",
+    re.IGNORECASE | re.DOTALL
+)
+# В условии это значит, что запрос - уже не "один агрегат по одной таблице"
+_UNMERGEABLE = re.compile(
+    r"\b(select|join|group|order|limit|offset|having|union|intersect|except|window|over)\b", re.IGNORECASE
+)
+_LITERAL_OR_TEXT = re.compile(r"('(?:[^']|'')*')|([^']+)")
+# Параметр :name (но не приведение типа ::date)
+_BIND_PARAM = re.compile(r'(?<![:\w]):([a-z_][a-z0-9_]*)', re.IGNORECASE)
+
+# Больше колонок в одном запросе не объединяется
+MAX_MERGED = 25
+
+@dataclass
+class AggregateQuery:
+    """Разобранный запрос вида SELECT агрегат FROM таблица WHERE условие"""
+    table: str
+    alias: Optional[str]
+    aggregate: str
+    default: Optional[str]
+    where: Optional[str]
+
+    def filtered_column(self) -> str:
+        """Колонка объединенного запроса: агрегат только по строкам своего условия"""
+        column = self.aggregate
+        if self.where:
+            column += f" FILTER (WHERE {self.where})"
+        if self.default is not None:
+            column = f"COALESCE({column}, {self.default})"
+        return column
+
+@dataclass
+class MergedQuery:
+    """Один запрос к базе и номера вопросов, чьи ответы в его колонках (по порядку)"""
+    sql: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    indexes: List[int] = field(default_factory=list)
+
+def _code(sql: str) -> str:
+    """Текст запроса без строковых литералов"""
+    return ''.join(text for literal, text in _LITERAL_OR_TEXT.findall(sql) if text)
+
+def prefix_params(sql: str, params: Dict[str, Any], prefix: str) -> Tuple[str, Dict[str, Any]]:
+    """:name -> :<prefix>name в тексте (вне литералов) и в значениях - чтобы запросы не делили имена"""
+    renamed = ''.join(
+        literal or _BIND_PARAM.sub(lambda m: ':' + prefix + m.group(1), text)
+        for literal, text in _LITERAL_OR_TEXT.findall(sql)
+    )
+    return renamed, {prefix + name: value for name, value in params.items()}
+
+def parse_aggregate(sql: str) -> Optional[AggregateQuery]:
+    """Разобрать запрос; None - запрос нельзя объединять с другими"""
+    match = _SIMPLE_AGGREGATE.match(sql)
+    if match is None:
+        return None
+    expression = _AGGREGATE_EXPRESSION.match(match.group('select').strip())
+    if expression is None:
+        return None
+    # Вложенные запросы в агрегате, JOIN, GROUP BY, LIMIT и т.п. в хвосте запроса
+    if _UNMERGEABLE.search(_code(expression.group('aggregate'))) \
+            or match.group('where') and _UNMERGEABLE.search(_code(match.group('where'))):
+        return None
+    return AggregateQuery(
+        table=match.group('table').lower(),
+        alias=match.group('alias').lower() if match.group('alias') else None,
+        aggregate=expression.group('aggregate'),
+        default=expression.group('default'),
+        where=match.group('where'),
+    )
+
+def merge_aggregates(queries: List[Tuple[str, Dict[str, Any]]]) -> List[MergedQuery]:
+    """Сгруппировать запросы (SQL, параметры): агрегаты по одной таблице - в один SELECT с FILTER
+
+    SELECT COUNT(*) FROM videos WHERE views_count > :threshold_0
+    SELECT COUNT(*) FROM videos WHERE creator_id = :creator_id
+    ->
+    SELECT COUNT(*) FILTER (WHERE views_count > :q0_threshold_0), COUNT(*) FILTER (WHERE creator_id = :q1_creator_id)
+    FROM videos WHERE (views_count > :q0_threshold_0) OR (creator_id = :q1_creator_id)
+
+    Таблица читается один раз вместо двух. Если у всех запросов есть условие,
+    их OR остается в WHERE - планировщик может сузить чтение индексом.
+    Параметры каждого запроса получают свой префикс. Остальные запросы
+    возвращаются как есть, по одному.
+    """
+    merged: List[MergedQuery] = []
+    groups: Dict[Tuple[str, Optional[str]], List[Tuple[int, AggregateQuery]]] = {}
+    for i, (sql, params) in enumerate(queries):
+        parsed = parse_aggregate(sql)
+        if parsed is None:
+            merged.append(MergedQuery(sql, params, [i]))
+        else:
+            groups.setdefault((parsed.table, parsed.alias), []).append((i, parsed))
+
+    for (table, alias), members in groups.items():
+        for start in range(0, len(members), MAX_MERGED):
+            chunk = members[start:start + MAX_MERGED]
+            if len(chunk) == 1:
+                i, _ = chunk[0]
+                merged.append(MergedQuery(*queries[i], [i]))
+                continue
+            columns, conditions, params = [], [], {}
+            for i, parsed in chunk:
+                column, member_params = prefix_params(parsed.filtered_column(), queries[i][1], f"q{i}_")
+                columns.append(column)
+                params.update(member_params)
+                if parsed.where:
+                    conditions.append(prefix_params(parsed.where, {}, f"q{i}_")[0])
+            source = f"{table} {alias}" if alias else table
+            sql = f"SELECT {', '.join(columns)} FROM {source}"
+            if len(conditions) == len(chunk):
+                sql += " WHERE " + " OR ".join(f"({where})" for where in conditions)
+            merged.append(MergedQuery(sql, params, [i for i, _ in chunk]))
+    return merged
@@ -0,0 +1,228 @@
+import time
+from datetime import date, datetime
+from typing import AsyncIterable, List, Tuple, Dict, Any, Set
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .timestamps import TimestampDecoder
+from .rollups import refresh_rollups
+from .partitions import ensure_partitions
+from .result_cache import bump_data_version
+from config import config
+
+VIDEO_COLUMNS = [
+    'id', 'creator_id', 'video_created_at', 'views_count', 'likes_count',
+    'comments_count', 'reports_count', 'created_at', 'updated_at'
+]
+SNAPSHOT_COLUMNS = [
+    'id', 'video_id', 'views_count', 'likes_count', 'comments_count', 'reports_count',
+    'delta_views_count', 'delta_likes_count', 'delta_comments_count', 'delta_reports_count',
+    'created_at', 'updated_at'
+]
+# Позиция created_at в записи снапшота - по ней выбирается партиция
+CREATED_AT = SNAPSHOT_COLUMNS.index('created_at')
+
+def video_record(video_data: Dict[str, Any], decoder: TimestampDecoder) -> Tuple:
+    """Строка таблицы videos из JSON (те же преобразования, что и в ORM-загрузчике)"""
+    return (
+        str(video_data['id']),
+        str(video_data.get('creator_id', 'unknown')),
+        decoder.decode(video_data.get('video_created_at')),
+        int(video_data.get('views_count', 0)),
+        int(video_data.get('likes_count', 0)),
+        int(video_data.get('comments_count', 0)),
+        int(video_data.get('reports_count', 0)),
+        decoder.decode(video_data.get('created_at')),
+        decoder.decode(video_data.get('updated_at')),
+    )
+
+def snapshot_records(video_id: str, snapshots: Any, decoder: TimestampDecoder) -> List[Tuple]:
+    """Строки таблицы video_snapshots для одного видео (даты разбираются колонками)"""
+    if not isinstance(snapshots, list):
+        return []
+    rows = [(j, s) for j, s in enumerate(snapshots) if isinstance(s, dict)]
+    records = [
+        (
+            str(snapshot_data.get('id', f"snap_{video_id}_{j}")),
+            video_id,
+            int(snapshot_data.get('views_count', 0)),
+            int(snapshot_data.get('likes_count', 0)),
+            int(snapshot_data.get('comments_count', 0)),
+            int(snapshot_data.get('reports_count', 0)),
+            int(snapshot_data.get('delta_views_count', 0)),
+            int(snapshot_data.get('delta_likes_count', 0)),
+            int(snapshot_data.get('delta_comments_count', 0)),
+            int(snapshot_data.get('delta_reports_count', 0)),
+        )
+        for j, snapshot_data in rows
+    ]
+    created = decoder.decode_many([s.get('created_at') for _, s in rows])
+    updated = decoder.decode_many([s.get('updated_at', datetime.utcnow()) for _, s in rows])
+    return [record + (c, u) for record, c, u in zip(records, created, updated)]
+
+def convert_video(i: int, video_data: Any, decoder: TimestampDecoder, stats: Dict[str, int]):
+    """Проверка и преобразование одного элемента JSON: (видео, снапшоты) или None, если элемент пропущен"""
+    if not isinstance(video_data, dict):
+        print(f"⚠️ Пропускаем элемент {i}: не словарь (тип: {type(video_data)})")
+        return None
+
+    if 'id' not in video_data:
+        print(f"⚠️ Пропускаем элемент {i}: нет поля 'id'")
+        return None
+
+    try:
+        video = video_record(video_data, decoder)
+        return video, snapshot_records(video[0], video_data.get('snapshots', []), decoder)
+    except Exception as e:
+        print(f"❌ Ошибка при обработке видео {i}: {e}")
+        print(f"   ID видео: {video_data.get('id', 'unknown')}")
+        stats["errors"] += 1
+        return None
+
+async def insert_staged_snapshots(conn) -> Tuple[int, Set[date]]:
+    """Перенести снапшоты из staging-таблицы: (число вставленных, дни вставленных снапшотов)
+
+    Первичный ключ партиций - (id, created_at), поэтому уникальность id
+    проверяется здесь: снапшот с уже известным id (например, выгруженный
+    повторно с исправленным created_at) не вставляется, а из повторов внутри
+    пачки остается самый ранний - как при прежнем ключе по id. Иначе итоги
+    посчитали бы его дважды.
+
+    Строки идут в порядке времени: блокировки по-прежнему берутся в одном
+    порядке, а соседние страницы партиции получают соседние created_at (BRIN).
+    """
+    columns = ', '.join(SNAPSHOT_COLUMNS)
+    rows = await conn.fetch(
+        f"WITH inserted AS (INSERT INTO video_snapshots ({columns}) "
+        f"SELECT {columns} FROM ("
+        f"SELECT DISTINCT ON (id) {columns} FROM stage_video_snapshots s "
+        "WHERE NOT EXISTS (SELECT 1 FROM video_snapshots v WHERE v.id = s.id) "
+        "ORDER BY id, created_at"
+        ") fresh ORDER BY created_at, id "
+        "ON CONFLICT (id, created_at) DO NOTHING RETURNING created_at) "
+        "SELECT DATE(created_at) AS day, COUNT(*) AS inserted FROM inserted GROUP BY 1"
+    )
+    return sum(row['inserted'] for row in rows), {row['day'] for row in rows}
+
+class BulkLoader:
+    """Массовая загрузка через COPY во временные таблицы и один INSERT ... ON CONFLICT
+
+    Вместо SELECT на каждое видео и ORM-объектов строки пачками копируются
+    в staging-таблицы, а дубликаты отсекаются одним set-based запросом.
+    Снапшоты вставляются только для видео, которые реально были добавлены
+    (как и раньше: существующее видео пропускается целиком).
+    """
+
+    def __init__(self, engine: AsyncEngine, decoder: TimestampDecoder = None, batch_size: int = None):
+        self.engine = engine
+        # Декодер на один источник: запоминает формат дат этого файла
+        self.decoder = decoder or TimestampDecoder()
+        self.batch_size = batch_size or config.INGEST_BATCH_SIZE
+        self.stats = {"videos": 0, "snapshots": 0, "duplicates": 0, "errors": 0}
+        # Дни, в которые добавились снапшоты: по ним пересчитываются дневные итоги
+        self.days = set()
+
+    async def load(self, videos_stream: AsyncIterable[Any]):
+        """Загрузить видео (со снапшотами) пачками по batch_size"""
+        started = time.perf_counter()
+
+        async with self.engine.connect() as sa_conn:
+            raw = await sa_conn.get_raw_connection()
+            conn = raw.driver_connection
+            await self.prepare_staging(conn)
+
+            videos, snapshots = [], []
+            i = -1
+            async for video_data in videos_stream:
+                i += 1
+                converted = convert_video(i, video_data, self.decoder, self.stats)
+                if converted is None:
+                    continue
+                video, video_snapshots = converted
+                videos.append(video)
+                snapshots.extend(video_snapshots)
+
+                if len(videos) >= self.batch_size:
+                    await self.write_batch(conn, videos, snapshots)
+                    videos, snapshots = [], []
+                    print(f"🔄 Обработано {self.stats['videos']} видео и {self.stats['snapshots']} снапшотов...")
+
+            if videos:
+                await self.write_batch(conn, videos, snapshots)
+
+            await refresh_rollups(conn, self.days)
+
+        self.report(time.perf_counter() - started)
+        return self.stats
+
+    @staticmethod
+    async def prepare_staging(conn):
+        """Временные таблицы живут в рамках соединения и очищаются после каждой транзакции"""
+        await conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS stage_videos "
+            "(LIKE videos INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        await conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS stage_video_snapshots "
+            "(LIKE video_snapshots INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+
+    async def write_batch(self, conn, videos: List[Tuple], snapshots: List[Tuple]) -> Set[str]:
+        """Записать пачку в одной транзакции, вернуть ID реально добавленных видео.
+
+        Строки вставляются в порядке id: при параллельной записи несколькими
+        соединениями блокировки берутся в одном порядке и не дают deadlock.
+        """
+        # Повторы внутри пачки: как и раньше, побеждает первое вхождение
+        unique_videos, seen = [], set()
+        for video in videos:
+            if video[0] in seen:
+                self._count_duplicate(video[0])
+                continue
+            seen.add(video[0])
+            unique_videos.append(video)
+
+        await ensure_partitions(conn, (s[CREATED_AT] for s in snapshots))
+        async with conn.transaction():
+            await conn.copy_records_to_table('stage_videos', records=unique_videos, columns=VIDEO_COLUMNS)
+            rows = await conn.fetch(
+                f"INSERT INTO videos ({', '.join(VIDEO_COLUMNS)}) "
+                f"SELECT {', '.join(VIDEO_COLUMNS)} FROM stage_videos ORDER BY id "
+                "ON CONFLICT (id) DO NOTHING RETURNING id"
+            )
+            inserted = {row['id'] for row in rows}
+
+            new_snapshots = [s for s in snapshots if s[1] in inserted]
+            snapshots_inserted = 0
+            if new_snapshots:
+                await conn.copy_records_to_table(
+                    'stage_video_snapshots', records=new_snapshots, columns=SNAPSHOT_COLUMNS
+                )
+                snapshots_inserted, days = await insert_staged_snapshots(conn)
+                self.days.update(days)
+            if inserted:
+                await bump_data_version(conn)
+
+        for video in unique_videos:
+            if video[0] not in inserted:
+                self._count_duplicate(video[0])
+        self.stats["videos"] += len(inserted)
+        self.stats["snapshots"] += snapshots_inserted
+        return inserted
+
+    async def refresh_rollups(self):
+        """Пересчитать дневные итоги за затронутые загрузкой дни"""
+        async with self.engine.connect() as sa_conn:
+            raw = await sa_conn.get_raw_connection()
+            await refresh_rollups(raw.driver_connection, self.days)
+
+    def _count_duplicate(self, video_id: str):
+        self.stats["duplicates"] += 1
+        if self.stats["duplicates"] <= 5:  # Показываем только первые 5 дубликатов
+            print(f"⚠️ Видео {video_id} уже существует, пропускаем")
+
+    def report(self, elapsed: float):
+        """Итог в том же формате, что и у построчного загрузчика, плюс скорость"""
+        print(f"✅ Всего обработано: {self.stats['videos']} видео и {self.stats['snapshots']} снапшотов")
+        if self.stats["duplicates"] > 0:
+            print(f"⚠️ Пропущено дубликатов: {self.stats['duplicates']}")
+        rows = self.stats["videos"] + self.stats["snapshots"]
+        print(f"⚡ Скорость: {rows / elapsed if elapsed > 0 else 0:.0f} строк/с ({elapsed:.1f} с)")
@@ -0,0 +1,222 @@
+import time
+import asyncio
+import operator
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .rollups import METRICS
+from .result_cache import DATA_VERSION_SQL
+
+EPOCH = datetime(1970, 1, 1)
+# Агрегации QuerySpec, которые считаются в памяти; avg/min/max - в Postgres
+SUPPORTED_AGGREGATIONS = ('count', 'sum', 'count_distinct')
+COMPARISONS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '=': operator.eq,
+}
+# Строк снапшотов за одно чтение курсора при загрузке
+LOAD_CHUNK = 100_000
+
+# Порядок видео задает их коды: строка i массива видео - видео с кодом i
+VIDEOS_SQL = (
+    "SELECT creator_id, (EXTRACT(EPOCH FROM video_created_at) * 1000000)::bigint, "
+    + ", ".join(f"COALESCE({metric}_count, 0)" for metric in METRICS)
+    + " FROM videos ORDER BY video_created_at, id"
+)
+SNAPSHOTS_SQL = (
+    "SELECT v.code, (EXTRACT(EPOCH FROM s.created_at) * 1000000)::bigint, "
+    + ", ".join(f"COALESCE(s.delta_{metric}_count, 0)" for metric in METRICS)
+    + " FROM video_snapshots s JOIN ("
+    "SELECT id, row_number() OVER (ORDER BY video_created_at, id) - 1 AS code FROM videos"
+    ") v ON v.id = s.video_id ORDER BY s.created_at"
+)
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Для COLUMNAR_ENABLED установите пакет numpy")
+    return numpy
+
+def _micros(day: date) -> int:
+    """Начало дня в микросекундах от эпохи (время в базе хранится без зоны)"""
+    return (datetime(day.year, day.month, day.day) - EPOCH) // timedelta(microseconds=1)
+
+def _supported(spec) -> bool:
+    # Значения на дату и вопросы об одном видео - индексный поиск в базе, таблицы (group_by) - тоже база
+    return spec.aggregation in SUPPORTED_AGGREGATIONS and spec.as_of is None and spec.video_id is None \
+        and spec.group_by is None
+
+class ColumnarTables:
+    """Снимок videos и video_snapshots в колонках NumPy на одну версию данных
+
+    - id видео и креаторов закодированы целыми (словарь creator_codes, код видео -
+      номер строки в массивах видео);
+    - время - int64 микросекунд от эпохи; обе таблицы отсортированы по времени,
+      поэтому фильтр по датам - два бинарных поиска и срез без копирования;
+    - снимок не меняется после загрузки, новая версия данных - новый снимок.
+    """
+
+    def __init__(self, np, version: Optional[str], creator_codes: Dict[str, int],
+                 videos: Dict[str, Any], snapshots: Dict[str, Any]):
+        self.np = np
+        self.version = version
+        self.creator_codes = creator_codes
+        self.videos = videos
+        self.snapshots = snapshots
+
+    @classmethod
+    async def load(cls, conn) -> "ColumnarTables":
+        """Прочитать обе таблицы одним согласованным снимком (asyncpg-соединение)"""
+        np = _numpy()
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            version = await conn.fetchval(DATA_VERSION_SQL)
+            rows = await conn.fetch(VIDEOS_SQL)
+            creator_codes: Dict[str, int] = {}
+            creators = np.fromiter(
+                (creator_codes.setdefault(row[0], len(creator_codes)) for row in rows), dtype=np.int32, count=len(rows)
+            )
+            numbers = np.array([tuple(row)[1:] for row in rows], dtype=np.int64).reshape(len(rows), 1 + len(METRICS))
+
+            chunks = []
+            cursor = await conn.cursor(SNAPSHOTS_SQL)
+            while True:
+                chunk = await cursor.fetch(LOAD_CHUNK)
+                if not chunk:
+                    break
+                chunks.append(np.array([tuple(row) for row in chunk], dtype=np.int64))
+        snapshot_numbers = np.concatenate(chunks) if chunks else np.empty((0, 2 + len(METRICS)), dtype=np.int64)
+
+        videos = {'creator': creators, 'created_at': np.ascontiguousarray(numbers[:, 0])}
+        for i, metric in enumerate(METRICS):
+            videos[metric] = np.ascontiguousarray(numbers[:, 1 + i])
+        codes = snapshot_numbers[:, 0].astype(np.int32)
+        snapshots = {
+            'video': codes,
+            'creator': creators[codes],
+            'created_at': np.ascontiguousarray(snapshot_numbers[:, 1]),
+        }
+        for i, metric in enumerate(METRICS):
+            snapshots[f"delta_{metric}"] = np.ascontiguousarray(snapshot_numbers[:, 2 + i])
+        return cls(np, version, creator_codes, videos, snapshots)
+
+    @property
+    def rows(self) -> int:
+        return len(self.videos['created_at']) + len(self.snapshots['created_at'])
+
+    def answer(self, spec) -> Optional[int]:
+        """Ответ на вопрос (nlp.query_spec.QuerySpec); None - такой вид вопроса не поддержан"""
+        if not _supported(spec):
+            return None
+        creator = None
+        if spec.creator_id is not None:
+            creator = self.creator_codes.get(spec.creator_id)
+            if creator is None:
+                # У неизвестного креатора нет ни видео, ни снапшотов
+                return 0
+
+        # Метрика видео - итог, метрика снапшота - приращение
+        if spec.table == 'videos':
+            columns, column = self.videos, "{metric}"
+        else:
+            columns, column = self.snapshots, "delta_{metric}"
+        rows = self._range(columns, spec.date_range)
+        mask = None
+        if creator is not None:
+            mask = columns['creator'][rows] == creator
+        for item in spec.filters:
+            values = columns[column.format(metric=item.metric)][rows]
+            passed = COMPARISONS[item.op](values, item.value)
+            mask = passed if mask is None else mask & passed
+
+        if spec.aggregation == 'count':
+            if mask is None:
+                return len(columns['created_at'][rows])
+            return int(self.np.count_nonzero(mask))
+        if spec.aggregation == 'sum':
+            values = columns[column.format(metric=spec.metric)][rows]
+            return int(values.sum() if mask is None else values[mask].sum())
+        return self._distinct_videos(spec, rows, mask)
+
+    def _range(self, columns: Dict[str, Any], date_range) -> slice:
+        """Строки за период [start, end + 1 день): два бинарных поиска по отсортированному времени"""
+        if date_range is None:
+            return slice(None)
+        start, end = date_range
+        created_at = columns['created_at']
+        lo = self.np.searchsorted(created_at, _micros(start), side='left') if start else 0
+        hi = self.np.searchsorted(created_at, _micros(end + timedelta(days=1)), side='left') if end else len(created_at)
+        return slice(int(lo), int(hi))
+
+    def _distinct_videos(self, spec, rows: slice, mask) -> int:
+        """Число разных видео среди снапшотов (с метрикой - с положительным приращением)"""
+        if spec.metric:
+            positive = self.snapshots[f"delta_{spec.metric}"][rows] > 0
+            mask = positive if mask is None else mask & positive
+        codes = self.snapshots['video'][rows]
+        if mask is not None:
+            codes = codes[mask]
+        # Отметки в массиве по числу видео вместо сортировки для DISTINCT
+        seen = self.np.zeros(len(self.videos['created_at']), dtype=bool)
+        seen[codes] = True
+        return int(self.np.count_nonzero(seen))
+
+class ColumnarStore:
+    """Альтернативный исполнитель: count/sum/count_distinct по QuerySpec считаются в памяти
+
+    Перед ответом сверяется версия данных (data_version): если после загрузки
+    снимка в базу что-то записали, снимок перечитывается в фоне, а пока отвечает
+    Postgres. Вопросы, которые колонки не поддерживают, тоже уходят в Postgres.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        _numpy()
+        self.engine = engine
+        self.tables: Optional[ColumnarTables] = None
+        self._loading: Optional[asyncio.Task] = None
+        self.stats = {"served": 0, "unsupported": 0, "stale": 0, "reloads": 0}
+
+    async def refresh(self):
+        """Загрузить новый снимок; до конца загрузки отвечает прежний"""
+        started = time.perf_counter()
+        async with self.engine.connect() as sa_conn:
+            raw = await sa_conn.get_raw_connection()
+            tables = await ColumnarTables.load(raw.driver_connection)
+        self.tables = tables
+        self.stats["reloads"] += 1
+        print(f"🧮 Колоночный снимок загружен: {tables.rows} строк ({time.perf_counter() - started:.1f} с)")
+
+    def refresh_in_background(self):
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.create_task(self._refresh_logged())
+
+    async def _refresh_logged(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"❌ Ошибка загрузки колоночного снимка: {type(e).__name__}: {e}")
+
+    async def execute(self, spec) -> Optional[int]:
+        """Ответ из памяти; None - отвечать должна база"""
+        if spec is None or not _supported(spec):
+            self.stats["unsupported"] += 1
+            return None
+        async with self.engine.connect() as conn:
+            version = (await conn.exec_driver_sql(DATA_VERSION_SQL)).scalar()
+        tables = self.tables
+        if tables is None or tables.version != version:
+            self.stats["stale"] += 1
+            self.refresh_in_background()
+            return None
+
+        # Ядра NumPy отпускают GIL - считаем в потоке, не задерживая event loop
+        result = await asyncio.to_thread(tables.answer, spec)
+        if result is None:
+            self.stats["unsupported"] += 1
+        else:
+            self.stats["served"] += 1
+        return result
+
+    async def close(self):
+        if self._loading:
+            self._loading.cancel()
+            await asyncio.gather(self._loading, return_exceptions=True)
@@ -1,41 +1,189 @@
+import json
+from contextlib import nullcontext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from typing import Optional
+from typing import Optional, Any, AsyncIterator, Dict, List, Tuple
+from config import config
+from .result_cache import ResultCache, DATA_VERSION_SQL
+from .guard import QueryGuard, QueryRejected
+from .batch import merge_aggregates
 
 class DatabaseManager:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, cache: ResultCache = None, guard: QueryGuard = None):
         self.session = session
+        # Кэш результатов по версии данных (None - всегда идем в базу)
+        self.cache = cache
+        # Проверка и ограничения для запросов (None - выполнять как есть)
+        self.guard = guard
     
     async def execute_custom_query(self, sql_query: str, params: dict = None) -> Optional[int]:
-        """Выполнить пользовательский SQL запрос"""
+        """Выполнить пользовательский SQL запрос (QueryRejected - запрос отклонен защитой)"""
         if params is None:
             params = {}
         
         try:
-            result = await self.session.execute(text(sql_query), params)
-            row = result.fetchone()
+            if self.guard is not None:
+                sql_query = self.guard.validate(sql_query)
+                await self.guard.begin(self.session)
+            
+            version = None
+            if self.cache is not None:
+                version = (await self.session.execute(text(DATA_VERSION_SQL))).scalar()
+                if version is not None:
+                    cached = await self.cache.get(version, sql_query, params)
+                    if cached is not None:
+                        return cached
             
-            if row:
-                value = row[0]
-                if value is None:
-                    return 0
-                
-                # Преобразуем в int если возможно
-                try:
-                    # Пробуем преобразовать в число
-                    if isinstance(value, (int, float)):
-                        return int(value)
-                    else:
-                        # Если строка, пробуем преобразовать
-                        return int(float(str(value)))
-                except (ValueError, TypeError):
-                    # Если не число, возвращаем как есть (будет ошибка форматирования)
-                    return value
+            if self.guard is not None:
+                await self.guard.check_plan(self.session, sql_query, params)
+                result = await self.guard.execute(self.session, sql_query, params)
+            else:
+                result = await self.session.execute(text(sql_query), params)
+            value = self._scalar(result.fetchone())
             
-            return 0
+            if version is not None:
+                await self.cache.put(version, sql_query, params, value)
+            return value
             
+        except QueryRejected:
+            raise
+        
         except Exception as e:
             print(f"❌ Error executing query: {e}")
             print(f"   Query: {sql_query}")
             print(f"   Params: {params}")
-            return None
\ No newline at end of file
+            return None
+    
+    async def stream_rows(self, sql_query: str, params: dict = None, batch_size: int = None) -> AsyncIterator[List[tuple]]:
+        """Строки многострочного запроса пачками по batch_size (серверный курсор)
+
+        В памяти одновременно только текущая пачка, сколько бы строк ни вернул
+        запрос. Кэш результатов не используется: таблицы заняли бы в нем место
+        сотен чисел. QueryRejected - запрос отклонен защитой или превысил таймаут.
+        """
+        params = params or {}
+        batch_size = batch_size or config.TABLE_FETCH_ROWS
+        if self.guard is not None:
+            sql_query = self.guard.validate(sql_query)
+            await self.guard.begin(self.session)
+            await self.guard.check_plan(self.session, sql_query, params)
+            result = await self.guard.stream(self.session, sql_query, params, batch_size)
+        else:
+            result = await self.session.stream(text(sql_query), params, execution_options={"yield_per": batch_size})
+        
+        try:
+            with self.guard.timeouts() if self.guard is not None else nullcontext():
+                async for rows in result.partitions(batch_size):
+                    yield [tuple(row) for row in rows]
+        finally:
+            await result.close()
+    
+    async def execute_batch(self, queries: List[Tuple[str, dict]]) -> List[Any]:
+        """Выполнить запросы пакета вопросов в одной транзакции
+
+        Для каждого запроса - значение, None (ошибка) или QueryRejected.
+        Ответы из кэша результатов в базу не идут, одинаковые запросы выполняются
+        один раз, простые агрегаты по одной таблице объединяются в один SELECT
+        с FILTER (database/batch.py). Если объединенный запрос не прошел
+        (ошибка, таймаут, слишком дорогой), его части выполняются по одной.
+        """
+        results: List[Any] = [None] * len(queries)
+        # (SQL, параметры) -> номера вопросов с этим запросом
+        pending: Dict[Tuple[str, str], List[int]] = {}
+        unique: List[Tuple[str, dict]] = []
+        
+        if self.guard is not None:
+            await self.guard.begin(self.session)
+        version = None
+        if self.cache is not None:
+            version = (await self.session.execute(text(DATA_VERSION_SQL))).scalar()
+        
+        for i, (sql_query, params) in enumerate(queries):
+            params = params or {}
+            try:
+                if self.guard is not None:
+                    sql_query = self.guard.validate(sql_query)
+            except QueryRejected as e:
+                results[i] = e
+                continue
+            if version is not None:
+                cached = await self.cache.get(version, sql_query, params)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            key = (sql_query, json.dumps(params, sort_keys=True, default=str))
+            if key not in pending:
+                pending[key] = []
+                unique.append((sql_query, params))
+            pending[key].append(i)
+        
+        keys = list(pending)
+        for merged in merge_aggregates(unique):
+            members = [unique[j] for j in merged.indexes]
+            try:
+                values = await self._execute_in_savepoint(merged.sql, merged.params)
+                if len(values) != len(members):
+                    raise ValueError(f"ожидалось колонок: {len(members)}, получено: {len(values)}")
+            except Exception as e:
+                if len(members) == 1:
+                    values = [self._batch_error(e, merged.sql)]
+                else:
+                    print(f"⚠️ Объединенный запрос не выполнен ({e}), выполняю части по одной")
+                    values = [await self._execute_part(sql_query, params) for sql_query, params in members]
+            for j, (sql_query, params), value in zip(merged.indexes, members, values):
+                self._store(results, pending[keys[j]], value)
+                if version is not None and not isinstance(value, Exception):
+                    await self.cache.put(version, sql_query, params, value)
+        return results
+    
+    async def _execute_in_savepoint(self, sql_query: str, params: dict) -> List[Any]:
+        """Все колонки первой строки; ошибка откатывает только этот запрос, не весь пакет"""
+        async with self.session.begin_nested():
+            if self.guard is not None:
+                await self.guard.check_plan(self.session, sql_query, params)
+                result = await self.guard.execute(self.session, sql_query, params)
+            else:
+                result = await self.session.execute(text(sql_query), params)
+            row = result.fetchone()
+        return [self._scalar((value,)) for value in row] if row else [0]
+    
+    async def _execute_part(self, sql_query: str, params: dict) -> Any:
+        try:
+            return (await self._execute_in_savepoint(sql_query, params))[0]
+        except Exception as e:
+            return self._batch_error(e, sql_query)
+    
+    @staticmethod
+    def _batch_error(error: Exception, sql_query: str) -> Optional[QueryRejected]:
+        if isinstance(error, QueryRejected):
+            return error
+        print(f"❌ Error executing query: {error}")
+        print(f"   Query: {sql_query}")
+        return None
+    
+    @staticmethod
+    def _store(results: List[Any], indexes: List[int], value: Any):
+        for i in indexes:
+            results[i] = value
+    
+    @staticmethod
+    def _scalar(row):
+        """Первое значение строки результата, по возможности - целое число"""
+        if row:
+            value = row[0]
+            if value is None:
+                return 0
+            
+            # Преобразуем в int если возможно
+            try:
+                # Пробуем преобразовать в число
+                if isinstance(value, (int, float)):
+                    return int(value)
+                else:
+                    # Если строка, пробуем преобразовать
+                    return int(float(str(value)))
+            except (ValueError, TypeError):
+                # Если не число, возвращаем как есть (будет ошибка форматирования)
+                return value
+        
+        return 0
\ No newline at end of file
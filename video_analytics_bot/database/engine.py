@@ -0,0 +1,81 @@
+import socket
+import asyncio
+from typing import Optional
+from asyncpg import exceptions as pg_errors
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+from config import config
+
+# База недоступна: не поднялась, перезапускается, нет сети или свободных соединений
+CONNECTION_ERRORS = (
+    ConnectionError, socket.gaierror, asyncio.TimeoutError,
+    pg_errors.PostgresConnectionError, pg_errors.CannotConnectNowError, pg_errors.TooManyConnectionsError,
+)
+
+# Один движок и пул соединений на весь процесс
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[sessionmaker] = None
+
+def create_engine() -> AsyncEngine:
+    """Создание движка с настройками пула из конфига"""
+    return create_async_engine(
+        config.async_database_url,
+        echo=False,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        # Кэш подготовленных выражений asyncpg на каждое соединение
+        connect_args={"prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE}
+    )
+
+def get_engine() -> AsyncEngine:
+    """Общий движок процесса (создается при первом обращении)"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine()
+    return _engine
+
+def get_session_factory() -> sessionmaker:
+    """Фабрика сессий поверх общего движка"""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(
+            get_engine(), class_=AsyncSession, expire_on_commit=False
+        )
+    return _session_factory
+
+async def warm_up_pool(engine: AsyncEngine, connections: int = None):
+    """Прогрев пула: заранее открываем соединения, чтобы первые запросы не ждали connect"""
+    if connections is None:
+        connections = config.DB_POOL_PREWARM
+    connections = min(connections, config.DB_POOL_SIZE)
+    if connections <= 0:
+        return
+
+    # Держим все соединения одновременно, иначе пул вернет одно и то же
+    conns = await asyncio.gather(*(engine.connect() for _ in range(connections)))
+    try:
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in conns))
+
+async def dispose_engine():
+    """Корректное закрытие пула при остановке"""
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _session_factory = None
+
+def is_connection_error(error: BaseException) -> bool:
+    """Ошибка доступа к базе, которую имеет смысл повторить (в том числе обернутая SQLAlchemy)"""
+    while error is not None:
+        if isinstance(error, CONNECTION_ERRORS):
+            return True
+        if isinstance(error, DBAPIError) and error.connection_invalidated:
+            return True
+        error = error.__cause__ or getattr(error, 'orig', None)
+    return False
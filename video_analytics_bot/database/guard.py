@@ -0,0 +1,220 @@
+import re
+from contextlib import contextmanager
+from typing import Dict, Any, List, Set
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Base
+from config import config
+
+# Таблицы, к которым разрешены пользовательские запросы (служебные - нет)
+ALLOWED_TABLES = (
+    'videos', 'video_snapshots', 'snapshot_daily_stats', 'snapshot_daily_creator_stats', 'video_daily_closing'
+)
+
+SQL_KEYWORDS = {
+    'select', 'from', 'where', 'and', 'or', 'not', 'in', 'is', 'null', 'as', 'on', 'join', 'left',
+    'right', 'inner', 'outer', 'full', 'cross', 'group', 'by', 'order', 'having', 'limit', 'offset',
+    'between', 'like', 'ilike', 'case', 'when', 'then', 'else', 'end', 'distinct', 'asc', 'desc',
+    'with', 'union', 'all', 'exists', 'any', 'interval', 'true', 'false', 'filter', 'over',
+    'partition', 'nulls', 'first', 'last', 'using', 'lateral',
+    # типы для CAST и ::
+    'date', 'timestamp', 'time', 'zone', 'without', 'int', 'integer', 'bigint', 'numeric',
+    'decimal', 'real', 'float', 'double', 'precision', 'text', 'varchar',
+    # части дат для EXTRACT / DATE_TRUNC
+    'year', 'month', 'day', 'week', 'hour', 'minute', 'second', 'epoch', 'dow', 'doy', 'quarter',
+}
+SQL_FUNCTIONS = {
+    'count', 'sum', 'avg', 'min', 'max', 'coalesce', 'nullif', 'greatest', 'least', 'round',
+    'abs', 'ceil', 'floor', 'cast', 'extract', 'date_trunc', 'date_part', 'percentile_cont',
+    'within', 'lower', 'upper', 'length',
+}
+
+_LITERAL_OR_TEXT = re.compile(r"('(?:[^']|'')*')|([^']+)")
+_IDENTIFIER = re.compile(r'[a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)?')
+_TOKEN = re.compile(r'[a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)*|\d+(?:\.\d+)?|\S')
+_NAME = re.compile(r'[a-z_][a-z0-9_]*$')
+# Слова, после которых список FROM закончился (ON и USING - нет: после условия JOIN бывает запятая)
+_FROM_END = {'where', 'group', 'order', 'having', 'limit', 'offset', 'union', 'window'}
+_CALL = re.compile(r'\b([a-z_][a-z0-9_]*)\s*\(')
+# Параметр :name - значение приходит отдельно, это не имя колонки (но не приведение ::date)
+_BIND_PARAM = re.compile(r'(?<![:\w]):[a-z_][a-z0-9_]*')
+
+class QueryRejected(Exception):
+    """Запрос не прошел проверку; reason - текст для пользователя"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+def _allowed_columns() -> Set[str]:
+    return {
+        column.name
+        for table in Base.metadata.sorted_tables if table.name in ALLOWED_TABLES
+        for column in table.columns
+    }
+
+class QueryGuard:
+    """Защищенное выполнение SQL (прежде всего сгенерированного LLM)
+
+    - разбор и allow-list: один SELECT, только известные таблицы, колонки и функции;
+    - транзакция только на чтение и statement_timeout на запрос;
+    - EXPLAIN перед выполнением: запрос дороже max_cost или с узлом плана
+      больше max_rows строк не выполняется.
+    Отказ - исключение QueryRejected с понятным пользователю объяснением.
+    """
+
+    def __init__(self, max_cost: float = None, max_rows: float = None, timeout_ms: int = None):
+        self.max_cost = max_cost if max_cost is not None else config.QUERY_MAX_COST
+        self.max_rows = max_rows if max_rows is not None else config.QUERY_MAX_ROWS
+        self.timeout_ms = timeout_ms if timeout_ms is not None else config.QUERY_TIMEOUT_MS
+        self.allowed = SQL_KEYWORDS | SQL_FUNCTIONS | set(ALLOWED_TABLES) | _allowed_columns()
+        self.stats = {"checked": 0, "rejected": 0, "too_expensive": 0, "timeouts": 0}
+
+    def validate(self, sql: str) -> str:
+        """Проверить текст запроса; вернуть его без завершающей ';'"""
+        self.stats["checked"] += 1
+        sql = sql.strip().rstrip(';').strip()
+        code = ''.join(text.lower() for literal, text in _LITERAL_OR_TEXT.findall(sql) if text)
+        code = _BIND_PARAM.sub(' ', code)
+
+        if ';' in code:
+            self._reject("Разрешен только один запрос")
+        if '--' in code or '/*' in code:
+            self._reject("Комментарии в запросе не разрешены")
+        if not re.match(r'\s*(select|with)\b', code):
+            self._reject("Разрешены только запросы SELECT")
+
+        # Вызывать можно только функции из списка: алиас не делает имя функцией
+        for name in _CALL.findall(code):
+            if name not in SQL_FUNCTIONS and name not in SQL_KEYWORDS:
+                self._reject(f"Функция не разрешена: {name}")
+
+        aliases = self._check_sources(_TOKEN.findall(code))
+        for identifier in _IDENTIFIER.findall(code):
+            for part in identifier.split('.'):
+                if part not in self.allowed and part not in aliases:
+                    self._reject(f"Неизвестное имя в запросе: {part}")
+        return sql
+
+    def _check_sources(self, tokens: List[str]) -> Set[str]:
+        """Проверить все элементы FROM/JOIN и вернуть имена, допустимые сверх allow-list
+
+        Источник строк - только разрешенная таблица, CTE этого запроса или
+        подзапрос. Алиас таблицы или подзапроса берется только сразу после
+        проверенного элемента FROM/JOIN, поэтому алиас не может сделать
+        допустимой служебную таблицу (pg_authid, information_schema.*).
+        Алиасы колонок (AS в списке SELECT) допустимы как имена колонок результата.
+        """
+        ctes = self._cte_names(tokens)
+        names = set(ctes)
+        # Кадр на каждую скобку: запрос ли это (был SELECT), идет ли список FROM,
+        # ждем ли элемент FROM, открыт ли кадр подзапросом-элементом FROM
+        frames = [{'query': False, 'from': False, 'expect': False, 'item': False}]
+        for i, token in enumerate(tokens):
+            frame = frames[-1]
+            if token == '(':
+                frames.append({'query': False, 'from': False, 'expect': False, 'item': frame['expect']})
+                frame['expect'] = False
+            elif token == ')':
+                if len(frames) > 1 and frames.pop()['item']:
+                    names.update(self._source_alias(tokens, i + 1))
+            elif token == 'select':
+                frame['query'] = True
+            elif token in ('from', 'join') and frame['query']:
+                # FROM внутри EXTRACT(... FROM ...) - не источник: у вызова функции нет SELECT
+                frame['from'] = frame['expect'] = True
+            elif token == ',' and frame['from']:
+                frame['expect'] = True
+            elif token in _FROM_END:
+                frame['from'] = frame['expect'] = False
+            elif token == 'lateral' and frame['expect']:
+                # JOIN LATERAL (SELECT ...) c - элемент FROM идет следующим
+                continue
+            elif frame['expect']:
+                frame['expect'] = False
+                if token not in ALLOWED_TABLES and token not in ctes:
+                    self._reject(f"Таблица не разрешена: {token}")
+                names.update(self._source_alias(tokens, i + 1))
+            elif token == 'as' and i + 1 < len(tokens) and _NAME.match(tokens[i + 1]):
+                names.add(tokens[i + 1])
+        return names
+
+    @staticmethod
+    def _source_alias(tokens: List[str], i: int) -> List[str]:
+        """Алиас элемента FROM: "videos v", "videos AS v", "(SELECT ...) t" """
+        if i < len(tokens) and tokens[i] == 'as':
+            i += 1
+        if i < len(tokens) and _NAME.match(tokens[i]) and tokens[i] not in SQL_KEYWORDS:
+            return [tokens[i]]
+        return []
+
+    def _cte_names(self, tokens: List[str]) -> Set[str]:
+        """Имена CTE из WITH name AS (...), name AS (...) в начале запроса"""
+        names = set()
+        if not tokens or tokens[0] != 'with':
+            return names
+        i = 1
+        while True:
+            if i + 2 >= len(tokens) or not _NAME.match(tokens[i]) or tokens[i + 1] != 'as' or tokens[i + 2] != '(':
+                self._reject("Не удалось разобрать WITH")
+            names.add(tokens[i])
+            depth, i = 0, i + 2
+            while i < len(tokens):
+                depth += {'(': 1, ')': -1}.get(tokens[i], 0)
+                i += 1
+                if depth == 0:
+                    break
+            if i < len(tokens) and tokens[i] == ',':
+                i += 1
+                continue
+            return names
+
+    async def begin(self, session: AsyncSession):
+        """Первые команды транзакции: только чтение и лимит времени на запрос"""
+        await session.execute(text("SET TRANSACTION READ ONLY"))
+        await session.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}"))
+
+    async def check_plan(self, session: AsyncSession, sql: str, params: Dict[str, Any] = None):
+        """Оценка планировщика против потолков стоимости и числа строк"""
+        result = await session.execute(text("EXPLAIN (FORMAT JSON) " + sql), params or {})
+        plan = result.scalar()[0]['Plan']
+        cost = plan['Total Cost']
+        rows = self._max_rows(plan)
+        if cost > self.max_cost or rows > self.max_rows:
+            self.stats["too_expensive"] += 1
+            print(f"⛔ Запрос слишком тяжелый: стоимость {cost:.0f}, строк {rows:.0f}")
+            raise QueryRejected("Запрос слишком тяжелый")
+
+    async def execute(self, session: AsyncSession, sql: str, params: Dict[str, Any] = None):
+        """Выполнить проверенный запрос; превышение statement_timeout -> QueryRejected"""
+        with self.timeouts():
+            return await session.execute(text(sql), params or {})
+
+    async def stream(self, session: AsyncSession, sql: str, params: Dict[str, Any] = None, batch_size: int = 1000):
+        """Выполнить проверенный запрос с серверным курсором: строки читаются пачками по batch_size
+
+        statement_timeout действует на каждое чтение курсора - чтение оборачивается в timeouts().
+        """
+        with self.timeouts():
+            return await session.stream(text(sql), params or {}, execution_options={"yield_per": batch_size})
+
+    @contextmanager
+    def timeouts(self):
+        """Превышение statement_timeout внутри блока -> QueryRejected"""
+        try:
+            yield
+        except DBAPIError as e:
+            if getattr(e.orig, 'sqlstate', None) == '57014' or 'statement timeout' in str(e.orig):
+                self.stats["timeouts"] += 1
+                raise QueryRejected("Запрос выполнялся слишком долго")
+            raise
+
+    @classmethod
+    def _max_rows(cls, plan: Dict[str, Any]) -> float:
+        return max([plan.get('Plan Rows', 0)] + [cls._max_rows(child) for child in plan.get('Plans', [])])
+
+    def _reject(self, reason: str):
+        self.stats["rejected"] += 1
+        print(f"⛔ Запрос отклонен: {reason}")
+        raise QueryRejected(reason)
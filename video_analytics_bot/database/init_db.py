@@ -1,56 +1,104 @@
+import os
 import json
 import asyncio
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from contextlib import aclosing
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
 from datetime import datetime
 from .models import Base, Video, VideoSnapshot
+from .bulk_loader import BulkLoader
+from .json_stream import stream_videos
+from .timestamps import TimestampDecoder
+from .rollups import refresh_rollups, is_dense_closing, CLOSING_TABLE
+from .partitions import ensure_partitions, is_unpartitioned, set_aside_unpartitioned, move_unpartitioned, month_start
+from .result_cache import ENSURE_DATA_VERSION_SQL, BUMP_DATA_VERSION_SQL
 from config import config
-import pytz
+
+# Общий декодер дат для построчной загрузки и внешних вызовов
+_decoder = TimestampDecoder()
 
 class DatabaseInitializer:
-    def __init__(self):
-        self.engine = create_async_engine(
-            config.database_url.replace("postgresql://", "postgresql+asyncpg://"),
-            echo=False
-        )
+    def __init__(self, engine: AsyncEngine = None):
+        # Если передан общий движок процесса - используем его и не закрываем
+        self.owns_engine = engine is None
+        self.engine = engine or create_async_engine(config.async_database_url, echo=False)
         self.async_session = sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
     
     async def create_tables(self):
-        """Создание таблиц в базе данных"""
+        """Создание таблиц и индексов в базе данных
+
+        video_snapshots, созданная до перехода на партиции, переносится в
+        партиционированную таблицу в той же транзакции. video_daily_closing
+        прежнего вида (строка за каждый день) удаляется: ее заново построит
+        ensure_rollups при синхронизации.
+        """
         async with self.engine.begin() as conn:
+            raw = (await conn.get_raw_connection()).driver_connection
+            migrate = await is_unpartitioned(raw)
+            if migrate:
+                print("🗂 Переношу video_snapshots в партиционированную таблицу...")
+                await set_aside_unpartitioned(raw)
+            if await is_dense_closing(raw):
+                print(f"🗂 Пересоздаю {CLOSING_TABLE}: хранятся только дни изменений")
+                await raw.execute(f"DROP TABLE {CLOSING_TABLE}")
             await conn.run_sync(Base.metadata.create_all)
+            # create_all создает индексы только вместе с новой таблицей - досоздаем для существующих
+            await conn.run_sync(self._create_indexes)
+            if migrate:
+                moved = await move_unpartitioned(raw, VideoSnapshot.__table__.columns.keys())
+                print(f"✅ Перенесено снапшотов: {moved}")
+            await conn.execute(text(ENSURE_DATA_VERSION_SQL))
+    
+    async def _ensure_partitions(self, session: AsyncSession, timestamps):
+        """Партиции для снапшотов построчной загрузки - на соединении и в транзакции самой сессии"""
+        raw = await (await session.connection()).get_raw_connection()
+        await ensure_partitions(raw.driver_connection, timestamps)
+    
+    @staticmethod
+    def _create_indexes(sync_conn):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(sync_conn, checkfirst=True)
+    
+    async def refresh_rollups(self):
+        """Полный пересчет дневных итогов снапшотов"""
+        async with self.engine.connect() as sa_conn:
+            raw = await sa_conn.get_raw_connection()
+            await refresh_rollups(raw.driver_connection)
     
     async def load_json_data(self, json_file_path: str):
         """Загрузка данных из JSON файла с проверкой дубликатов"""
         try:
             print(f"📂 Загружаем JSON файл: {json_file_path}")
             
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if not os.path.exists(json_file_path):
+                raise FileNotFoundError(json_file_path)
             
-            # ВАЖНО: JSON может быть объектом с ключом "videos"
-            if isinstance(data, dict) and 'videos' in data:
-                print(f"✅ Найден ключ 'videos' в JSON объекте")
-                videos_list = data['videos']
-            elif isinstance(data, list):
-                print(f"✅ JSON является массивом")
-                videos_list = data
-            else:
-                print(f"❌ Неизвестный формат JSON: {type(data)}")
-                print(f"   Доступные ключи: {list(data.keys()) if isinstance(data, dict) else 'N/A'}")
-                return
+            # Файл читается потоково: в памяти только очередь из нескольких пачек видео
+            print(f"📊 Потоковая обработка видео из {json_file_path}")
+            videos_stream = stream_videos(json_file_path)
             
-            print(f"📊 Количество видео для обработки: {len(videos_list)}")
+            if config.INGEST_MODE == "bulk":
+                # COPY в staging-таблицы + INSERT ... ON CONFLICT пачками
+                loader = BulkLoader(self.engine, TimestampDecoder())
+                async with aclosing(videos_stream):
+                    await loader.load(videos_stream)
+                return
             
-            async with self.async_session() as session:
+            async with aclosing(videos_stream), self.async_session() as session:
                 videos_processed = 0
                 snapshots_processed = 0
                 duplicates_skipped = 0
+                # Месяцы, для которых партиции снапшотов уже есть (созданы в транзакции сессии:
+                # после отката множество очищается, партиции проверяются заново)
+                months_ready = set()
                 
-                for i, video_data in enumerate(videos_list):
+                i = -1
+                async for video_data in videos_stream:
+                    i += 1
                     try:
                         # Проверяем структуру видео
                         if not isinstance(video_data, dict):
@@ -93,10 +141,31 @@ class DatabaseInitializer:
                         # Добавляем снапшоты если есть
                         snapshots = video_data.get('snapshots', [])
                         if isinstance(snapshots, list):
+                            created = [
+                                self.parse_datetime(s.get('created_at')) for s in snapshots if isinstance(s, dict)
+                            ]
+                            new_months = {month_start(c) for c in created if c} - months_ready
+                            if new_months:
+                                await self._ensure_partitions(session, new_months)
+                                months_ready.update(new_months)
+                            snapshot_ids = [
+                                str(s.get('id', f"snap_{video_id}_{j}")) for j, s in enumerate(snapshots)
+                                if isinstance(s, dict)
+                            ]
+                            # Ключ партиций - (id, created_at): уникальность id проверяем сами, остается первый снапшот.
+                            # text() не вызывает autoflush - снапшоты прошлых видео сбрасываем явно
+                            await session.flush()
+                            known_ids = set((await session.execute(
+                                text("SELECT id FROM video_snapshots WHERE id = ANY(:ids)"), {"ids": snapshot_ids}
+                            )).scalars())
                             for j, snapshot_data in enumerate(snapshots):
                                 if isinstance(snapshot_data, dict):
+                                    snapshot_id = str(snapshot_data.get('id', f"snap_{video_id}_{j}"))
+                                    if snapshot_id in known_ids:
+                                        continue
+                                    known_ids.add(snapshot_id)
                                     snapshot = VideoSnapshot(
-                                        id=str(snapshot_data.get('id', f"snap_{video_id}_{j}")),
+                                        id=snapshot_id,
                                         video_id=video_id,
                                         views_count=int(snapshot_data.get('views_count', 0)),
                                         likes_count=int(snapshot_data.get('likes_count', 0)),
@@ -116,6 +185,7 @@ class DatabaseInitializer:
                         
                         # Коммитим каждые 20 видео для производительности
                         if videos_processed % 20 == 0:
+                            await session.execute(text(BUMP_DATA_VERSION_SQL))
                             await session.commit()
                             print(f"🔄 Обработано {videos_processed} видео и {snapshots_processed} снапшотов...")
                             
@@ -124,13 +194,19 @@ class DatabaseInitializer:
                         print(f"   ID видео: {video_data.get('id', 'unknown')}")
                         # Откатываем транзакцию и продолжаем
                         await session.rollback()
+                        # Партиции создавались в этой же транзакции - откат удалил и их
+                        months_ready.clear()
                         continue
                 
                 # Финальный коммит
+                await session.execute(text(BUMP_DATA_VERSION_SQL))
                 await session.commit()
                 print(f"✅ Всего обработано: {videos_processed} видео и {snapshots_processed} снапшотов")
                 if duplicates_skipped > 0:
                     print(f"⚠️ Пропущено дубликатов: {duplicates_skipped}")
+            
+            # Построчная загрузка не отслеживает дни - итоги пересчитываются целиком
+            await self.refresh_rollups()
                 
         except FileNotFoundError:
             print(f"❌ Файл не найден: {json_file_path}")
@@ -145,38 +221,10 @@ class DatabaseInitializer:
             import traceback
             traceback.print_exc()
     
-    def parse_datetime(self, dt_str: str) -> datetime:
-        """Парсинг строки даты-времени"""
-        if not dt_str:
-            return datetime.utcnow()
-        
-        try:
-            # Различные форматы дат
-            formats = [
-                '%Y-%m-%dT%H:%M:%S.%f%z',  # 2025-11-26T11:00:08.983295+00:00
-                '%Y-%m-%dT%H:%M:%S%z',     # 2025-08-19T08:54:35+00:00
-                '%Y-%m-%dT%H:%M:%S.%f',    # 2025-11-26T11:00:08.983295
-                '%Y-%m-%dT%H:%M:%S',       # 2025-11-26T11:00:09
-                '%Y-%m-%d %H:%M:%S',       # 2025-11-26 11:00:09
-            ]
-            
-            for fmt in formats:
-                try:
-                    dt = datetime.strptime(dt_str, fmt)
-                    # Если есть информация о временной зоне, конвертируем в UTC
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(pytz.UTC).replace(tzinfo=None)
-                    return dt
-                except ValueError:
-                    continue
-            
-            # Если ни один формат не подошел, возвращаем текущее время
-            print(f"⚠️ Не удалось распарсить дату: {dt_str}")
-            return datetime.utcnow()
-            
-        except Exception as e:
-            print(f"⚠️ Ошибка парсинга даты '{dt_str}': {e}")
-            return datetime.utcnow()
+    @staticmethod
+    def parse_datetime(dt_str: str) -> datetime:
+        """Парсинг строки даты-времени (наивное время в UTC)"""
+        return _decoder.decode(dt_str)
     
     async def initialize(self, json_file_path: str):
         """Полная инициализация базы данных"""
@@ -190,4 +238,5 @@ class DatabaseInitializer:
     
     async def close(self):
         """Закрытие соединения"""
-        await self.engine.dispose()
\ No newline at end of file
+        if self.owns_engine:
+            await self.engine.dispose()
\ No newline at end of file
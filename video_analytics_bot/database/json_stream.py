@@ -0,0 +1,252 @@
+import io
+import re
+import json
+import gzip
+import asyncio
+import threading
+from typing import Iterator, AsyncIterator, Any, Optional, TextIO, Callable
+from config import config
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+# Пропускает все, кроме скобок: обычные символы и строки целиком (вместе со скобками внутри них)
+_SKIP = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_LITERAL = re.compile(r'[^,\]}\s]+')
+_WHITESPACE = re.compile(r'\s*')
+
+def open_source(path: str) -> TextIO:
+    """Открыть файл как текст (gzip и zstd распознаются по сигнатуре)"""
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, 'rt', encoding='utf-8')
+
+    if magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Для чтения .zst установите пакет zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(raw, encoding='utf-8')
+
+    return open(path, 'r', encoding='utf-8')
+
+def is_ndjson_path(path: str) -> bool:
+    name = path.lower()
+    for suffix in ('.gz', '.zst', '.zstd'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name.endswith(NDJSON_SUFFIXES)
+
+class _Scanner:
+    """Потоковый разбор JSON: текст верхнеуровневых значений без их декодирования"""
+
+    def __init__(self, stream: TextIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Дочитать следующий кусок файла (False - файл закончился)"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def compact(self):
+        """Отбросить уже разобранную часть буфера"""
+        if self.pos > len(self.buf) // 2:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        """Следующий значимый символ (пробелы пропускаются)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Ожидался '{char}' в позиции {self.pos}, найдено {self.peek()!r}")
+        self.pos += 1
+
+    def read_value(self) -> str:
+        """Текст следующего значения: объект/массив целиком, строка или литерал"""
+        first = self.peek()
+        if first is None:
+            raise ValueError("Неожиданный конец файла")
+        start = self.pos
+
+        if first in '{[':
+            depth, i = 0, start
+            while True:
+                i = _SKIP.match(self.buf, i).end()
+                if i >= len(self.buf) or self.buf[i] == '"':
+                    # Закончился буфер или строка оборвалась на границе куска
+                    if not self.fill():
+                        raise ValueError("Неожиданный конец файла внутри значения")
+                    continue
+                char = self.buf[i]
+                i += 1
+                if char in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        self.pos = i
+                        return self.buf[start:i]
+
+        pattern = _STRING if first == '"' else _LITERAL
+        while True:
+            m = pattern.match(self.buf, start)
+            # Литерал у конца буфера может продолжаться в следующем куске
+            if m and (m.end() < len(self.buf) or self.eof):
+                self.pos = m.end()
+                return m.group(0)
+            if not self.fill():
+                if m:
+                    self.pos = m.end()
+                    return m.group(0)
+                raise ValueError("Неожиданный конец файла внутри строки")
+
+    def iter_array(self) -> Iterator[str]:
+        """Элементы массива, на начале которого стоит сканер"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            self.compact()
+            yield self.read_value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Ожидалась ',' или ']' в позиции {self.pos - 1}, найдено {char!r}")
+
+    def iter_values(self) -> Iterator[str]:
+        """Значения подряд (NDJSON / склеенные объекты)"""
+        while self.peek() is not None:
+            self.compact()
+            yield self.read_value()
+
+def iter_raw_records(path: str, chunk_size: int = 1 << 20) -> Iterator[str]:
+    """Текст каждого видео из файла, без загрузки файла в память целиком.
+
+    Поддерживаются форматы:
+    - массив видео: [{...}, {...}];
+    - объект с ключом "videos": {"videos": [{...}, ...]};
+    - NDJSON: одно видео в строке;
+    а также их сжатые gzip/zstd варианты.
+    """
+    with open_source(path) as stream:
+        scanner = _Scanner(stream, chunk_size)
+
+        if is_ndjson_path(path):
+            print("✅ Формат NDJSON")
+            yield from scanner.iter_values()
+            return
+
+        first = scanner.peek()
+        if first == '[':
+            print("✅ JSON является массивом")
+            yield from scanner.iter_array()
+            return
+
+        if first != '{':
+            raise ValueError(f"Неизвестный формат JSON: начинается с {first!r}")
+
+        # Объект верхнего уровня: ищем ключ "videos", остальные значения пропускаем.
+        # Буфер не сжимаем, пока не ясно, что это не одно видео из NDJSON.
+        object_start = scanner.pos
+        scanner.expect('{')
+        while scanner.peek() != '}':
+            key = json.loads(scanner.read_value())
+            scanner.expect(':')
+            if key == 'videos' and scanner.peek() == '[':
+                print("✅ Найден ключ 'videos' в JSON объекте")
+                yield from scanner.iter_array()
+                return
+            scanner.read_value()
+            if scanner.peek() == ',':
+                scanner.pos += 1
+        scanner.pos += 1
+
+        # Ключа "videos" нет - значит это NDJSON без расширения
+        print("✅ Формат NDJSON (объекты подряд)")
+        yield scanner.buf[object_start:scanner.pos]
+        yield from scanner.iter_values()
+
+def iter_videos(path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Декодированные видео по одному"""
+    for raw in iter_raw_records(path, chunk_size):
+        yield json.loads(raw)
+
+_END = object()
+
+async def iterate_in_thread(
+    make_iterator: Callable[[], Iterator[Any]], batch_size: int = 100, queue_size: int = None
+) -> AsyncIterator[Any]:
+    """Элементы синхронного итератора через ограниченную очередь.
+
+    Итератор работает в отдельном потоке, пока event loop пишет в базу; когда
+    очередь заполнена, поток ждет (back-pressure), поэтому память не растет.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or config.INGEST_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item):
+        if not stop.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        try:
+            batch = []
+            for element in make_iterator():
+                if stop.is_set():
+                    return
+                batch.append(element)
+                if len(batch) >= batch_size:
+                    put(batch)
+                    batch = []
+            if batch:
+                put(batch)
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            for element in item:
+                yield element
+    finally:
+        # Освобождаем поток, если он ждет места в очереди
+        stop.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
+
+def stream_videos(path: str, batch_size: int = 100, queue_size: int = None) -> AsyncIterator[Any]:
+    """Декодированные видео из файла; разбор JSON идет параллельно с записью в базу"""
+    return iterate_in_thread(lambda: iter_videos(path), batch_size, queue_size)
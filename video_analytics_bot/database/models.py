@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, BigInteger, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import datetime
@@ -19,8 +19,23 @@ class Video(Base):
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
     snapshots = relationship("VideoSnapshot", back_populates="video", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Видео креатора за период; ведущая колонка заменяет отдельный индекс по creator_id
+        Index('idx_videos_creator_created_at', 'creator_id', 'video_created_at'),
+        Index('idx_videos_created_at', 'video_created_at'),
+        Index('idx_videos_views_count', 'views_count'),
+    )
 
 class VideoSnapshot(Base):
+    """Снапшоты видео: таблица разбита на месячные партиции по created_at (database/partitions.py)
+
+    Ключ партиционирования обязан входить в первичный ключ, поэтому ключ -
+    (id, created_at), и сам по себе он не мешает снапшоту с тем же id и
+    другим created_at попасть в таблицу второй раз. Уникальность id держат
+    загрузчики: снапшот с уже известным id пропускается (insert_staged_snapshots,
+    ORM-загрузка в init_db.py) - как при прежнем первичном ключе по id.
+    """
     __tablename__ = 'video_snapshots'
     
     id = Column(String, primary_key=True)
@@ -33,7 +48,82 @@ class VideoSnapshot(Base):
     delta_likes_count = Column(BigInteger, default=0)
     delta_comments_count = Column(BigInteger, default=0)
     delta_reports_count = Column(BigInteger, default=0)
-    created_at = Column(DateTime, nullable=False)
+    # Ключ партиционирования обязан входить в первичный ключ (см. docstring)
+    created_at = Column(DateTime, primary_key=True)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
-    video = relationship("Video", back_populates="snapshots")
\ No newline at end of file
+    video = relationship("Video", back_populates="snapshots")
+    
+    __table_args__ = (
+        # Снапшоты видео по времени (последний снапшот, фильтр по креатору); заменяет индекс по video_id
+        Index('idx_snapshots_video_created_at', 'video_id', 'created_at'),
+        # Строки партиции пишутся почти по порядку времени - BRIN в сотни раз меньше btree
+        Index('idx_snapshots_created_at_brin', 'created_at', postgresql_using='brin'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+class IngestState(Base):
+    """Отметка последней синхронизации с файлом данных (high-water mark)"""
+    __tablename__ = 'ingest_state'
+    
+    source = Column(String, primary_key=True)
+    file_mtime = Column(Float, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    max_snapshot_created_at = Column(DateTime)
+    synced_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class SnapshotDailyStats(Base):
+    """Итоги снапшотов за день: суммы приращений и число видео с положительным приращением"""
+    __tablename__ = 'snapshot_daily_stats'
+    
+    day = Column(Date, primary_key=True)
+    snapshots_count = Column(BigInteger, default=0)
+    delta_views_count = Column(BigInteger, default=0)
+    delta_likes_count = Column(BigInteger, default=0)
+    delta_comments_count = Column(BigInteger, default=0)
+    delta_reports_count = Column(BigInteger, default=0)
+    videos_with_new_views = Column(BigInteger, default=0)
+    videos_with_new_likes = Column(BigInteger, default=0)
+    videos_with_new_comments = Column(BigInteger, default=0)
+    videos_with_new_reports = Column(BigInteger, default=0)
+
+class SnapshotDailyCreatorStats(Base):
+    """То же, что snapshot_daily_stats, в разрезе креатора"""
+    __tablename__ = 'snapshot_daily_creator_stats'
+    
+    day = Column(Date, primary_key=True)
+    creator_id = Column(String, primary_key=True)
+    snapshots_count = Column(BigInteger, default=0)
+    delta_views_count = Column(BigInteger, default=0)
+    delta_likes_count = Column(BigInteger, default=0)
+    delta_comments_count = Column(BigInteger, default=0)
+    delta_reports_count = Column(BigInteger, default=0)
+    videos_with_new_views = Column(BigInteger, default=0)
+    videos_with_new_likes = Column(BigInteger, default=0)
+    videos_with_new_comments = Column(BigInteger, default=0)
+    videos_with_new_reports = Column(BigInteger, default=0)
+
+class VideoDailyClosing(Base):
+    """Метрики видео на конец дня: значения последнего снапшота этого дня
+
+    Строка есть только за дни, когда у видео были снапшоты; до следующей
+    строки видео значения не меняются. Вопрос "на дату" - последняя строка
+    каждого видео не позже даты: один поиск по первичному ключу (video_id, day)
+    на видео.
+    """
+    __tablename__ = 'video_daily_closing'
+    
+    video_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    views_count = Column(BigInteger, default=0)
+    likes_count = Column(BigInteger, default=0)
+    comments_count = Column(BigInteger, default=0)
+    reports_count = Column(BigInteger, default=0)
+
+class DataVersion(Base):
+    """Версия данных (одна строка): меняется каждой загрузкой, ключ кэша результатов"""
+    __tablename__ = 'data_version'
+    
+    id = Column(Integer, primary_key=True)
+    token = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
\ No newline at end of file
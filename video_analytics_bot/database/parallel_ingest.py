@@ -0,0 +1,124 @@
+import json
+import time
+import asyncio
+import multiprocessing
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .bulk_loader import BulkLoader, convert_video
+from .json_stream import iter_raw_records, iterate_in_thread
+from .timestamps import TimestampDecoder
+from config import config
+
+def iter_raw_chunks(path: str, chunk_size: int) -> Iterator[Tuple[int, List[str]]]:
+    """Куски файла по chunk_size видео: (номер первого видео, тексты видео)"""
+    chunk, start = [], 0
+    for i, raw in enumerate(iter_raw_records(path)):
+        if not chunk:
+            start = i
+        chunk.append(raw)
+        if len(chunk) >= chunk_size:
+            yield start, chunk
+            chunk = []
+    if chunk:
+        yield start, chunk
+
+# Свой декодер дат в каждом процессе-воркере (все куски - из одного файла)
+_decoder = TimestampDecoder()
+
+def decode_chunk(start: int, raw_records: List[str]) -> Tuple[List[Tuple], List[Tuple], int]:
+    """Выполняется в процессе-воркере: JSON, даты и числа -> готовые строки для COPY"""
+    stats = {"errors": 0}
+    videos, snapshots = [], []
+    for offset, raw in enumerate(raw_records):
+        i = start + offset
+        try:
+            video_data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            print(f"❌ Ошибка при обработке видео {i}: {e}")
+            stats["errors"] += 1
+            continue
+        converted = convert_video(i, video_data, _decoder, stats)
+        if converted is None:
+            continue
+        video, video_snapshots = converted
+        videos.append(video)
+        snapshots.extend(video_snapshots)
+    return videos, snapshots, stats["errors"]
+
+class ParallelIngestor:
+    """Параллельная загрузка: чтение -> пул процессов (декодирование) -> N соединений-писателей
+
+    - читатель в отдельном потоке режет файл на куски по chunk_size видео;
+    - пул из workers процессов разбирает JSON, даты и числа;
+    - writers асинхронных писателей, каждый со своим соединением, вставляют куски
+      через COPY + INSERT ... ON CONFLICT, так что дубликаты отсекаются
+      независимо от порядка, в котором куски доходят до базы;
+    - очередь между этапами ограничена, поэтому читатель не убегает вперед.
+    """
+
+    def __init__(self, engine: AsyncEngine, workers: int = None, writers: int = None, chunk_size: int = None):
+        self.engine = engine
+        self.workers = workers or config.INGEST_WORKERS
+        self.writers = writers or config.INGEST_WRITERS
+        self.chunk_size = chunk_size or config.INGEST_BATCH_SIZE
+        # Общие счетчики и формат итогов - как у последовательного загрузчика
+        self.loader = BulkLoader(engine, batch_size=self.chunk_size)
+
+    async def load(self, path: str):
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        print(f"🚀 Параллельная загрузка: {self.workers} процессов, {self.writers} писателей, по {self.chunk_size} видео")
+
+        # В очереди лежат future декодирования: ее размер ограничивает и число кусков в работе
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.writers * 2)
+        # spawn: fork процесса с работающими потоками и event loop небезопасен
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            writers = [asyncio.create_task(self._writer(queue)) for _ in range(self.writers)]
+            try:
+                chunks = iterate_in_thread(lambda: iter_raw_chunks(path, self.chunk_size), batch_size=1)
+                async with aclosing(chunks):
+                    async for start, chunk in chunks:
+                        await self._put(queue, loop.run_in_executor(pool, decode_chunk, start, chunk), writers)
+                for _ in writers:
+                    await self._put(queue, None, writers)
+                await asyncio.gather(*writers)
+            except BaseException:
+                for task in writers:
+                    task.cancel()
+                await asyncio.gather(*writers, return_exceptions=True)
+                raise
+
+        await self.loader.refresh_rollups()
+        self.loader.report(time.perf_counter() - started)
+        return self.loader.stats
+
+    @staticmethod
+    async def _put(queue: asyncio.Queue, item, writers: List[asyncio.Task]):
+        """Положить в очередь, но не ждать вечно, если писатели упали"""
+        put = asyncio.ensure_future(queue.put(item))
+        while not put.done():
+            for task in writers:
+                if task.done() and not task.cancelled() and task.exception():
+                    put.cancel()
+                    raise task.exception()
+            running = [task for task in writers if not task.done()]
+            await asyncio.wait([put, *running], return_when=asyncio.FIRST_COMPLETED)
+
+    async def _writer(self, queue: asyncio.Queue):
+        async with self.engine.connect() as sa_conn:
+            raw = await sa_conn.get_raw_connection()
+            conn = raw.driver_connection
+            await BulkLoader.prepare_staging(conn)
+
+            while True:
+                decoded = await queue.get()
+                if decoded is None:
+                    return
+                videos, snapshots, errors = await decoded
+                self.loader.stats["errors"] += errors
+                if videos:
+                    await self.loader.write_batch(conn, videos, snapshots)
+                print(f"🔄 Обработано {self.loader.stats['videos']} видео и {self.loader.stats['snapshots']} снапшотов...")
@@ -0,0 +1,104 @@
+import re
+from datetime import date, datetime
+from typing import Iterable, Optional, Set
+
+PARENT_TABLE = 'video_snapshots'
+# Ключ блокировки создания партиций: параллельные загрузчики создают одни и те же
+PARTITION_LOCK_KEY = 7_246_002
+# Таблица до перехода на партиции, на время переноса строк
+UNPARTITIONED_TABLE = 'video_snapshots_unpartitioned'
+
+_PARTITION_NAME = re.compile(PARENT_TABLE + r'_(\d{4})_(\d{2})$')
+_PARTITIONS_SQL = (
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    f"WHERE i.inhparent = '{PARENT_TABLE}'::regclass"
+)
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+async def partition_months(conn) -> Set[date]:
+    """Месяцы, для которых есть партиции (asyncpg-соединение)"""
+    months = set()
+    for row in await conn.fetch(_PARTITIONS_SQL):
+        m = _PARTITION_NAME.match(row['relname'])
+        if m:
+            months.add(date(int(m.group(1)), int(m.group(2)), 1))
+    return months
+
+async def ensure_partitions(conn, timestamps: Iterable[Optional[datetime]]) -> int:
+    """Создать месячные партиции video_snapshots для этих моментов времени; вернуть число созданных
+
+    CREATE ... PARTITION OF берет исключительную блокировку родителя до конца
+    транзакции. Массовые загрузчики (bulk_loader, sync) вызывают функцию до
+    транзакции, которая пишет снапшоты, - блокировка держится только на время
+    создания. ORM-загрузка (DatabaseInitializer._ensure_partitions) вызывает ее
+    внутри транзакции сессии: блокировка держится до commit, а откат удаляет
+    и созданные партиции.
+    Индексы (первичный ключ, BRIN и btree) партиция получает от родителя.
+    """
+    months = {month_start(value) for value in timestamps if value is not None}
+    if not months:
+        return 0
+    missing = sorted(months - await partition_months(conn))
+    if not missing:
+        return 0
+
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTITION_LOCK_KEY)
+        for month in missing:
+            await conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            )
+    print(f"🗂 Партиции снапшотов: {', '.join(partition_name(month) for month in missing)}")
+    return len(missing)
+
+async def latest_snapshot_at(conn) -> Optional[datetime]:
+    """max(created_at) снапшотов: читается только самая свежая непустая партиция
+
+    У created_at BRIN-индекс, по нему max не найти - поэтому партиции
+    перебираются от новых к старым.
+    """
+    for month in sorted(await partition_months(conn), reverse=True):
+        value = await conn.fetchval(f"SELECT max(created_at) FROM {partition_name(month)}")
+        if value is not None:
+            return value
+    return None
+
+async def is_unpartitioned(conn) -> bool:
+    """video_snapshots создана до перехода на партиции (обычная таблица)"""
+    kind = await conn.fetchval(f"SELECT relkind::text FROM pg_class WHERE oid = to_regclass('{PARENT_TABLE}')")
+    return kind == 'r'
+
+async def set_aside_unpartitioned(conn):
+    """Первый шаг перехода: переименовать старую таблицу и освободить имена ее индексов"""
+    await conn.execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {UNPARTITIONED_TABLE}")
+    # Первичный и внешний ключи: их имена заберет новая таблица
+    for row in await conn.fetch(
+        f"SELECT conname FROM pg_constraint WHERE conrelid = '{UNPARTITIONED_TABLE}'::regclass AND contype IN ('p', 'f')"
+    ):
+        await conn.execute(f'ALTER TABLE {UNPARTITIONED_TABLE} DROP CONSTRAINT "{row["conname"]}"')
+    for row in await conn.fetch("SELECT indexname FROM pg_indexes WHERE tablename = $1", UNPARTITIONED_TABLE):
+        await conn.execute(f'DROP INDEX "{row["indexname"]}"')
+
+async def move_unpartitioned(conn, columns: Iterable[str]) -> int:
+    """Второй шаг: перенести строки в партиции (по времени - так BRIN точнее) и удалить старую таблицу
+
+    У старой таблицы первичный ключ был по id, так что id переносимых строк уникальны.
+    """
+    months = await conn.fetch(f"SELECT DISTINCT date_trunc('month', created_at) AS month FROM {UNPARTITIONED_TABLE}")
+    await ensure_partitions(conn, (row['month'] for row in months))
+    columns = ', '.join(columns)
+    status = await conn.execute(
+        f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM {UNPARTITIONED_TABLE} "
+        "ORDER BY created_at, id ON CONFLICT DO NOTHING"
+    )
+    await conn.execute(f"DROP TABLE {UNPARTITIONED_TABLE}")
+    return int(status.split()[-1])
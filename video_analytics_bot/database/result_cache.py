@@ -0,0 +1,151 @@
+import re
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Any, Dict
+from config import config
+
+# Версия данных: меняется в той же транзакции, что и загружаемые строки
+ENSURE_DATA_VERSION_SQL = (
+    "INSERT INTO data_version (id, token, updated_at) VALUES (1, gen_random_uuid()::text, now()) "
+    "ON CONFLICT (id) DO NOTHING"
+)
+BUMP_DATA_VERSION_SQL = "UPDATE data_version SET token = gen_random_uuid()::text, updated_at = now() WHERE id = 1"
+DATA_VERSION_SQL = "SELECT token FROM data_version WHERE id = 1"
+
+# Результат таких запросов зависит от текущего времени, а не только от данных
+_VOLATILE = re.compile(
+    r'\b(now|current_date|current_timestamp|localtimestamp|localtime|clock_timestamp|random|timeofday)\b',
+    re.IGNORECASE
+)
+_LITERAL_OR_TEXT = re.compile(r"('(?:[^']|'')*')|([^']+)")
+
+async def bump_data_version(conn):
+    """Новая версия данных (asyncpg-соединение, внутри транзакции загрузки)"""
+    await conn.execute(BUMP_DATA_VERSION_SQL)
+
+def normalize_sql(sql: str) -> str:
+    """Канонический текст SQL: регистр и пробелы вне строковых литералов, без ';' в конце"""
+    parts = []
+    for literal, text in _LITERAL_OR_TEXT.findall(sql.strip().rstrip(';').strip()):
+        parts.append(literal or re.sub(r'\s+', ' ', text.lower()))
+    return ''.join(parts).strip()
+
+class MemoryBackend:
+    """Локальное хранилище LRU (по умолчанию и для тестов вместо общего бэкенда)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def clear(self):
+        self._entries.clear()
+
+    async def close(self):
+        pass
+
+class RedisBackend:
+    """Общий кэш для нескольких реплик бота (нужен пакет redis)"""
+
+    def __init__(self, url: str, ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("Для RESULT_CACHE_URL установите пакет redis")
+        self.client = redis.from_url(url)
+        self.ttl = int(ttl) or None
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(key)
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, value: str):
+        await self.client.set(key, value, ex=self.ttl)
+
+    async def clear(self):
+        # Ключи прошлых версий никто больше не запросит - их удалит TTL
+        pass
+
+    async def close(self):
+        await self.client.close()
+
+class ResultCache:
+    """Кэш результатов аналитических запросов
+
+    Ключ - версия данных + хэш канонического SQL и параметров. Любая загрузка
+    меняет версию в той же транзакции, что и данные, поэтому все прежние
+    записи перестают находиться разом, а устаревший ответ не отдается.
+    Запросы, зависящие от текущего времени (now(), CURRENT_DATE...), не кэшируются.
+    """
+
+    def __init__(self, backend=None, prefix: str = "result"):
+        self.backend = backend or MemoryBackend(config.RESULT_CACHE_SIZE)
+        self.prefix = prefix
+        self._version: Optional[str] = None
+        self.stats = {"hits": 0, "misses": 0, "skipped": 0}
+
+    @classmethod
+    def from_config(cls) -> Optional["ResultCache"]:
+        """Кэш по настройкам: общий при RESULT_CACHE_URL, локальный LRU иначе; None - выключен"""
+        if config.RESULT_CACHE_URL:
+            return cls(RedisBackend(config.RESULT_CACHE_URL, config.RESULT_CACHE_TTL))
+        if config.RESULT_CACHE_SIZE > 0:
+            return cls(MemoryBackend(config.RESULT_CACHE_SIZE))
+        return None
+
+    @staticmethod
+    def is_cacheable(sql: str) -> bool:
+        return not _VOLATILE.search(sql)
+
+    def key(self, version: str, sql: str, params: Dict[str, Any] = None) -> str:
+        digest = hashlib.sha1(
+            (normalize_sql(sql) + json.dumps(params or {}, sort_keys=True, default=str)).encode()
+        ).hexdigest()
+        return f"{self.prefix}:{version}:{digest}"
+
+    async def get(self, version: str, sql: str, params: Dict[str, Any] = None) -> Optional[Any]:
+        """Результат для текущей версии данных (None - нет в кэше)"""
+        if not self.is_cacheable(sql):
+            self.stats["skipped"] += 1
+            return None
+        if version != self._version:
+            # Версия сменилась: записи прошлых версий больше не нужны
+            self._version = version
+            await self.backend.clear()
+
+        try:
+            value = await self.backend.get(self.key(version, sql, params))
+        except Exception as e:
+            # Недоступный кэш не должен ломать ответы - идем в базу
+            print(f"⚠️ Кэш результатов недоступен: {e}")
+            value = None
+        if value is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return json.loads(value)
+
+    async def put(self, version: str, sql: str, params: Dict[str, Any], value: Any):
+        if value is None or not isinstance(value, (int, float, str)) or not self.is_cacheable(sql):
+            return
+        try:
+            await self.backend.set(self.key(version, sql, params), json.dumps(value))
+        except Exception as e:
+            print(f"⚠️ Кэш результатов недоступен: {e}")
+
+    async def close(self):
+        await self.backend.close()
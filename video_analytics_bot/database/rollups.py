@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+from .result_cache import bump_data_version
+
+METRICS = ['views', 'likes', 'comments', 'reports']
+DAILY_TABLE = 'snapshot_daily_stats'
+CREATOR_TABLE = 'snapshot_daily_creator_stats'
+CLOSING_TABLE = 'video_daily_closing'
+CLOSING_COLUMNS = [f"{metric}_count" for metric in METRICS]
+
+# Колонки итогов и выражения, которыми они считаются по video_snapshots (алиас s)
+ROLLUP_COLUMNS = (
+    ['snapshots_count']
+    + [f"delta_{metric}_count" for metric in METRICS]
+    + [f"videos_with_new_{metric}" for metric in METRICS]
+)
+ROLLUP_EXPRESSIONS = (
+    ['COUNT(*)']
+    + [f"COALESCE(SUM(s.delta_{metric}_count), 0)" for metric in METRICS]
+    + [f"COUNT(DISTINCT s.video_id) FILTER (WHERE s.delta_{metric}_count > 0)" for metric in METRICS]
+)
+
+async def refresh_rollups(conn, days: Optional[Iterable[date]] = None):
+    """Пересчитать дневные итоги снапшотов (asyncpg-соединение).
+
+    days - дни, в которые добавились или изменились снапшоты; None - пересчитать все.
+    Итоги за день пересчитываются целиком, поэтому повторный вызов ничего не ломает.
+    """
+    if days is not None:
+        days = sorted(set(days))
+        if not days:
+            return
+
+    columns = ', '.join(ROLLUP_COLUMNS)
+    expressions = ', '.join(ROLLUP_EXPRESSIONS)
+    where, args = _days_filter(days)
+    async with conn.transaction():
+        if days is None:
+            await conn.execute(f"TRUNCATE {DAILY_TABLE}, {CREATOR_TABLE}")
+        else:
+            await conn.execute(f"DELETE FROM {DAILY_TABLE} WHERE day = ANY($1::date[])", days)
+            await conn.execute(f"DELETE FROM {CREATOR_TABLE} WHERE day = ANY($1::date[])", days)
+
+        await conn.execute(
+            f"INSERT INTO {DAILY_TABLE} (day, {columns}) "
+            f"SELECT DATE(s.created_at), {expressions} FROM video_snapshots s {where} GROUP BY 1",
+            *args
+        )
+        await conn.execute(
+            f"INSERT INTO {CREATOR_TABLE} (day, creator_id, {columns}) "
+            f"SELECT DATE(s.created_at), v.creator_id, {expressions} "
+            f"FROM video_snapshots s JOIN videos v ON v.id = s.video_id {where} GROUP BY 1, 2",
+            *args
+        )
+        await refresh_closing(conn, days)
+        await bump_data_version(conn)
+
+    print(f"📈 Дневные итоги пересчитаны: {'все дни' if days is None else f'{len(days)} дн.'}")
+
+def _days_filter(days: Optional[List[date]]) -> Tuple[str, tuple]:
+    """Условие на снапшоты дней days (отсортированы); None - все снапшоты"""
+    if days is None:
+        return "", ()
+    # Диапазон по created_at дает планировщику использовать индекс
+    where = "WHERE s.created_at >= $1 AND s.created_at < $2 AND DATE(s.created_at) = ANY($3::date[])"
+    return where, (days[0], days[-1] + timedelta(days=1), days)
+
+async def refresh_closing(conn, days: Optional[List[date]] = None):
+    """Пересчитать метрики видео на конец дня за дни days (отсортированы; None - все дни)
+
+    Строка есть только за дни, когда у видео были снапшоты, - значения
+    последнего снапшота дня; до следующей строки видео они не меняются.
+    Поэтому таблица растет со снапшотами, а не с числом дней, и новый
+    снапшот меняет только строку своего дня.
+    """
+    columns = ', '.join(CLOSING_COLUMNS)
+    where, args = _days_filter(days)
+    if days is None:
+        await conn.execute(f"TRUNCATE {CLOSING_TABLE}")
+    else:
+        await conn.execute(f"DELETE FROM {CLOSING_TABLE} WHERE day = ANY($1::date[])", days)
+    await conn.execute(
+        f"INSERT INTO {CLOSING_TABLE} (video_id, day, {columns}) "
+        f"SELECT DISTINCT ON (s.video_id, DATE(s.created_at)) s.video_id, DATE(s.created_at), {columns} "
+        f"FROM video_snapshots s {where} "
+        f"ORDER BY s.video_id, DATE(s.created_at), s.created_at DESC, s.id DESC",
+        *args
+    )
+
+async def is_dense_closing(conn) -> bool:
+    """video_daily_closing прежнего вида: строка за каждый день, первичный ключ (day, video_id)"""
+    first_column = await conn.fetchval(
+        "SELECT a.attname FROM pg_index i "
+        "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0] "
+        "WHERE i.indrelid = to_regclass($1) AND i.indisprimary",
+        CLOSING_TABLE
+    )
+    return first_column == 'day'
+
+async def ensure_rollups(conn):
+    """Построить итоги, если снапшоты есть, а итогов нет (база загружена до их появления)"""
+    missing = await conn.fetchval(
+        f"SELECT (NOT EXISTS (SELECT 1 FROM {DAILY_TABLE}) OR NOT EXISTS (SELECT 1 FROM {CLOSING_TABLE})) "
+        "AND EXISTS (SELECT 1 FROM video_snapshots)"
+    )
+    if missing:
+        await refresh_rollups(conn)
@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+from contextlib import aclosing
+from datetime import datetime
+from typing import Iterator, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .bulk_loader import BulkLoader, VIDEO_COLUMNS, SNAPSHOT_COLUMNS, CREATED_AT, convert_video, insert_staged_snapshots
+from .partitions import ensure_partitions, latest_snapshot_at
+from .rollups import refresh_rollups, ensure_rollups
+from .result_cache import bump_data_version
+from .json_stream import iter_videos, iterate_in_thread
+from .timestamps import TimestampDecoder
+from config import config
+
+# Колонки видео, которые обновляются при повторной синхронизации
+UPDATABLE_COLUMNS = [column for column in VIDEO_COLUMNS if column not in ('id', 'created_at')]
+# Счетчики видео, которые берутся из самого свежего снапшота
+COUNTER_COLUMNS = ['views_count', 'likes_count', 'comments_count', 'reports_count']
+VIDEO_ID = SNAPSHOT_COLUMNS.index('video_id')
+# Ключ advisory-блокировки Postgres, под которой идет синхронизация
+SYNC_LOCK_KEY = 7_246_001
+
+def _qualified(alias: str, columns: List[str]) -> str:
+    return ', '.join(f"{alias}.{column}" for column in columns)
+
+class IncrementalSync:
+    """Инкрементальная синхронизация базы с файлом данных
+
+    - файл не перечитывается, если его mtime и размер не изменились
+      с прошлой синхронизации (отметка хранится в таблице ingest_state);
+    - из измененного файла берутся только снапшоты новее отметки своего видео -
+      max(created_at) его снапшотов в базе; у видео без снапшотов в базе берутся все.
+      Общая отметка по всей таблице не годится: видео, добавленное в файл со
+      старыми снапшотами, осталось бы без них. Дубликаты по (id, created_at)
+      отсекает ON CONFLICT;
+    - видео upsert-ятся, но строка переписывается, только если что-то изменилось;
+    - счетчики видео (views_count, likes_count, ...) берутся из самого свежего снапшота;
+    - синхронизация идет под advisory-блокировкой: из нескольких реплик файл читает одна.
+
+    Разбор JSON и дат идет в отдельном потоке, поэтому синхронизацию можно
+    запускать фоновой задачей в процессе бота.
+    """
+
+    def __init__(self, engine: AsyncEngine, path: str = None, batch_size: int = None):
+        self.engine = engine
+        self.path = path or config.DATA_FILE
+        self.batch_size = batch_size or config.INGEST_BATCH_SIZE
+        self.stats = {}
+        self.days = set()
+
+    async def run(self, force: bool = False) -> dict:
+        """Одна синхронизация; force - перечитать файл, даже если он не менялся"""
+        self.stats = {"videos": 0, "snapshots": 0, "updated": 0, "errors": 0}
+        self.days = set()
+        if not os.path.exists(self.path):
+            print(f"⚠️ Файл данных не найден: {self.path}")
+            return self.stats
+
+        stat = os.stat(self.path)
+        started = time.perf_counter()
+
+        async with self.engine.connect() as sa_conn:
+            raw = await sa_conn.get_raw_connection()
+            conn = raw.driver_connection
+
+            # Реплики бота работают с одной базой: файл синхронизирует только одна из них
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", SYNC_LOCK_KEY):
+                print("✅ Синхронизацию уже выполняет другой процесс")
+                return self.stats
+            try:
+                if not await self._sync(conn, stat, force):
+                    return self.stats
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", SYNC_LOCK_KEY)
+
+        print(
+            f"✅ Синхронизация: новых видео {self.stats['videos']}, изменено {self.stats['updated']}, "
+            f"новых снапшотов {self.stats['snapshots']} ({time.perf_counter() - started:.1f} с)"
+        )
+        return self.stats
+
+    async def _sync(self, conn, stat: os.stat_result, force: bool) -> bool:
+        """Синхронизация под блокировкой; False - файл не менялся"""
+        await ensure_rollups(conn)
+        state = await conn.fetchrow(
+            "SELECT file_mtime, file_size, max_snapshot_created_at FROM ingest_state WHERE source = $1",
+            self.path
+        )
+        if state and not force and state['file_mtime'] == stat.st_mtime and state['file_size'] == stat.st_size:
+            print(f"✅ {self.path} не изменился с прошлой синхронизации")
+            return False
+
+        print(f"🔄 Синхронизация {self.path}")
+
+        await BulkLoader.prepare_staging(conn)
+        batches = iterate_in_thread(self._iter_batches, batch_size=1)
+        try:
+            async with aclosing(batches):
+                async for videos, snapshots in batches:
+                    await self._write_batch(conn, videos, snapshots)
+        finally:
+            # Итоги пересчитываются и после ошибки: часть пачек уже записана
+            await refresh_rollups(conn, self.days)
+
+        high_water = await latest_snapshot_at(conn)
+        await conn.execute(
+            "INSERT INTO ingest_state (source, file_mtime, file_size, max_snapshot_created_at, synced_at) "
+            "VALUES ($1, $2, $3, $4, $5) "
+            "ON CONFLICT (source) DO UPDATE SET file_mtime = EXCLUDED.file_mtime, "
+            "file_size = EXCLUDED.file_size, max_snapshot_created_at = EXCLUDED.max_snapshot_created_at, "
+            "synced_at = EXCLUDED.synced_at",
+            self.path, stat.st_mtime, stat.st_size, high_water, datetime.utcnow()
+        )
+        return True
+
+    async def run_periodically(self, interval: float = None):
+        """Фоновая задача: синхронизация раз в interval секунд до отмены"""
+        interval = interval if interval is not None else config.SYNC_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка синхронизации: {type(e).__name__}: {e}")
+
+    def _iter_batches(self) -> Iterator[Tuple[List[Tuple], List[Tuple]]]:
+        """Выполняется в потоке: пачки (видео, их снапшоты из файла)"""
+        decoder = TimestampDecoder()
+        videos, snapshots = [], []
+        for i, video_data in enumerate(iter_videos(self.path)):
+            converted = convert_video(i, video_data, decoder, self.stats)
+            if converted is None:
+                continue
+            video, video_snapshots = converted
+            videos.append(video)
+            snapshots.extend(video_snapshots)
+
+            if len(videos) >= self.batch_size:
+                yield videos, snapshots
+                videos, snapshots = [], []
+        if videos:
+            yield videos, snapshots
+
+    @staticmethod
+    async def _new_snapshots(conn, snapshots: List[Tuple]) -> List[Tuple]:
+        """Снапшоты новее отметки своего видео (max(created_at) в базе); у нового видео - все
+
+        Отметки читаются одним запросом на пачку по индексу (video_id, created_at).
+        """
+        if not snapshots:
+            return snapshots
+        rows = await conn.fetch(
+            "SELECT video_id, max(created_at) AS latest FROM video_snapshots "
+            "WHERE video_id = ANY($1::text[]) GROUP BY video_id",
+            list({s[VIDEO_ID] for s in snapshots})
+        )
+        latest = {row['video_id']: row['latest'] for row in rows}
+        return [s for s in snapshots if s[VIDEO_ID] not in latest or s[CREATED_AT] > latest[s[VIDEO_ID]]]
+
+    async def _write_batch(self, conn, videos: List[Tuple], snapshots: List[Tuple]):
+        # Повторы внутри пачки: как и при полной загрузке, побеждает первое вхождение
+        unique_videos, seen = [], set()
+        for video in videos:
+            if video[0] not in seen:
+                seen.add(video[0])
+                unique_videos.append(video)
+
+        columns = ', '.join(VIDEO_COLUMNS)
+        snapshots = await self._new_snapshots(conn, snapshots)
+        await ensure_partitions(conn, (s[CREATED_AT] for s in snapshots))
+        async with conn.transaction():
+            await conn.copy_records_to_table('stage_videos', records=unique_videos, columns=VIDEO_COLUMNS)
+            rows = await conn.fetch(
+                f"INSERT INTO videos ({columns}) SELECT {columns} FROM stage_videos ORDER BY id "
+                "ON CONFLICT (id) DO NOTHING RETURNING id"
+            )
+            inserted = {row['id'] for row in rows}
+            self.stats["videos"] += len(inserted)
+
+            if snapshots:
+                await conn.copy_records_to_table('stage_video_snapshots', records=snapshots, columns=SNAPSHOT_COLUMNS)
+                snapshots_inserted, days = await insert_staged_snapshots(conn)
+                self.stats["snapshots"] += snapshots_inserted
+                self.days.update(days)
+
+            # Поля видео - из JSON, счетчики - из самого свежего снапшота (если он есть).
+            # Строки, в которых ничего не изменилось, не переписываются.
+            # old - та же строка до обновления: по ней видно, сменился ли креатор.
+            counters = ', '.join(COUNTER_COLUMNS)
+            source = ', '.join(
+                f"COALESCE(s.{column}, st.{column}) AS {column}" if column in COUNTER_COLUMNS else f"st.{column}"
+                for column in UPDATABLE_COLUMNS
+            )
+            rows = await conn.fetch(
+                f"UPDATE videos v SET ({', '.join(UPDATABLE_COLUMNS)}) = ({_qualified('src', UPDATABLE_COLUMNS)}) "
+                f"FROM (SELECT st.id, {source} FROM stage_videos st LEFT JOIN ("
+                f"SELECT DISTINCT ON (video_id) video_id, {counters} FROM video_snapshots "
+                "WHERE video_id IN (SELECT id FROM stage_videos) ORDER BY video_id, created_at DESC"
+                ") s ON s.video_id = st.id) src, videos old "
+                f"WHERE v.id = src.id AND old.id = v.id AND ({_qualified('v', UPDATABLE_COLUMNS)}) "
+                f"IS DISTINCT FROM ({_qualified('src', UPDATABLE_COLUMNS)}) "
+                "RETURNING v.id, old.creator_id IS DISTINCT FROM v.creator_id AS creator_changed"
+            )
+            self.stats["updated"] += sum(1 for row in rows if row['id'] not in inserted)
+            if inserted or rows or snapshots:
+                await bump_data_version(conn)
+
+            # Снапшоты видео, сменившего креатора, переходят в итоги другого креатора
+            moved = [row['id'] for row in rows if row['creator_changed']]
+            if moved:
+                days = await conn.fetch(
+                    "SELECT DISTINCT DATE(created_at) AS day FROM video_snapshots WHERE video_id = ANY($1::text[])",
+                    moved
+                )
+                self.days.update(row['day'] for row in days)
@@ -0,0 +1,104 @@
+import re
+from datetime import datetime, timezone
+from typing import Any, List, Sequence
+
+# Форматы, которые понимал исходный parse_datetime (порядок имеет значение только для вывода)
+FORMATS = [
+    '%Y-%m-%dT%H:%M:%S.%f%z',  # 2025-11-26T11:00:08.983295+00:00
+    '%Y-%m-%dT%H:%M:%S%z',     # 2025-08-19T08:54:35+00:00
+    '%Y-%m-%dT%H:%M:%S.%f',    # 2025-11-26T11:00:08.983295
+    '%Y-%m-%dT%H:%M:%S',       # 2025-11-26T11:00:09
+    '%Y-%m-%d %H:%M:%S',       # 2025-11-26 11:00:09
+]
+
+# Строки ровно этих форм fromisoformat разбирает так же, как strptime по FORMATS.
+# Все остальное (другие смещения, регистр "t", лишние пробелы) идет медленным путем.
+ISO_FAST = re.compile(
+    r'\d{4}-\d{2}-\d{2}'
+    r'(?:T\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?(?:[+-]\d{2}:\d{2}|Z)?'
+    r'| \d{2}:\d{2}:\d{2})\Z'
+)
+
+class TimestampDecoder:
+    """Быстрый разбор дат при загрузке.
+
+    Результат совпадает с прежним parse_datetime: наивное время в UTC,
+    для пустых и нераспознанных значений - текущее время (с тем же
+    предупреждением). Экземпляр создается на один файл: он запоминает,
+    каким форматом strptime закончился последний медленный разбор, и
+    повторяет последнее значение без разбора (created_at и updated_at
+    у снапшота часто совпадают).
+    """
+
+    def __init__(self):
+        self._formats = list(FORMATS)
+        self._last_input = None
+        self._last_output = None
+
+    def __call__(self, value: Any) -> datetime:
+        return self.decode(value)
+
+    def decode(self, value: Any) -> datetime:
+        """Одно значение"""
+        if not value:
+            return datetime.utcnow()
+
+        if value.__class__ is str:
+            if value == self._last_input:
+                return self._last_output
+            if ISO_FAST.match(value):
+                try:
+                    dt = datetime.fromisoformat(value)
+                    if dt.tzinfo is not None:
+                        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+                except (ValueError, OverflowError):
+                    # Некорректная дата: предупреждение выведет медленный путь
+                    return self._decode_slow(value)
+                self._last_input, self._last_output = value, dt
+                return dt
+
+        return self._decode_slow(value)
+
+    def decode_many(self, values: Sequence[Any]) -> List[datetime]:
+        """Целая колонка значений за один вызов"""
+        fromisoformat = datetime.fromisoformat
+        match = ISO_FAST.match
+        utc = timezone.utc
+        decoded = []
+        append = decoded.append
+        for value in values:
+            if value.__class__ is str and match(value):
+                try:
+                    dt = fromisoformat(value)
+                    if dt.tzinfo is not None:
+                        dt = dt.astimezone(utc).replace(tzinfo=None)
+                except (ValueError, OverflowError):
+                    dt = self._decode_slow(value)
+                append(dt)
+            else:
+                append(self.decode(value))
+        return decoded
+
+    def _decode_slow(self, value: Any) -> datetime:
+        """Прежний алгоритм: перебор форматов strptime (удачный формат пробуется первым)"""
+        try:
+            for i, fmt in enumerate(self._formats):
+                try:
+                    dt = datetime.strptime(value, fmt)
+                except ValueError:
+                    continue
+                # Если есть информация о временной зоне, конвертируем в UTC
+                if dt.tzinfo is not None:
+                    dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+                if i:
+                    self._formats.insert(0, self._formats.pop(i))
+                self._last_input, self._last_output = value, dt
+                return dt
+
+            # Если ни один формат не подошел, возвращаем текущее время
+            print(f"⚠️ Не удалось распарсить дату: {value}")
+            return datetime.utcnow()
+
+        except Exception as e:
+            print(f"⚠️ Ошибка парсинга даты '{value}': {e}")
+            return datetime.utcnow()
@@ -0,0 +1,34 @@
+import sys
+import asyncio
+import argparse
+from database.engine import get_engine, dispose_engine
+from database.init_db import DatabaseInitializer
+from database.parallel_ingest import ParallelIngestor
+from config import config
+
+async def ingest(json_file: str, workers: int, writers: int, chunk_size: int):
+    """Параллельная загрузка JSON в базу"""
+    engine = get_engine()
+    try:
+        initializer = DatabaseInitializer(engine)
+        print("Creating tables...")
+        await initializer.create_tables()
+        
+        ingestor = ParallelIngestor(engine, workers=workers, writers=writers, chunk_size=chunk_size)
+        await ingestor.load(json_file)
+    finally:
+        await dispose_engine()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Параллельная загрузка videos_data.json в базу")
+    parser.add_argument("json_file", nargs="?", default=config.DATA_FILE)
+    parser.add_argument("--workers", type=int, default=config.INGEST_WORKERS, help="процессов для разбора JSON")
+    parser.add_argument("--writers", type=int, default=config.INGEST_WRITERS, help="параллельных соединений для записи")
+    parser.add_argument("--chunk-size", type=int, default=config.INGEST_BATCH_SIZE, help="видео в одном куске")
+    args = parser.parse_args()
+    
+    if args.writers > config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW:
+        print("❌ Писателей больше, чем соединений в пуле (DB_POOL_SIZE + DB_MAX_OVERFLOW)")
+        sys.exit(1)
+    
+    asyncio.run(ingest(args.json_file, args.workers, args.writers, args.chunk_size))
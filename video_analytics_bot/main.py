@@ -2,55 +2,55 @@ import asyncio
 import logging
 import sys
 import os
-from pathlib import Path
+import re
+import io
+import csv
+import time
+from html import escape
+from typing import List, Optional
 
+# Конфиг сам читает .env рядом с модулями бота; без файла берутся переменные окружения
+from config import config
 
-from dotenv import load_dotenv
-
-# Находим .env файл относительно этого файла
-current_dir = Path(__file__).parent
-env_path = current_dir / '.env'
-
-if env_path.exists():
-    print(f"✅ Загружаем .env из: {env_path}")
-    load_dotenv(env_path)
-else:
-    print(f"❌ .env файл не найден по пути: {env_path}")
-    print("Создайте .env в той же папке, где main.py")
-    sys.exit(1)
-
-# Теперь импортируем config
-try:
-    from config import config
-    print(f"✅ Конфиг загружен. Токен: {config.TELEGRAM_BOT_TOKEN[:10]}...")
-except ImportError as e:
-    print(f"❌ Ошибка импорта config: {e}")
-    sys.exit(1)
-
-from aiogram import Bot, Dispatcher, types
+from aiogram import Bot, Dispatcher, Router, F, types
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.filters import Command
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.orm import sessionmaker
 
-from database.init_db import DatabaseInitializer
+# Загрузка данных (database.init_db, database.sync), клиент LLM и режим вебхука
+# импортируются при первом использовании: процесс начинает принимать сообщения раньше
+from database.engine import get_engine, get_session_factory, warm_up_pool, dispose_engine, is_connection_error
 from database.crud import DatabaseManager
-from nlp.query_parser import NaturalLanguageParser
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
+from database.result_cache import ResultCache
+from database.columnar import ColumnarStore
+from database.guard import QueryGuard, QueryRejected
+from nlp.query_parser import NaturalLanguageParser, ParsedQuery
+from nlp.fast_path import RuleBasedCompiler
+from readiness import DataReadiness
+from table_files import TableResult, build_table
+from scheduler import FairScheduler, FairSchedulerMiddleware
+from metrics import (
+    REGISTRY, STAGE_SECONDS, REQUESTS, SLOW_QUERIES, CallbackMetric, register_stats, register_pool, start_metrics_server
 )
+
 logger = logging.getLogger(__name__)
 
+def setup_logging():
+    """Логи в bot.log и stdout (вызывается при запуске, а не при импорте модуля)"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('bot.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
 def format_number(value):
     """Форматирование числа - убираем разделители тысяч и округляем"""
     if value is None:
@@ -71,60 +71,128 @@ def format_number(value):
         # Если не удалось преобразовать в число, возвращаем как есть
         return str(value)
 
-def create_bot():
-    """Создание объекта бота с проверкой токена"""
+# Файл с пакетом вопросов больше этого не скачивается
+BATCH_MAX_FILE_BYTES = 1_000_000
+# Лимит длины сообщения Telegram с запасом
+MESSAGE_LIMIT = 4000
+
+# Пункт списка: нумерация ("1.", "2)") или маркер
+LIST_ITEM = re.compile(r'^\s*(?:\d{1,3}[.)]|[-•*])\s+')
+
+def split_questions(text: str) -> List[str]:
+    """Вопросы пакета: по одному на строку, без нумерации ("1.", "2)") и маркеров списка"""
+    questions = []
+    for line in text.splitlines():
+        line = LIST_ITEM.sub('', line).strip()
+        if line:
+            questions.append(line)
+    return questions
+
+def message_questions(text: str, fast_path: RuleBasedCompiler) -> List[str]:
+    """Вопросы сообщения
+
+    Несколько вопросов - только если каждая строка пункт списка или каждая
+    строка отдельно уверенно разбирается быстрым путем. Иначе сообщение -
+    один вопрос, перенесенный на несколько строк.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) > 1:
+        if all(LIST_ITEM.match(line) for line in lines):
+            return split_questions(text)
+        if all(fast_path.understands(line) for line in lines):
+            return [line.strip() for line in lines]
+    return [text.strip()]
+
+def questions_from_csv(text: str) -> List[str]:
+    """Вопросы из CSV: первая непустая ячейка строки, строка заголовка пропускается"""
+    questions = []
+    for row in csv.reader(io.StringIO(text)):
+        cell = next((value.strip() for value in row if value.strip()), None)
+        if cell and cell.lower() not in ('question', 'questions', 'вопрос', 'вопросы'):
+            questions.append(cell)
+    return questions
+
+def format_table(table: TableResult) -> List[str]:
+    """Строки сообщения с маленькой таблицей: ключ и значение (format_number)"""
+    if not table.rows:
+        return ["Нет данных для такой таблицы."]
+    key_name, value_name = table.columns
+    lines = [f"<b>{escape(key_name)} — {escape(value_name)}</b>"]
+    for i, (key, value) in enumerate(table.rows, 1):
+        lines.append(f"{i}. {escape(str(key))} — <b>{format_number(value)}</b>")
+    return lines
+
+async def answer_lines(message: types.Message, lines: List[str]):
+    """Длинный ответ делится на сообщения по границам строк"""
+    chunk = ""
+    for line in lines:
+        if chunk and len(chunk) + len(line) + 1 > MESSAGE_LIMIT:
+            await message.answer(chunk)
+            chunk = ""
+        chunk = f"{chunk}\n{line}" if chunk else line
+    await message.answer(chunk)
+
+# Ответ на вопрос о данных, пока они загружаются при старте
+NOT_READY_TEXT = (
+    "⏳ <b>Данные еще загружаются.</b>\n"
+    "Бот только что запустился - повторите вопрос через минуту."
+)
+
+def create_bot() -> Bot:
+    """Создание объекта бота с проверкой токена (RuntimeError - токен не задан или некорректен)"""
     token = config.TELEGRAM_BOT_TOKEN
     
     if not token:
-        logger.error("TELEGRAM_BOT_TOKEN не установлен!")
-        sys.exit(1)
+        raise RuntimeError("TELEGRAM_BOT_TOKEN не установлен!")
     
     if ':' not in token:
-        logger.error(f"Токен не содержит ':' : {token[:20]}...")
-        sys.exit(1)
+        raise RuntimeError(f"Токен не содержит ':' : {token[:20]}...")
     
     print(f"🔄 Создаю бота с токеном: {token[:10]}...")
-    
-    try:
-        bot = Bot(
-            token=token,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-        )
-        print("✅ Объект бота создан")
-        return bot
-    except Exception as e:
-        logger.error(f"Ошибка создания бота: {e}")
-        sys.exit(1)
-
-# Создаем бота
-bot = create_bot()
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+    bot = Bot(
+        token=token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    print("✅ Объект бота создан")
+    return bot
 
-# Инициализация парсера NLP
-nlp_parser = NaturalLanguageParser()
+async def load_data(engine: AsyncEngine, readiness: DataReadiness):
+    """Таблицы и синхронизация с файлом данных; по окончании данные готовы к вопросам
 
-async def initialize_database():
-    """Инициализация базы данных"""
+    Если в базе уже есть данные прошлого запуска, вопросы принимаются сразу
+    после создания таблиц, а файл досинхронизируется следом (ответы
+    из кэша результатов сбросит смена версии данных).
+    """
+    from database.init_db import DatabaseInitializer
+    from database.sync import IncrementalSync
+    
+    readiness.mark_loading()
     try:
-        initializer = DatabaseInitializer()
-        json_file = "data/videos_data.json"
+        initializer = DatabaseInitializer(engine)
+        json_file = config.DATA_FILE
+        
+        logger.info("Создаю таблицы...")
+        await initializer.create_tables()
+        await initializer.close()
+        
+        async with engine.connect() as conn:
+            if await conn.scalar(text("SELECT EXISTS (SELECT 1 FROM videos)")):
+                readiness.mark_ready()
         
         if os.path.exists(json_file):
-            await initializer.initialize(json_file)
+            # Загружаются только новые и измененные данные; неизмененный файл не перечитывается
+            await IncrementalSync(engine, json_file).run()
         else:
             logger.warning(f"JSON файл не найден: {json_file}")
-            logger.info("Создаю таблицы без данных...")
-            await initializer.create_tables()
         
-        await initializer.close()
+        readiness.mark_ready()
         logger.info("✅ База данных инициализирована")
         
     except Exception as e:
-        logger.error(f"❌ Ошибка инициализации базы данных: {e}")
+        logger.error(f"❌ Ошибка инициализации базы данных: {type(e).__name__}: {e}")
+        readiness.mark_failed(e)
         raise
 
-@dp.message(Command("start"))
 async def cmd_start(message: types.Message):
     """Обработчик команды /start"""
     welcome_text = (
@@ -134,12 +202,12 @@ async def cmd_start(message: types.Message):
         "• Сколько видео у креатора с id ... вышло с 1 по 5 ноября 2025?\n"
         "• Сколько видео набрало больше 100000 просмотров?\n"
         "• На сколько просмотров в сумме выросли все видео 28 ноября 2025?\n"
-        "• Сколько разных видео получали новые просмотры 27 ноября 2025?\n\n"
-        "Я верну вам ответ в виде одного числа."
+        "• Сколько разных видео получали новые просмотры 27 ноября 2025?\n"
+        "• Топ 10 креаторов по приросту просмотров с 1 по 5 ноября 2025\n\n"
+        "Я верну вам ответ в виде одного числа, а на вопрос с разбивкой - таблицу или файл."
     )
     await message.answer(welcome_text)
 
-@dp.message(Command("help"))
 async def cmd_help(message: types.Message):
     """Обработчик команды /help"""
     help_text = (
@@ -155,44 +223,219 @@ async def cmd_help(message: types.Message):
         "   • 'На сколько просмотров выросли все видео вчера?'\n\n"
         "4. <b>Динамика просмотров:</b>\n"
         "   • 'Сколько разных видео получали новые просмотры 27 ноября 2025?'\n\n"
+        "5. <b>Несколько вопросов сразу:</b>\n"
+        "   • списком (1. 2. 3.) в одном сообщении или по вопросу на строку в файле .txt / .csv\n\n"
+        "6. <b>Таблицы:</b>\n"
+        "   • 'На сколько выросли просмотры по дням в ноябре 2025?'\n"
+        "   • 'Топ 10 видео по лайкам'\n"
+        f"   • до {config.TABLE_INLINE_ROWS} строк - сообщением, больше - файлом {config.TABLE_FILE_FORMAT.upper()}\n\n"
         "Просто напишите вопрос, и я постараюсь на него ответить!"
     )
     await message.answer(help_text)
 
-@dp.message()
-async def handle_text_query(message: types.Message):
-    """Обработчик текстовых запросов"""
+async def answer_batch(
+    message: types.Message, questions: List[str], async_session: sessionmaker, nlp_parser: NaturalLanguageParser,
+    result_cache: ResultCache = None, query_guard: QueryGuard = None
+):
+    """Пакет вопросов: трансляция параллельно, все запросы в одной транзакции
+
+    Совместимые запросы объединяются в один SELECT (DatabaseManager.execute_batch),
+    ответы приходят одним пронумерованным сообщением. Вопросы-таблицы в пакете
+    не выполняются: их ответ не помещается в строку списка.
+    """
+    if len(questions) > config.BATCH_MAX_QUESTIONS:
+        await message.answer(
+            "❌ <b>Слишком много вопросов в пакете.</b>\n"
+            f"Отправьте не больше {config.BATCH_MAX_QUESTIONS} за раз."
+        )
+        return
+    
+    with STAGE_SECONDS.time(stage="batch_parse"):
+        translated = await asyncio.gather(
+            *(nlp_parser.parse_query(question) for question in questions), return_exceptions=True
+        )
+    understood = [
+        i for i, item in enumerate(translated) if not isinstance(item, Exception) and item.sql is not None
+    ]
+    tables = {i for i in understood if translated[i].spec and translated[i].spec.group_by}
+    understood = [i for i in understood if i not in tables]
+    logger.info(f"User {message.from_user.id}: batch of {len(questions)} questions, understood {len(understood)}")
+    
+    results = {}
+    if understood:
+        with STAGE_SECONDS.time(stage="batch_db"):
+            async with async_session() as session:
+                db_manager = DatabaseManager(session, result_cache, query_guard)
+                values = await db_manager.execute_batch([(translated[i].sql, translated[i].params) for i in understood])
+        results = dict(zip(understood, values))
+    
+    lines = []
+    for i, question in enumerate(questions):
+        if i in tables:
+            answer = "📄 ответ - таблица, задайте этот вопрос отдельным сообщением"
+        elif i not in results:
+            answer = "❌ не удалось понять вопрос"
+        elif isinstance(results[i], QueryRejected):
+            answer = f"⛔ {results[i].reason}"
+        elif results[i] is None:
+            answer = "❌ не удалось получить результат"
+        else:
+            answer = f"<b>{format_number(results[i])}</b>"
+            nlp_parser.confirm(question, translated[i])
+        lines.append(f"{i + 1}. {escape(question)} — {answer}")
+    await answer_lines(message, lines)
+
+async def answer_table(
+    message: types.Message, parsed: ParsedQuery, async_session: sessionmaker, query_guard: QueryGuard = None
+):
+    """Ответ на вопрос с разбивкой (group_by): маленькая таблица - сообщением, большая - файлом
+
+    Строки читаются серверным курсором и сразу пишутся в файл (table_files.py),
+    поэтому память не растет с числом строк. Файл удаляется после отправки.
+    """
+    with STAGE_SECONDS.time(stage="db"):
+        async with async_session() as session:
+            db_manager = DatabaseManager(session, guard=query_guard)
+            table = await build_table(parsed.spec.columns, db_manager.stream_rows(parsed.sql, parsed.params))
+    
+    with STAGE_SECONDS.time(stage="reply"):
+        if table.file is None:
+            await answer_lines(message, format_table(table))
+            return
+        try:
+            caption = f"📄 Строк: {table.file.rows}"
+            if table.file.truncated:
+                caption += " - таблица обрезана по лимиту, уточните вопрос (период, креатор, топ N)"
+            await message.answer_document(
+                types.FSInputFile(table.file.path, filename=table.file.filename), caption=caption
+            )
+        finally:
+            table.file.remove()
+
+async def handle_document(
+    message: types.Message, async_session: sessionmaker, nlp_parser: NaturalLanguageParser,
+    result_cache: ResultCache = None, query_guard: QueryGuard = None, readiness: DataReadiness = None
+):
+    """Пакет вопросов из файла .txt или .csv (по вопросу на строку)"""
+    if readiness and not readiness.is_ready:
+        await message.answer(NOT_READY_TEXT)
+        return
+    document = message.document
+    name = (document.file_name or "").lower()
+    if not name.endswith(('.txt', '.csv')):
+        await message.answer("❌ <b>Поддерживаются файлы .txt и .csv</b> с вопросом на каждой строке.")
+        return
+    if document.file_size and document.file_size > BATCH_MAX_FILE_BYTES:
+        await message.answer("❌ <b>Файл слишком большой.</b>")
+        return
+    
+    try:
+        data = await message.bot.download(document)
+        text = data.read().decode('utf-8-sig', errors='replace')
+        questions = questions_from_csv(text) if name.endswith('.csv') else split_questions(text)
+        if not questions:
+            await message.answer("❌ <b>В файле нет вопросов.</b>")
+            return
+        await answer_batch(message, questions, async_session, nlp_parser, result_cache, query_guard)
+    except Exception as e:
+        logger.error(f"Error processing batch file from user {message.from_user.id}: {e}")
+        await message.answer(
+            "❌ <b>Произошла ошибка при обработке файла.</b>\n"
+            "Проверьте, что в нем по одному вопросу на строку."
+        )
+
+async def handle_text_query(
+    message: types.Message, async_session: sessionmaker, nlp_parser: NaturalLanguageParser,
+    result_cache: ResultCache = None, query_guard: QueryGuard = None, columnar: ColumnarStore = None,
+    readiness: DataReadiness = None
+):
+    """Обработчик текстовых запросов (фабрика сессий, парсер, кэш и защита приходят из workflow data диспетчера)
+
+    Вопрос сначала пробует колоночный снимок в памяти (если включен
+    COLUMNAR_ENABLED), то, что снимок не считает, выполняет Postgres.
+    Время этапов (parse - SQL из вопроса, db - выполнение, reply - ответ в Telegram)
+    пишется в гистограмму bot_stage_seconds, исход - в bot_requests_total.
+    """
     user_query = message.text.strip()
     user_id = message.from_user.id
+    started = time.perf_counter()
+    outcome = "error"
     
     try:
-        # Создаем движок базы данных
-        engine = create_async_engine(
-            config.database_url.replace("postgresql://", "postgresql+asyncpg://"),
-            echo=False
-        )
-        async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        # Пока данные загружаются при старте, ответ по ним был бы неполным
+        if readiness and not readiness.is_ready:
+            outcome = "not_ready"
+            await message.answer(NOT_READY_TEXT)
+            return
+        
+        # Список вопросов - пакет, ответ одним сообщением
+        questions = message_questions(message.text, nlp_parser.fast_path)
+        if len(questions) > 1:
+            outcome = "batch"
+            await answer_batch(message, questions, async_session, nlp_parser, result_cache, query_guard)
+            return
         
         # Парсим запрос в SQL
-        sql_query, params = nlp_parser.parse_query_to_sql(user_query)
-        logger.info(f"User {user_id}: {user_query} -> SQL: {sql_query}")
+        with STAGE_SECONDS.time(stage="parse"):
+            parsed = await nlp_parser.parse_query(user_query)
+        sql_query, params = parsed.sql, parsed.params
+        logger.info(f"User {user_id}: {user_query} -> SQL: {sql_query} {params}")
         
-        # Выполняем запрос к базе данных
-        async with async_session() as session:
-            db_manager = DatabaseManager(session)
-            result = await db_manager.execute_custom_query(sql_query, params)
-            
+        if sql_query is None:
+            outcome = "unparsed"
+            with STAGE_SECONDS.time(stage="reply"):
+                await message.answer(
+                    "❌ <b>Не удалось понять вопрос.</b>\n"
+                    "Попробуйте переформулировать его, например как в /help."
+                )
+            return
+        
+        # Вопрос с разбивкой - таблица строк, а не одно число
+        if parsed.spec and parsed.spec.group_by:
+            outcome = "table"
+            await answer_table(message, parsed, async_session, query_guard)
+            nlp_parser.confirm(user_query, parsed)
+            return
+        
+        # Выполняем запрос: из колоночного снимка, если он может ответить, иначе в базе
+        db_started = time.perf_counter()
+        try:
+            result = None
+            if columnar and parsed.spec:
+                with STAGE_SECONDS.time(stage="columnar"):
+                    result = await columnar.execute(parsed.spec)
+            if result is None:
+                async with async_session() as session:
+                    db_manager = DatabaseManager(session, result_cache, query_guard)
+                    result = await db_manager.execute_custom_query(sql_query, params)
+        finally:
+            db_seconds = time.perf_counter() - db_started
+            STAGE_SECONDS.observe(db_seconds, stage="db")
+            if db_seconds > config.SLOW_QUERY_SECONDS:
+                SLOW_QUERIES.inc()
+                logger.warning(f"Slow query ({db_seconds:.2f} s) from user {user_id}: {sql_query}")
+        
+        with STAGE_SECONDS.time(stage="reply"):
             if result is not None:
+                outcome = "answered"
+                nlp_parser.confirm(user_query, parsed)
                 # Форматируем результат (без разделителей тысяч)
                 formatted_result = format_number(result)
                 await message.answer(formatted_result)
             else:
+                outcome = "no_result"
                 await message.answer(
                     "❌ <b>Не удалось получить результат.</b>\n"
                     "Проверьте формулировку запроса."
                 )
         
-        await engine.dispose()
+    except QueryRejected as e:
+        outcome = "rejected"
+        logger.warning(f"Query from user {user_id} rejected: {e.reason}")
+        await message.answer(
+            f"⛔ <b>{e.reason}.</b>\n"
+            "Попробуйте сузить вопрос: укажите дату, период или креатора."
+        )
         
     except Exception as e:
         logger.error(f"Error processing query from user {user_id}: {e}")
@@ -200,15 +443,126 @@ async def handle_text_query(message: types.Message):
             "❌ <b>Произошла ошибка при обработке запроса.</b>\n"
             "Пожалуйста, проверьте формулировку или попробуйте другой запрос."
         )
+    
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="total")
+        REQUESTS.inc(outcome=outcome)
+
+def create_router() -> Router:
+    """Обработчики команд, файлов и вопросов"""
+    router = Router()
+    router.message(Command("start"))(cmd_start)
+    router.message(Command("help"))(cmd_help)
+    router.message(F.document, flags={"fair_queue": True})(handle_document)
+    router.message(flags={"fair_queue": True})(handle_text_query)
+    return router
+
+def create_app(nlp_parser: NaturalLanguageParser = None) -> Dispatcher:
+    """Фабрика приложения: диспетчер с обработчиками и компонентами в workflow data
+
+    Ничего не загружает и не подключается к сети: пул, данные и колоночный
+    снимок готовятся при запуске (main), клиент LLM - при первом вопросе к нему.
+    """
+    # Общий движок и пул соединений на весь процесс
+    engine = get_engine()
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(create_router())
+    
+    dp["engine"] = engine
+    dp["async_session"] = get_session_factory()
+    dp["nlp_parser"] = nlp_parser or NaturalLanguageParser()
+    dp["readiness"] = DataReadiness()
+    
+    # Кэш результатов запросов (сбрасывается сменой версии данных при загрузке)
+    dp["result_cache"] = ResultCache.from_config()
+    
+    # Проверка SQL перед выполнением: только чтение, таймаут, потолок стоимости
+    dp["query_guard"] = QueryGuard()
+    
+    # Колоночный снимок таблиц в памяти для вопросов быстрого пути (загружается в фоне)
+    if config.COLUMNAR_ENABLED:
+        dp["columnar"] = ColumnarStore(engine)
+    
+    # Очереди по пользователям: один пользователь не занимает LLM и базу за всех
+    scheduler = FairScheduler()
+    dp["scheduler"] = scheduler
+    dp.message.middleware(FairSchedulerMiddleware(scheduler))
+    return dp
+
+async def close_app(dp: Dispatcher):
+    """Закрыть очереди, колоночный снимок, пул соединений, HTTP-клиент LLM и кэш"""
+    await dp["scheduler"].close()
+    if dp.get("columnar"):
+        await dp["columnar"].close()
+    await dispose_engine()
+    await dp["nlp_parser"].close()
+    if dp["result_cache"]:
+        await dp["result_cache"].close()
+
+def register_metrics(dp: Dispatcher):
+    """Счетчики компонентов и состояние пула - читаются при каждом запросе /metrics"""
+    engine, nlp_parser, readiness = dp["engine"], dp["nlp_parser"], dp["readiness"]
+    result_cache, query_guard = dp["result_cache"], dp["query_guard"]
+    scheduler, columnar = dp.get("scheduler"), dp.get("columnar")
+    register_pool(engine.sync_engine)
+    REGISTRY.register(CallbackMetric('bot_data_ready', 'Данные загружены и готовы к вопросам (1/0)', lambda: {
+        (): int(readiness.is_ready),
+    }))
+    if scheduler:
+        REGISTRY.register(CallbackMetric('scheduler_queue', 'Вопросы в очередях и в работе', lambda: {
+            ('queued',): scheduler.queued,
+            ('running',): scheduler.running,
+            ('users_waiting',): len(scheduler.queues),
+        }, labels=('state',)))
+        register_stats('scheduler_events_total', 'Принятые, отклоненные и выполненные вопросы', lambda: scheduler.stats)
+    register_stats('bot_sql_source_total', 'Откуда взят SQL', lambda: {
+        'fast_path': nlp_parser.fast_path.stats["served"],
+        'translation_cache': nlp_parser.cache.stats["hits"] + nlp_parser.cache.stats["template_hits"],
+        **nlp_parser.stats,
+    }, label='source')
+    register_stats('llm_events_total', 'Вызовы API LLM, повторы, ошибки и объединенные запросы',
+                   lambda: nlp_parser.llm_stats)
+    register_stats('translation_cache_events_total', 'Кэш трансляций вопрос -> SQL',
+                   lambda: nlp_parser.cache.stats)
+    register_stats('query_guard_events_total', 'Проверки и отказы защиты SQL', lambda: query_guard.stats)
+    if result_cache:
+        register_stats('result_cache_events_total', 'Кэш результатов запросов', lambda: result_cache.stats)
+    if columnar:
+        register_stats('columnar_events_total', 'Ответы колоночного снимка, устаревания и перезагрузки',
+                       lambda: columnar.stats)
+
+# Допустимые значения DATA_LOAD_ON_START (см. config.py)
+DATA_LOAD_MODES = ("background", "blocking", "off")
+
+def data_load_mode() -> str:
+    """Режим загрузки данных при старте (RuntimeError - значение не из DATA_LOAD_MODES)"""
+    mode = config.DATA_LOAD_ON_START.strip().lower()
+    if mode not in DATA_LOAD_MODES:
+        raise RuntimeError(
+            f"Некорректный DATA_LOAD_ON_START={config.DATA_LOAD_ON_START!r}: "
+            f"допустимо {', '.join(DATA_LOAD_MODES)}"
+        )
+    return mode
 
 async def main():
-    """Основная функция запуска бота"""
+    """Основная функция запуска бота
+
+    Polling (или вебхук) запускается сразу; данные загружаются в фоне
+    (DATA_LOAD_ON_START=background), вопросы о них принимаются по готовности.
+    """
+    setup_logging()
+    # Опечатка в режиме не должна молча объявлять пустую базу готовой
+    load_mode = data_load_mode()
+    bot = create_bot()
     
-    # Инициализация базы данных
-    logger.info("Инициализация базы данных...")
-    await initialize_database()
+    dp = create_app()
+    engine: AsyncEngine = dp["engine"]
+    readiness: DataReadiness = dp["readiness"]
+    columnar: Optional[ColumnarStore] = dp.get("columnar")
     
-    logger.info("Запуск бота...")
+    # Метрики Prometheus на локальном порту
+    register_metrics(dp)
+    metrics_runner = await start_metrics_server()
     
     # Тестируем подключение бота
     try:
@@ -217,11 +571,75 @@ async def main():
     except Exception as e:
         print(f"❌ Ошибка подключения бота: {e}")
         print("Проверьте токен и интернет-соединение")
+        await close_app(dp)
+        await bot.session.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         return
     
-    # Запуск polling
-    print("🔄 Запускаю polling...")
-    await dp.start_polling(bot)
+    background = []
+    try:
+        # Данные: в фоне, до запуска polling или не загружаются вовсе (база готовится ingest.py)
+        logger.info("Инициализация базы данных...")
+        if load_mode == "blocking":
+            await load_data(engine, readiness)
+        elif load_mode == "background":
+            background.append(asyncio.create_task(load_data_in_background(engine, readiness)))
+        elif load_mode == "off":
+            readiness.mark_ready()
+        
+        # Прогреваем пул: первые вопросы не ждут установки соединений
+        background.append(asyncio.create_task(warm_up_pool(engine)))
+        
+        # Колоночный снимок и периодическая синхронизация - после загрузки данных
+        background.append(asyncio.create_task(start_after_load(engine, readiness, columnar)))
+        
+        logger.info("Запуск бота...")
+        if config.BOT_MODE == "webhook":
+            # Обновления приходят HTTP-запросами: можно запускать несколько реплик за балансировщиком
+            from webhook import run_webhook
+            await run_webhook(bot, dp, engine)
+        else:
+            print("🔄 Запускаю polling...")
+            await dp.start_polling(bot)
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        # Закрываем пул соединений, HTTP-клиент LLM и кэш при остановке
+        await close_app(dp)
+        await bot.session.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+
+async def load_data_in_background(engine: AsyncEngine, readiness: DataReadiness, delay: float = 5.0):
+    """Фоновая загрузка при старте
+
+    Повторяется, только пока база недоступна (например, еще не поднялась).
+    Остальные ошибки - битый файл данных, ошибка схемы - повтор не исправит:
+    данные остаются неготовыми (failed в /readyz), ошибка - в логе.
+    """
+    while True:
+        try:
+            await load_data(engine, readiness)
+            return
+        except Exception as e:
+            if not is_connection_error(e):
+                print(f"❌ Данные не загружены: {type(e).__name__}: {e}")
+                readiness.mark_failed(e)
+                return
+            print(f"🔁 База недоступна ({type(e).__name__}: {e}), повтор загрузки данных через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 300.0)
+
+async def start_after_load(engine: AsyncEngine, readiness: DataReadiness, columnar: ColumnarStore = None):
+    """Колоночный снимок и периодическая синхронизация с файлом данных - когда данные готовы"""
+    await readiness.wait()
+    if columnar:
+        columnar.refresh_in_background()
+    if config.SYNC_INTERVAL > 0:
+        from database.sync import IncrementalSync
+        await IncrementalSync(engine).run_periodically()
 
 if __name__ == '__main__':
     # Создаем директорию для данных если её нет
@@ -230,5 +648,8 @@ if __name__ == '__main__':
     # Запуск асинхронного приложения
     try:
         asyncio.run(main())
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
     except KeyboardInterrupt:
         print("\n👋 Бот остановлен")
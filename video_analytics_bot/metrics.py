@@ -0,0 +1,166 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple, Sequence, Optional
+from aiohttp import web
+from config import config
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        # Счетчик без меток виден в /metrics сразу, с нулем
+        self.values: Dict[Tuple, float] = {} if self.label_names else {(): 0}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in self.values.items()]
+
+class CallbackMetric:
+    """Значения, которые читаются в момент запроса /metrics (счетчики компонентов, состояние пула)
+
+    callback возвращает {значения меток: число}; ошибки чтения пропускаются.
+    """
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Dict[Tuple, float]],
+                 labels: Sequence[str] = (), kind: str = 'gauge'):
+        self.name, self.help, self.label_names, self.kind = name, help, tuple(labels), kind
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in values.items()]
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe - бинарный поиск и два сложения"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # метки -> [счетчики по корзинам (+Inf последней), сумма]
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.label_names + ('le',), key + (le,))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'bot_stage_seconds', 'Время этапов обработки вопроса', labels=('stage',)
+))
+REQUESTS = REGISTRY.register(Counter(
+    'bot_requests_total', 'Обработанные вопросы по исходу', labels=('outcome',)
+))
+LLM_SECONDS = REGISTRY.register(Histogram(
+    'llm_request_seconds', 'Время одного обращения к API LLM', labels=('outcome',)
+))
+LLM_PROMPT_TOKENS = REGISTRY.register(Histogram(
+    'llm_prompt_tokens', 'Оценка размера системного промпта на вопрос, токенов',
+    buckets=(100, 200, 300, 400, 500, 700, 1000, 1500, 2000)
+))
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'scheduler_wait_seconds', 'Ожидание вопроса в очереди пользователя до начала обработки'
+))
+SLOW_QUERIES = REGISTRY.register(Counter(
+    'db_slow_queries_total', 'Запросы к базе дольше SLOW_QUERY_SECONDS'
+))
+
+def register_stats(name: str, help: str, stats: Callable[[], Dict[str, float]], label: str = 'kind',
+                   kind: str = 'counter'):
+    """Экспортировать словарь stats компонента (ключ словаря -> значение метки)"""
+    REGISTRY.register(CallbackMetric(
+        name, help, lambda: {(key,): value for key, value in stats().items()}, labels=(label,), kind=kind
+    ))
+
+def register_pool(engine):
+    """Состояние пула соединений SQLAlchemy"""
+    pool = engine.pool
+    REGISTRY.register(CallbackMetric(
+        'db_pool_connections', 'Соединения пула по состоянию',
+        lambda: {
+            ('checked_out',): pool.checkedout(),
+            ('checked_in',): pool.checkedin(),
+            ('overflow',): pool.overflow(),
+            ('size',): pool.size(),
+        },
+        labels=('state',)
+    ))
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type='text/plain', charset='utf-8')
+
+async def start_metrics_server(port: Optional[int] = None, host: str = None) -> Optional[web.AppRunner]:
+    """HTTP /metrics на локальном порту (None, если METRICS_PORT = 0)"""
+    port = port if port is not None else config.METRICS_PORT
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host or config.METRICS_HOST, port).start()
+    print(f"📊 Метрики: http://{host or config.METRICS_HOST}:{port}/metrics")
+    return runner
@@ -0,0 +1,399 @@
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Tuple
+from config import config
+from .translation_cache import normalize_question, MONTHS_BY_NUMBER
+from .query_spec import QuerySpec, QuerySpecError, MetricFilter
+
+MONTH = '(' + '|'.join(MONTHS_BY_NUMBER) + ')'
+MONTH_NUMBERS = {name: i + 1 for i, name in enumerate(MONTHS_BY_NUMBER)}
+
+# Основа слова -> колонка метрики
+METRICS = [
+    ('просмотр', 'views'),
+    ('лайк', 'likes'),
+    ('коммент', 'comments'),
+    ('жалоб', 'reports'),
+    ('репорт', 'reports'),
+]
+METRIC = '(' + '|'.join(stem for stem, _ in METRICS) + r')\w*'
+
+# Порядок важен: "не более" проверяется раньше "более"
+COMPARISONS = [
+    (r'не\s+менее|не\s+меньше|как\s+минимум|минимум|от', '>='),
+    (r'не\s+более|не\s+больше|как\s+максимум|максимум|до', '<='),
+    (r'больше|более|свыше|выше|сверх', '>'),
+    (r'меньше|менее|ниже', '<'),
+    (r'ровно|равно', '='),
+]
+
+# Множители чисел: "100 тысяч", "1,5 млн"
+MULTIPLIERS = [
+    ('тыс', 1000),
+    ('млн', 1000000),
+    ('миллион', 1000000),
+    ('млрд', 1000000000),
+    ('миллиард', 1000000000),
+]
+NUMBER = r'(\d+(?:[.,]\d+)?)(?:\s*(' + '|'.join(stem for stem, _ in MULTIPLIERS) + r')\w*\.?)?'
+
+# Открытый с одной стороны период: слово -> (граница, сдвиг от указанного дня в днях)
+OPEN_BOUNDS = [
+    (r'не\s+(?:раньше|ранее)', 'from', 0),
+    (r'не\s+(?:позже|позднее)', 'to', 0),
+    (r'до|раньше|ранее', 'to', -1),
+    (r'после|позже|позднее', 'from', 1),
+    (r'начиная\s+с|с', 'from', 0),
+]
+
+# Отрицание ("не получили новых просмотров", "без лайков") правила не выражают
+NEGATION = r'\b(?:не|ни|нет|без)\b'
+
+# Неразобранная ссылка на креатора или видео ("у креатора abc", "у видео abc", второй "id def"):
+# без фильтра по ней ответ был бы по всем видео
+ENTITY_REFERENCE = r'креатор|\bid\b|\bвидео\s+(?:с\s+)?[\w-]*[A-Za-z_][\w-]*'
+
+# Ниже этой уверенности правило не используется даже как запасной вариант при ошибке LLM
+FALLBACK_MIN_CONFIDENCE = 0.6
+
+PUBLICATION_WORDS = ('вышл', 'вышед', 'выход', 'опубликов', 'выложен', 'выложил', 'загружен', 'загрузил', 'появил')
+# Вопросы о приросте: "на 28 ноября" в них - дата замеров, а не дата значений
+GROWTH_WORDS = ('вырос', 'увелич', 'прибав', 'прирос', 'нов')
+UNSUPPORTED_WORDS = (
+    'средн', 'максимальн', 'минимальн', 'топ', 'кажд', 'процент', 'доля', 'долю', 'какой', 'какие',
+    'какое', 'какая', 'кто', 'кроме', ' или ', 'рейтинг', 'сравн', 'разниц', 'по дням', 'по месяцам'
+)
+
+@dataclass
+class CompiledQuery:
+    """Результат быстрого пути: структура вопроса, уверенность и сработавшее правило"""
+    spec: QuerySpec
+    confidence: float
+    rule: str
+
+@dataclass
+class _Match:
+    """Разобранные части вопроса и занятые ими участки текста"""
+    text: str
+    spans: List[Tuple[int, int]] = field(default_factory=list)
+    penalties: List[Tuple[str, float]] = field(default_factory=list)
+
+    def take(self, m: re.Match, group: int = 0):
+        self.spans.append((m.start(group), m.end(group)))
+
+    def penalize(self, reason: str, value: float):
+        self.penalties.append((reason, value))
+
+    def residual(self) -> str:
+        chars = list(self.text)
+        for start, end in self.spans:
+            for i in range(start, end):
+                chars[i] = ' '
+        return ''.join(chars)
+
+class RuleBasedCompiler:
+    """Детерминированный разбор типовых вопросов в QuerySpec без обращения к LLM
+
+    Понимает семейства вопросов из примеров промпта:
+    - количество видео (с фильтрами по креатору, дате публикации и порогу метрики);
+    - суммарный прирост метрики по снапшотам за дату/период;
+    - количество разных видео с новыми просмотрами/лайками/... за дату/период;
+    - сумма метрики по видео;
+    - количество видео и сумма метрики на дату ("на конец дня 27 ноября") и по одному видео;
+    - те же вопросы с разбивкой: "по дням", "у каждого креатора", "топ 10 видео/креаторов".
+
+    Уверенность снижается, если в вопросе остались неразобранные числа,
+    ссылки на креатора или видео или конструкции, которые правила не
+    поддерживают, - тогда вопрос уходит в LLM.
+    """
+
+    def __init__(self, min_confidence: float = None):
+        self.min_confidence = min_confidence if min_confidence is not None else config.FAST_PATH_MIN_CONFIDENCE
+        self.stats = {"total": 0, "served": 0, "low_confidence": 0, "no_match": 0}
+
+    @property
+    def share(self) -> float:
+        """Доля вопросов, на которые ответил быстрый путь"""
+        return self.stats["served"] / self.stats["total"] if self.stats["total"] else 0.0
+
+    def compile(self, query: str, today: date = None) -> Optional[CompiledQuery]:
+        """Разобрать вопрос в QuerySpec (None, если ни одно правило не подошло)"""
+        self.stats["total"] += 1
+        result = self._compile(normalize_question(query), today or datetime.utcnow().date())
+
+        if result is None:
+            self.stats["no_match"] += 1
+        elif result.confidence >= self.min_confidence:
+            self.stats["served"] += 1
+        else:
+            self.stats["low_confidence"] += 1
+        return result
+
+    def is_confident(self, compiled: Optional[CompiledQuery]) -> bool:
+        return compiled is not None and compiled.confidence >= self.min_confidence
+
+    def understands(self, query: str, today: date = None) -> bool:
+        """Уверенно ли правила разбирают вопрос (без учета в статистике)"""
+        return self.is_confident(self._compile(normalize_question(query), today or datetime.utcnow().date()))
+
+    @staticmethod
+    def is_usable_fallback(compiled: Optional[CompiledQuery]) -> bool:
+        return compiled is not None and compiled.confidence >= FALLBACK_MIN_CONFIDENCE
+
+    def _compile(self, text: str, today: date) -> Optional[CompiledQuery]:
+        match = _Match(text)
+        video_id = self._parse_video(match)
+        creator_id = self._parse_creator(match)
+        as_of = self._parse_as_of(match, today)
+        grouping = self._parse_grouping(match)
+        date_range = self._parse_dates(match, today)
+        threshold = self._parse_threshold(match)
+
+        rule = None
+        metric_match = re.search(METRIC, text)
+        metric = self._metric_column(metric_match.group(1)) if metric_match else None
+
+        if re.search(r'на\s+сколько', text) and metric and re.search(r'вырос|увелич|прибав|прирос', text) \
+                or re.search(r'прирост\w*\s+' + METRIC, text):
+            rule = 'delta_sum'
+            spec = dict(aggregation='sum', table='video_snapshots', metric=metric)
+            if threshold:
+                match.penalize('threshold', 0.5)
+
+        elif re.search(r'сколько', text) and re.search(r'видео', text) and metric \
+                and re.search(r'нов\w*\s+' + METRIC, text):
+            rule = 'distinct_new'
+            spec = dict(aggregation='count_distinct', table='video_snapshots', metric=metric)
+            if threshold:
+                match.penalize('threshold', 0.5)
+
+        elif re.search(r'сколько\s+(?:всего\s+|разных\s+|уникальных\s+)?(?:\w+\s+)?видео', text):
+            rule = 'count_videos'
+            spec = dict(aggregation='count', table='videos')
+            if date_range and not any(word in text for word in PUBLICATION_WORDS):
+                match.penalize('date_without_publication', 0.15)
+            if threshold:
+                spec['filters'] = (MetricFilter(*threshold),)
+            elif metric:
+                match.penalize('metric_without_threshold', 0.5)
+
+        elif metric and re.search(r'сколько\s+(?:всего\s+|в\s+сумме\s+|суммарно\s+)?' + METRIC, text):
+            rule = 'sum_total'
+            spec = dict(aggregation='sum', table='videos', metric=metric)
+            if date_range:
+                match.penalize('date_on_totals', 0.3)
+            if threshold:
+                match.penalize('threshold', 0.5)
+
+        elif grouping and metric:
+            # "Топ 10 видео по лайкам" - итоговые значения; "просмотры по дням" - прирост за каждый день
+            if grouping[0] == 'day':
+                rule = 'delta_sum'
+                spec = dict(aggregation='sum', table='video_snapshots', metric=metric)
+            else:
+                rule = 'sum_total'
+                spec = dict(aggregation='sum', table='videos', metric=metric)
+                if date_range:
+                    match.penalize('date_on_totals', 0.3)
+            if threshold:
+                match.penalize('threshold', 0.5)
+
+        if rule is None:
+            return None
+
+        residual = match.residual()
+        if re.search(r'\d', residual):
+            match.penalize('unparsed_numbers', 0.5)
+        if any(word in f" {residual} " for word in UNSUPPORTED_WORDS):
+            match.penalize('unsupported', 0.5)
+        if re.search(NEGATION, residual):
+            match.penalize('negation', 0.5)
+        if re.search(ENTITY_REFERENCE, residual):
+            match.penalize('unparsed_entity', 1.0)
+
+        if date_range:
+            spec['date_from'], spec['date_to'] = date_range
+        if grouping:
+            spec['group_by'], spec['limit'] = grouping
+            if spec['limit']:
+                spec['order'] = 'desc'
+        try:
+            spec = QuerySpec(creator_id=creator_id, video_id=video_id, as_of=as_of, **spec)
+        except QuerySpecError:
+            return None
+        confidence = max(0.0, 1.0 - sum(value for _, value in match.penalties))
+        return CompiledQuery(spec=spec, confidence=round(confidence, 2), rule=rule)
+
+    # --- разбор частей вопроса ---
+
+    @staticmethod
+    def _metric_column(stem: str) -> str:
+        return next(column for prefix, column in METRICS if stem == prefix)
+
+    @staticmethod
+    def _parse_video(match: _Match) -> Optional[str]:
+        m = re.search(r'\bвидео\s+(?:с\s+)?id\s+([\w-]+)', match.text)
+        if not m:
+            return None
+        match.take(m)
+        return m.group(1)
+
+    @staticmethod
+    def _parse_creator(match: _Match) -> Optional[str]:
+        m = re.search(r'(?:креатор\w*\s+(?:с\s+)?)?\bid\s+([\w-]+)', match.residual())
+        if not m:
+            return None
+        match.take(m)
+        return m.group(1)
+
+    @staticmethod
+    def _parse_grouping(match: _Match) -> Optional[Tuple[str, Optional[int]]]:
+        """Разбивка ответа на строки: (group_by, limit) или None"""
+        text = match.residual()
+        m = re.search(r'\bтоп\s*-?\s*(\d+)\s+(креатор|видео)\w*', text)
+        if m:
+            match.take(m)
+            return ('creator_id' if m.group(2) == 'креатор' else 'video_id'), int(m.group(1))
+        groupings = [
+            (r'\bпо\s+дням\b', 'day'),
+            (r'\b(?:по\s+креаторам|(?:у|для|по)\s+каждо\w+\s+креатор\w*)', 'creator_id'),
+            (r'\b(?:по\s+каждому\s+видео|(?:у|для)\s+каждого\s+видео)\b', 'video_id'),
+        ]
+        for pattern, group_by in groupings:
+            m = re.search(pattern, text)
+            if m:
+                match.take(m)
+                return group_by, None
+        return None
+
+    @staticmethod
+    def _parse_as_of(match: _Match, today: date) -> Optional[date]:
+        """Дата, на которую нужны значения метрик: "на конец дня 27 ноября", "по состоянию на ..."
+
+        Просто "на 27 ноября" в вопросах о публикации и приросте - обычная дата периода.
+        """
+        m = re.search(
+            r'\b(по\s+состоянию\s+на|на\s+конец\s+дня|на\s+конец|на)\s+(\d{1,2})\s+' + MONTH + r'(?:\s+(\d{4}))?',
+            match.residual()
+        )
+        if not m or m.group(1) == 'на' and any(word in match.text for word in PUBLICATION_WORDS + GROWTH_WORDS):
+            return None
+        match.take(m)
+        try:
+            as_of = date(int(m.group(4) or today.year), MONTH_NUMBERS[m.group(3)], int(m.group(2)))
+        except ValueError:
+            match.penalize('invalid_date', 1.0)
+            return None
+        if not m.group(4):
+            match.penalize('missing_year', 0.1)
+        return as_of
+
+    def _parse_threshold(self, match: _Match) -> Optional[Tuple[str, str, int]]:
+        for pattern, op in COMPARISONS:
+            m = re.search(r'\b(?:' + pattern + r')\s+' + NUMBER + r'\s+(?:\w+\s+)?' + METRIC, match.text)
+            if m:
+                match.take(m)
+                value = float(m.group(1).replace(',', '.'))
+                if m.group(2):
+                    value *= next(factor for stem, factor in MULTIPLIERS if stem == m.group(2))
+                if value != int(value):
+                    # Дробный порог без множителя ("больше 1.5 лайков") правила не выражают
+                    match.penalize('fractional_threshold', 0.5)
+                return self._metric_column(m.group(3)), op, int(value)
+        return None
+
+    def _parse_dates(self, match: _Match, today: date) -> Optional[Tuple[date, date]]:
+        found = self._find_dates(match, today)
+        if found is None:
+            return None
+        start, end, has_year, open_ended = found
+        if start is None and end is None or not open_ended and (start is None or end is None) \
+                or start and end and start > end:
+            # Дату нашли, но разобрать не смогли - отвечать без фильтра нельзя
+            match.penalize('invalid_date', 1.0)
+            return None
+        if not has_year:
+            match.penalize('missing_year', 0.1)
+        return start, end
+
+    def _find_dates(self, match: _Match, today: date):
+        """Поиск даты/периода: (начало, конец, указан ли год, открыт ли период) или None
+
+        У открытого периода ("до 5 ноября", "после 5 ноября") одна из границ - None.
+        """
+        text = match.residual()
+
+        def day(d, month, year) -> Optional[date]:
+            try:
+                return date(int(year or today.year), MONTH_NUMBERS[month], int(d))
+            except ValueError:
+                return None
+
+        # с 1 ноября 2025 по 5 ноября 2025
+        m = re.search(r'\bс\s+(\d{1,2})\s+' + MONTH + r'\s+(\d{4})\s+(?:по|до)\s+(\d{1,2})\s+' + MONTH + r'\s+(\d{4})', text)
+        if m:
+            match.take(m)
+            return day(m.group(1), m.group(2), m.group(3)), day(m.group(4), m.group(5), m.group(6)), True, False
+
+        # с 28 октября по 3 ноября 2025
+        m = re.search(r'\bс\s+(\d{1,2})\s+' + MONTH + r'\s+(?:по|до)\s+(\d{1,2})\s+' + MONTH + r'(?:\s+(\d{4}))?', text)
+        if m:
+            match.take(m)
+            return day(m.group(1), m.group(2), m.group(5)), day(m.group(3), m.group(4), m.group(5)), bool(m.group(5)), False
+
+        # с 1 по 5 ноября 2025
+        m = re.search(r'\bс\s+(\d{1,2})\s+(?:по|до)\s+(\d{1,2})\s+' + MONTH + r'(?:\s+(\d{4}))?', text)
+        if m:
+            match.take(m)
+            return day(m.group(1), m.group(3), m.group(4)), day(m.group(2), m.group(3), m.group(4)), bool(m.group(4)), False
+
+        # до 5 ноября 2025, после 5 ноября, начиная с 5 ноября
+        for pattern, side, shift in OPEN_BOUNDS:
+            m = re.search(r'\b(?:' + pattern + r')\s+(\d{1,2})\s+' + MONTH + r'(?:\s+(\d{4}))?', text)
+            if m:
+                match.take(m)
+                bound = day(m.group(1), m.group(2), m.group(3))
+                if bound is None:
+                    return None, None, bool(m.group(3)), True
+                bound += timedelta(days=shift)
+                start, end = (bound, None) if side == 'from' else (None, bound)
+                return start, end, bool(m.group(3)), True
+
+        # 28 ноября 2025
+        m = re.search(r'\b(\d{1,2})\s+' + MONTH + r'(?:\s+(\d{4}))?', text)
+        if m:
+            match.take(m)
+            single = day(m.group(1), m.group(2), m.group(3))
+            return single, single, bool(m.group(3)), False
+
+        # в ноябре 2025 / за ноябрь 2025
+        m = re.search(r'\b(?:в|за)\s+' + MONTH + r'(?:\s+(\d{4}))?', text)
+        if m:
+            match.take(m)
+            start = day(1, m.group(1), m.group(2))
+            next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+            return start, next_month - timedelta(days=1), bool(m.group(2)), False
+
+        # Относительные даты
+        m = re.search(r'за\s+последн\w*\s+(\d+)\s+(?:дн|сут)\w*', text)
+        if m:
+            match.take(m)
+            days = int(m.group(1))
+            return (today - timedelta(days=days - 1) if days > 0 else None), today, True, False
+        relative = [
+            (r'за\s+последн\w*\s+недел\w*', 7),
+            (r'за\s+последн\w*\s+месяц\w*', 30),
+            (r'\bпозавчера\b', -2),
+            (r'\bвчера\b', -1),
+            (r'\bсегодня\b', 0),
+        ]
+        for pattern, days in relative:
+            m = re.search(pattern, text)
+            if m:
+                match.take(m)
+                if days > 0:
+                    return today - timedelta(days=days - 1), today, True, False
+                target = today + timedelta(days=days)
+                return target, target, True, False
+        return None
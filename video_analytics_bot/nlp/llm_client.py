@@ -0,0 +1,137 @@
+import time
+import asyncio
+import random
+from typing import Dict, List, Tuple, Optional
+from openai import AsyncOpenAI, APIStatusError, APITimeoutError, APIConnectionError
+from config import config
+from metrics import LLM_SECONDS
+
+class LLMClient:
+    """Асинхронный клиент Mistral (OpenAI-совместимый API)
+
+    - не блокирует event loop во время запроса;
+    - ограничивает число одновременных запросов семафором;
+    - ограничивает время каждого вызова таймаутом;
+    - повторяет запрос с jitter-задержкой при 429/5xx и сетевых ошибках;
+    - объединяет одинаковые запросы, пришедшие одновременно, в один вызов API.
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        model: str = None,
+        max_concurrency: int = None,
+        timeout: float = None,
+        max_retries: int = None,
+        backoff_base: float = None,
+        backoff_max: float = None,
+    ):
+        # Повторы делаем сами, поэтому встроенные ретраи клиента отключены
+        self.client = AsyncOpenAI(
+            api_key=api_key or config.MISTRAL_API_KEY,
+            base_url=base_url or config.MISTRAL_BASE_URL,
+            max_retries=0
+        )
+        self.model = model or config.MISTRAL_MODEL
+        self.timeout = timeout if timeout is not None else config.LLM_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else config.LLM_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else config.LLM_BACKOFF_BASE
+        self.backoff_max = backoff_max if backoff_max is not None else config.LLM_BACKOFF_MAX
+        self.semaphore = asyncio.Semaphore(max_concurrency or config.LLM_MAX_CONCURRENCY)
+
+        # Запросы в полете: ключ -> задача, которую ждут все одинаковые вызовы
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        # prompt_tokens / completion_tokens - сумма usage из ответов API
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    async def complete(
+        self, messages: List[Dict[str, str]], temperature: float = 0.1, max_tokens: int = 200,
+        response_format: Dict[str, str] = None
+    ) -> str:
+        """Получить ответ модели (одинаковые одновременные запросы разделяют один вызов)
+
+        response_format={"type": "json_object"} - модель отвечает только JSON.
+        """
+        key = (
+            self.model, temperature, max_tokens, tuple(sorted((response_format or {}).items())),
+            tuple((m["role"], m["content"]) for m in messages)
+        )
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._complete_with_retries(messages, temperature, max_tokens, response_format)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    async def _complete_with_retries(self, messages, temperature, max_tokens, response_format=None) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    self.stats["calls"] += 1
+                    started = time.perf_counter()
+                    try:
+                        response = await asyncio.wait_for(
+                            self.client.chat.completions.create(
+                                model=self.model,
+                                messages=messages,
+                                temperature=temperature,
+                                max_tokens=max_tokens,
+                                **({"response_format": response_format} if response_format else {})
+                            ),
+                            timeout=self.timeout
+                        )
+                    except Exception as e:
+                        LLM_SECONDS.observe(time.perf_counter() - started, outcome=type(e).__name__)
+                        raise
+                    LLM_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+                if response.usage:
+                    self.stats["prompt_tokens"] += response.usage.prompt_tokens or 0
+                    self.stats["completion_tokens"] += response.usage.completion_tokens or 0
+                return response.choices[0].message.content or ""
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    self.stats["errors"] += 1
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                print(f"🔁 Повтор запроса к LLM через {delay:.2f} с ({type(e).__name__})")
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """429, 5xx, таймауты и сетевые ошибки имеет смысл повторить"""
+        if isinstance(error, (asyncio.TimeoutError, APITimeoutError, APIConnectionError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Экспоненциальная задержка с полным jitter (учитываем Retry-After, если он есть)"""
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
+    async def close(self):
+        await self.client.close()
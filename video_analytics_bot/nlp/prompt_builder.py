@@ -0,0 +1,288 @@
+import re
+import json
+import math
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from config import config
+from .translation_cache import normalize_question, DATE_PATTERN
+from .query_spec import QuerySpec, QuerySpecError
+
+# Оценка токенов без токенизатора модели: на русском тексте и JSON около 3 символов на токен
+CHARS_PER_TOKEN = 3
+
+HEADER = "Ты разбираешь русские вопросы об аналитике видео в JSON-структуру запроса."
+
+# Описание таблицы и правила для нее - в промпт попадают только нужные вопросу таблицы
+TABLE_SECTIONS = {
+    'videos': (
+        "videos - видео: creator_id (ID креатора), video_created_at (дата публикации),\n"
+        "   итоговые метрики views, likes, comments, reports.",
+        [
+            "count по videos - число видео; sum/avg/min/max по videos - итоговые значения metric.",
+            "as_of - значения метрик на конец этого дня (\"сколько просмотров было на 25 ноября\"), только для videos;\n"
+            "   пороги filters тогда тоже сравниваются со значениями на эту дату.",
+        ],
+    ),
+    'video_snapshots': (
+        "video_snapshots - почасовые замеры видео: created_at (время замера),\n"
+        "   приращения метрик views, likes, comments, reports за замер.",
+        [
+            "sum по video_snapshots - на сколько выросла metric за дату или период.",
+            "count_distinct по video_snapshots - число разных видео; с metric - только видео, у которых metric выросла.",
+        ],
+    ),
+}
+
+SCHEMA = """СХЕМА ОТВЕТА:
+{
+  "aggregation": "count" | "sum" | "avg" | "min" | "max" | "count_distinct",
+  "table": "videos" | "video_snapshots",
+  "metric": "views" | "likes" | "comments" | "reports" | null,
+  "creator_id": строка | null,
+  "video_id": строка | null,
+  "date_from": "YYYY-MM-DD" | null,
+  "date_to": "YYYY-MM-DD" | null,
+  "filters": [{"metric": "views", "op": ">" | ">=" | "<" | "<=" | "=", "value": число}],
+  "as_of": "YYYY-MM-DD" | null,
+  "group_by": "creator_id" | "day" | "video_id" | null, "order": "desc" | "asc" | null, "limit": число | null
+}"""
+
+COMMON_RULES = [
+    "Дата или период: date_from и date_to включительно; одна дата - одинаковые date_from и date_to.\n"
+    "   Для videos это дата публикации, для video_snapshots - дата замера.",
+    "filters - пороги метрик (\"больше 100000 просмотров\"); для video_snapshots порог относится к приращению.",
+    "video_id - один конкретный ролик (\"видео с id ...\"), creator_id - все видео креатора.",
+    "group_by - таблица по дням, креаторам или видео; \"топ N\" - order \"desc\" и limit N.",
+    "Подставляй значения из вопроса; неизвестные поля - null, пустые filters - [].",
+]
+
+FOOTER = "ВОЗВРАЩАЙ ТОЛЬКО JSON, БЕЗ ОБЪЯСНЕНИЙ!"
+
+# Поля разбивки в примерах без таблицы не пишутся - они null почти всегда, а место в промпте дорого
+GROUPING_KEYS = ('group_by', 'order', 'limit')
+
+# Слова вопросов о приросте и замерах - им нужна таблица video_snapshots, даже если примеры о videos
+SNAPSHOT_CUES = ('вырос', 'прирост', 'нов', 'получал', 'замер', 'динамик')
+
+# Проверенные примеры, с которых начинается библиотека
+SEED_EXAMPLES = [
+    ("Сколько всего видео есть в системе?", {"aggregation": "count"}),
+    ("Сколько видео у креатора с id abc123 вышло с 1 ноября 2025 по 5 ноября 2025 включительно?",
+     {"aggregation": "count", "creator_id": "abc123", "date_from": "2025-11-01", "date_to": "2025-11-05"}),
+    ("Сколько видео набрало больше 100000 просмотров за всё время?",
+     {"aggregation": "count", "filters": [{"metric": "views", "op": ">", "value": 100000}]}),
+    ("Какое среднее число лайков у видео креатора с id abc123?",
+     {"aggregation": "avg", "metric": "likes", "creator_id": "abc123"}),
+    ("Какое максимальное число просмотров у одного видео?", {"aggregation": "max", "metric": "views"}),
+    ("Сколько просмотров было у видео с id abc123 на 25 ноября 2025?",
+     {"aggregation": "sum", "metric": "views", "video_id": "abc123", "as_of": "2025-11-25"}),
+    ("Сколько видео имели больше 10000 лайков на конец дня 27 ноября 2025?",
+     {"aggregation": "count", "as_of": "2025-11-27", "filters": [{"metric": "likes", "op": ">", "value": 10000}]}),
+    ("Сколько лайков в сумме у видео, опубликованных с 1 по 30 ноября 2025?",
+     {"aggregation": "sum", "metric": "likes", "date_from": "2025-11-01", "date_to": "2025-11-30"}),
+    ("На сколько просмотров в сумме выросли все видео 28 ноября 2025?",
+     {"aggregation": "sum", "table": "video_snapshots", "metric": "views",
+      "date_from": "2025-11-28", "date_to": "2025-11-28"}),
+    ("На сколько выросли просмотры видео креатора с id abc123 с 1 по 5 ноября 2025?",
+     {"aggregation": "sum", "table": "video_snapshots", "metric": "views", "creator_id": "abc123",
+      "date_from": "2025-11-01", "date_to": "2025-11-05"}),
+    ("Сколько разных видео получали новые лайки с 1 по 5 ноября 2025?",
+     {"aggregation": "count_distinct", "table": "video_snapshots", "metric": "likes",
+      "date_from": "2025-11-01", "date_to": "2025-11-05"}),
+    ("Сколько замеров показали прирост просмотров больше 1000 за 28 ноября 2025?",
+     {"aggregation": "count", "table": "video_snapshots", "date_from": "2025-11-28", "date_to": "2025-11-28",
+      "filters": [{"metric": "views", "op": ">", "value": 1000}]}),
+    ("Топ 10 креаторов по приросту просмотров с 1 по 5 ноября 2025",
+     {"aggregation": "sum", "table": "video_snapshots", "metric": "views", "date_from": "2025-11-01",
+      "date_to": "2025-11-05", "group_by": "creator_id", "order": "desc", "limit": 10}),
+    ("Сколько видео выходило по дням в ноябре 2025?",
+     {"aggregation": "count", "date_from": "2025-11-01", "date_to": "2025-11-30", "group_by": "day"}),
+]
+
+def spec_shape(spec: QuerySpec) -> Tuple:
+    """Форма запроса без значений: какие поля заданы, но не чем"""
+    return (
+        spec.aggregation, spec.table, spec.metric, spec.creator_id is not None, spec.video_id is not None,
+        spec.date_from is not None, spec.date_to is not None, spec.as_of is not None,
+        tuple((item.metric, item.op) for item in spec.filters), spec.group_by, spec.order, spec.limit is not None,
+    )
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def question_terms(question: str) -> List[str]:
+    """Термы вопроса для TF-IDF: значения (id, даты, числа) - общими метками, слова - по основе
+
+    Основа - первые 5 букв: "просмотров" и "просмотры" дают один терм.
+    """
+    text = normalize_question(question).lower()
+    text = re.sub(r'\bid\s+[\w-]+', ' id ', text)
+    text = DATE_PATTERN.sub(' <date> ', text)
+    text = re.sub(r'\d+', ' <num> ', text)
+    return [term if term.startswith('<') else term[:5] for term in re.findall(r'<\w+>|[а-яa-z]{2,}', text)]
+
+@dataclass(frozen=True)
+class Example:
+    """Проверенная пара вопрос -> структура запроса"""
+    question: str
+    spec: QuerySpec
+
+    def render(self) -> str:
+        data = self.spec.to_dict()
+        if self.spec.group_by is None:
+            for key in GROUPING_KEYS:
+                del data[key]
+        return f"Вопрос: {self.question}\n{json.dumps(data, ensure_ascii=False)}"
+
+@dataclass
+class Prompt:
+    """Системный промпт для одного вопроса и его размер"""
+    text: str
+    tokens: int
+    examples: List[Example]
+    tables: Tuple[str, ...]
+
+class ExampleLibrary:
+    """Библиотека примеров с TF-IDF индексом по вопросам
+
+    Исходные примеры - SEED_EXAMPLES и проверенные вручную пары из
+    PROMPT_EXAMPLES_PATH (JSONL: {"question": ..., "spec": {...}}). По ходу работы
+    добавляются только ответы LLM, которые прошли проверку схемы и успешно
+    выполнились (NaturalLanguageParser.confirm); разбор быстрого пути не
+    добавляется - его ошибка стала бы примером и для LLM.
+    Вопросы, отличающиеся только значениями (id, даты, числа), хранятся одним
+    примером, одной форме запроса (spec_shape) - не больше per_shape пополнений.
+    Сверх max_size вытесняются самые старые пополнения; исходные примеры остаются.
+    """
+
+    def __init__(self, max_size: int = None, path: str = None, per_shape: int = None):
+        self.max_size = max_size or config.PROMPT_LIBRARY_SIZE
+        self.per_shape = per_shape or config.PROMPT_EXAMPLES_PER_SHAPE
+        self._seeds: Dict[Tuple[str, ...], Example] = {}
+        self._learned: "OrderedDict[Tuple[str, ...], Example]" = OrderedDict()
+        self._index: Optional[List[Tuple[Example, Dict[str, float]]]] = None
+        self._idf: Dict[str, float] = {}
+        for question, spec in SEED_EXAMPLES:
+            self._seeds[tuple(question_terms(question))] = Example(question, QuerySpec.from_dict(spec))
+        self.load(path if path is not None else config.PROMPT_EXAMPLES_PATH)
+
+    def __len__(self) -> int:
+        return len(self._seeds) + len(self._learned)
+
+    def load(self, path: str) -> int:
+        """Пары из JSONL-файла; некорректные строки пропускаются"""
+        if not path:
+            return 0
+        loaded = 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                        loaded += self.add(item['question'], QuerySpec.from_dict(item['spec']), curated=True)
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError as e:
+            print(f"⚠️ Файл примеров {path} не прочитан: {e}")
+        print(f"📚 Примеров для промпта: {len(self)} (из файла {loaded})")
+        return loaded
+
+    def add(self, question: str, spec: QuerySpec, curated: bool = False) -> bool:
+        """Добавить проверенную пару; False - такой вопрос (с точностью до значений) уже есть
+        или у его формы запроса уже per_shape пополнений
+
+        curated - пара проверена вручную: становится исходным примером и не вытесняется.
+        """
+        key = tuple(question_terms(question))
+        if not key or key in self._seeds or key in self._learned:
+            return False
+        if curated:
+            self._seeds[key] = Example(question, spec)
+            self._index = None
+            return True
+        shape = spec_shape(spec)
+        if sum(spec_shape(example.spec) == shape for example in self._learned.values()) >= self.per_shape:
+            return False
+        self._learned[key] = Example(question, spec)
+        while len(self._learned) > self.max_size:
+            self._learned.popitem(last=False)
+        self._index = None
+        return True
+
+    def search(self, question: str, k: int) -> List[Tuple[float, Example]]:
+        """k примеров, самых похожих на вопрос (косинус TF-IDF), без нулевого сходства"""
+        if self._index is None:
+            self._build_index()
+        query = self._vector(Counter(question_terms(question)))
+        scored = []
+        for example, vector in self._index:
+            score = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+            if score > 0:
+                scored.append((score, example))
+        scored.sort(key=lambda item: -item[0])
+        return scored[:k]
+
+    def _build_index(self):
+        examples = list(self._seeds.values()) + list(self._learned.values())
+        documents = [Counter(question_terms(example.question)) for example in examples]
+        frequency = Counter(term for document in documents for term in document)
+        self._idf = {term: math.log((1 + len(documents)) / (1 + df)) + 1 for term, df in frequency.items()}
+        self._index = [(example, self._vector(document)) for example, document in zip(examples, documents)]
+
+    def _vector(self, counts: Counter) -> Dict[str, float]:
+        vector = {term: count * self._idf[term] for term, count in counts.items() if term in self._idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+class PromptBuilder:
+    """Системный промпт под вопрос: схема ответа, нужные таблицы и 1-2 похожих примера
+
+    Таблицы - те, что встречаются в выбранных примерах, и video_snapshots для
+    вопросов о приросте. Примеры добавляются по убыванию сходства, пока
+    оценка размера промпта не превышает бюджет токенов.
+    """
+
+    def __init__(self, library: ExampleLibrary = None, token_budget: int = None, max_examples: int = None):
+        self.library = library or ExampleLibrary()
+        self.token_budget = token_budget or config.LLM_PROMPT_TOKEN_BUDGET
+        self.max_examples = max_examples if max_examples is not None else config.LLM_PROMPT_EXAMPLES
+
+    def build(self, question: str) -> Prompt:
+        candidates = [example for _, example in self.library.search(question, self.max_examples)]
+        cue = any(word in question.lower() for word in SNAPSHOT_CUES)
+        examples = []
+        prompt = self._assemble(self._tables(candidates, cue), [])
+        for example in candidates:
+            attempt = self._assemble(self._tables(examples + [example], cue), examples + [example])
+            if attempt.tokens > self.token_budget:
+                break
+            examples.append(example)
+            prompt = attempt
+        if prompt.tokens > self.token_budget:
+            print(f"⚠️ Промпт без примеров (~{prompt.tokens} токенов) больше бюджета {self.token_budget}")
+        return prompt
+
+    @staticmethod
+    def _tables(examples: List[Example], cue: bool) -> Tuple[str, ...]:
+        used = {example.spec.table for example in examples}
+        if cue:
+            used.add('video_snapshots')
+        # Непохожий ни на что вопрос получает описание обеих таблиц
+        return tuple(table for table in TABLE_SECTIONS if table in used) or tuple(TABLE_SECTIONS)
+
+    @staticmethod
+    def _assemble(tables: Tuple[str, ...], examples: List[Example]) -> Prompt:
+        data = [f"{i}. {TABLE_SECTIONS[table][0]}" for i, table in enumerate(tables, 1)]
+        rules = [rule for table in tables for rule in TABLE_SECTIONS[table][1]] + COMMON_RULES
+        parts = [
+            HEADER,
+            "ДАННЫЕ:\n" + "\n".join(data),
+            SCHEMA,
+            "ПРАВИЛА:\n" + "\n".join(f"{i}. {rule}" for i, rule in enumerate(rules, 1)),
+        ]
+        if examples:
+            parts.append("Примеры:\n" + "\n\n".join(example.render() for example in examples))
+        parts.append(FOOTER)
+        text = "\n\n".join(parts)
+        return Prompt(text, estimate_tokens(text), examples, tables)
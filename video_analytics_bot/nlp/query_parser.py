@@ -1,67 +1,66 @@
 import re
 import json
 import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from typing import Optional, Tuple, Dict, Any, Union
 import pytz
-from openai import OpenAI
 from config import config
+from metrics import LLM_PROMPT_TOKENS
+from .translation_cache import TranslationCache
+from .fast_path import RuleBasedCompiler, CompiledQuery
+from .query_spec import QuerySpec, QuerySpecError, compile_sql
+from .prompt_builder import PromptBuilder
+
+@dataclass
+class ParsedQuery:
+    """SQL с параметрами для базы (None - вопрос не понят), структура вопроса и ее источник
+
+    source: fast_path, cache, llm или fallback.
+    """
+    sql: Optional[str]
+    params: Dict[str, Any] = field(default_factory=dict)
+    spec: Optional[QuerySpec] = None
+    source: Optional[str] = None
 
 class NaturalLanguageParser:
-    def __init__(self):
-        # Всегда инициализируем клиент для API
-        self.client = OpenAI(
-            api_key=config.MISTRAL_API_KEY,
-            base_url="https://api.mistral.ai/v1"
-        )
-        self.model = config.MISTRAL_MODEL if hasattr(config, 'MISTRAL_MODEL') else "mistral-small"
+    def __init__(self, llm=None, cache: TranslationCache = None, prompts: PromptBuilder = None):
+        # Асинхронный клиент для API (не блокирует обработку других сообщений);
+        # создается при первом вопросе, которому нужна LLM - пакет openai не грузится при старте
+        self._llm = llm
+        self.model = llm.model if llm else config.MISTRAL_MODEL
         
-        # Улучшенный системный промпт
-        self.system_prompt = """Ты преобразуешь русские запросы в SQL для PostgreSQL.
+        # Кэш трансляций: одинаковые и однотипные вопросы не идут в LLM повторно
+        self.cache = cache or TranslationCache(self.extract_parameters)
         
-БАЗА ДАННЫХ:
-1. Таблица videos:
-   - id (text) - ID видео
-   - creator_id (text) - ID креатора  
-   - video_created_at (timestamp) - дата публикации
-   - views_count (bigint) - просмотры
-   - likes_count (bigint) - лайки
-   - comments_count (bigint) - комментарии
-   - reports_count (bigint) - жалобы
-   - created_at, updated_at (timestamp)
-
-2. Таблица video_snapshots:
-   - id (text) - ID снапшота
-   - video_id (text) - ссылка на видео
-   - views_count, likes_count, comments_count, reports_count (bigint)
-   - delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count (bigint) - приращения
-   - created_at (timestamp) - время замера
-
-ВАЖНЫЕ ПРАВИЛА:
-1. Для дат используй DATE() для сравнения дат без времени
-2. Всегда подставляй КОНКРЕТНЫЕ значения из запроса в SQL
-3. НЕ используй параметры типа :param_name
-4. Для диапазонов дат используй BETWEEN
-5. Всегда возвращай запрос, который возвращает ОДНО число
-
-Примеры:
-Вопрос: Сколько всего видео есть в системе?
-SQL: SELECT COUNT(*) FROM videos;
-
-Вопрос: Сколько видео у креатора с id abc123 вышло с 1 ноября 2025 по 5 ноября 2025 включительно?
-SQL: SELECT COUNT(*) FROM videos WHERE creator_id = 'abc123' AND DATE(video_created_at) BETWEEN '2025-11-01' AND '2025-11-05';
-
-Вопрос: Сколько видео набрало больше 100000 просмотров за всё время?
-SQL: SELECT COUNT(*) FROM videos WHERE views_count > 100000;
-
-Вопрос: На сколько просмотров в сумме выросли все видео 28 ноября 2025?
-SQL: SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots WHERE DATE(created_at) = '2025-11-28';
-
-Вопрос: Сколько разных видео получали новые просмотры 27 ноября 2025?
-SQL: SELECT COUNT(DISTINCT video_id) FROM video_snapshots WHERE DATE(created_at) = '2025-11-27' AND delta_views_count > 0;
-
-ВОЗВРАЩАЙ ТОЛЬКО SQL ЗАПРОС, БЕЗ ОБЪЯСНЕНИЙ!"""
+        # Быстрый путь: типовые вопросы компилируются правилами без сети
+        self.fast_path = RuleBasedCompiler()
+        
+        # Откуда взят SQL: ответ LLM, fallback по правилам или вопрос не понят
+        self.stats = {"llm": 0, "fallbacks": 0, "unparsed": 0}
+        
+        # Системный промпт собирается под вопрос: модель описывает его структурой JSON (QuerySpec),
+        # SQL строит compile_sql; в промпт идут нужные части схемы и 1-2 похожих проверенных примера
+        self.prompts = prompts or PromptBuilder()
 
+    @property
+    def llm(self):
+        if self._llm is None:
+            from .llm_client import LLMClient
+            self._llm = LLMClient()
+        return self._llm
+    
+    @property
+    def llm_stats(self) -> Dict[str, int]:
+        """Счетчики клиента LLM; до первого обращения к нему - нули"""
+        if self._llm is None:
+            return {"calls": 0, "coalesced": 0, "retries": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        return self._llm.stats
+    
+    async def close(self):
+        if self._llm is not None:
+            await self._llm.close()
+    
     def extract_parameters(self, query: str) -> Dict[str, Any]:
         """Извлечение параметров из запроса для помощи модели"""
         params = {}
@@ -100,8 +99,28 @@ SQL: SELECT COUNT(DISTINCT video_id) FROM video_snapshots WHERE DATE(created_at)
         
         return params
     
-    def parse_query_to_sql(self, query: str) -> Tuple[str, Dict[str, Any]]:
-        """Основной метод преобразования запроса в SQL"""
+    async def parse_query_to_sql(self, query: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Основной метод преобразования запроса в SQL с параметрами (None, если вопрос не понят)"""
+        parsed = await self.parse_query(query)
+        return parsed.sql, parsed.params
+    
+    async def parse_query(self, query: str) -> ParsedQuery:
+        """Вопрос -> QuerySpec (быстрый путь, кэш или LLM) -> SQL с параметрами"""
+        compiled = self.fast_path.compile(query)
+        if self.fast_path.is_confident(compiled):
+            print(f"\n⚡ Быстрый путь ({compiled.rule}, уверенность {compiled.confidence}): {compiled.spec.to_json()}")
+            return self._compile(compiled.spec, 'fast_path')
+        
+        cached = self.cache.get(query)
+        if cached is not None:
+            try:
+                spec = QuerySpec.from_json(cached)
+                print(f"\n⚡ Структура из кэша: {cached}")
+                return self._compile(spec, 'cache')
+            except QuerySpecError as e:
+                # Запись старого формата (SQL) или испорченная - спрашиваем LLM заново
+                print(f"⚠️ Запись кэша трансляций не разобрана: {e}")
+        
         print(f"\n📝 Запрос к LLM: {query}")
         
         # Извлекаем параметры для информативности
@@ -109,62 +128,68 @@ SQL: SELECT COUNT(DISTINCT video_id) FROM video_snapshots WHERE DATE(created_at)
         if extracted_params:
             print(f"🔍 Извлечены параметры: {extracted_params}")
         
+        prompt = self.prompts.build(query)
+        LLM_PROMPT_TOKENS.observe(prompt.tokens)
+        print(f"🧾 Промпт: ~{prompt.tokens} токенов (бюджет {self.prompts.token_budget}), "
+              f"таблицы: {', '.join(prompt.tables)}, примеры: {[example.question for example in prompt.examples]}")
+        
         try:
-            # Запрос к Mistral API
-            response = self.client.chat.completions.create(
-                model=self.model,
+            # Запрос к Mistral API в режиме JSON
+            content = await self.llm.complete(
                 messages=[
-                    {"role": "system", "content": self.system_prompt},
+                    {"role": "system", "content": prompt.text},
                     {"role": "user", "content": query}
                 ],
                 temperature=0.1,
-                max_tokens=200
+                max_tokens=200,
+                response_format={"type": "json_object"}
             )
+            spec = QuerySpec.from_json(self._extract_json(content))
+            print(f"✅ LLM разобрал вопрос: {spec.to_json()}")
             
-            # Получаем и чистим SQL
-            sql_query = response.choices[0].message.content.strip()
-            sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
-            
-            # Убираем возможные параметры
-            sql_query = re.sub(r':\w+', 'NULL', sql_query)
-            
-            print(f"✅ LLM сгенерировал SQL: {sql_query}")
-            
-            # Проверяем, что запрос корректный
-            if not any(keyword in sql_query.upper() for keyword in ['SELECT', 'COUNT', 'SUM']):
-                print("⚠️ LLM вернул некорректный SQL, использую fallback")
-                return self._generate_fallback_sql(query, extracted_params), {}
-            
-            return sql_query, {}
+            # В кэш - структура: шаблоны переносят значения вопроса, а не вычисленные границы
+            self.cache.put(query, spec.to_json())
+            self.stats["llm"] += 1
+            return self._compile(spec, 'llm')
+        
+        except QuerySpecError as e:
+            print(f"⚠️ LLM вернул структуру не по схеме ({e}), использую fallback")
+            return self._fallback(compiled)
             
         except Exception as e:
             print(f"❌ Ошибка LLM API: {e}")
             print("🔄 Использую fallback парсинг...")
-            return self._generate_fallback_sql(query, extracted_params), {}
+            return self._fallback(compiled)
     
-    def _generate_fallback_sql(self, query: str, params: Dict[str, Any]) -> str:
-        """Генерация SQL при ошибке API"""
-        query_lower = query.lower()
-        
-        # Базовые правила fallback
-        if 'сколько всего видео' in query_lower:
-            return "SELECT COUNT(*) FROM videos"
-        
-        elif 'сколько видео у креатора' in query_lower or 'креатора с id' in query_lower:
-            if 'creator_id' in params:
-                return f"SELECT COUNT(*) FROM videos WHERE creator_id = '{params['creator_id']}'"
-        
-        elif 'сколько видео набрало больше' in query_lower and 'просмотров' in query_lower:
-            if 'numbers' in params and params['numbers']:
-                return f"SELECT COUNT(*) FROM videos WHERE views_count > {params['numbers'][0]}"
-        
-        elif 'на сколько просмотров' in query_lower and 'выросли' in query_lower:
-            if 'date' in params:
-                return f"SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots WHERE DATE(created_at) = '{params['date']}'"
-        
-        elif 'сколько разных видео получали новые просмотры' in query_lower:
-            if 'date' in params:
-                return f"SELECT COUNT(DISTINCT video_id) FROM video_snapshots WHERE DATE(created_at) = '{params['date']}' AND delta_views_count > 0"
-        
-        # Самый простой fallback
-        return "SELECT COUNT(*) FROM videos"
\ No newline at end of file
+    @staticmethod
+    def _extract_json(content: str) -> str:
+        """Объект JSON из ответа модели (без ```json и пояснений вокруг)"""
+        content = content.strip().replace('```json', '').replace('```', '').strip()
+        start, end = content.find('{'), content.rfind('}')
+        if start == -1 or end < start:
+            raise QuerySpecError("в ответе нет объекта JSON")
+        return content[start:end + 1]
+    
+    def confirm(self, query: str, parsed: ParsedQuery):
+        """Запрос по вопросу выполнен без ошибок: ответ LLM становится примером для промптов
+
+        Разбор быстрого пути, кэша и fallback в библиотеку не попадает.
+        """
+        if parsed.source == 'llm' and parsed.spec is not None and self.prompts.library.add(query, parsed.spec):
+            print(f"📚 Пример для промптов: {query}")
+
+    @staticmethod
+    def _compile(spec: QuerySpec, source: str) -> ParsedQuery:
+        sql, params = compile_sql(spec)
+        print(f"🧱 SQL: {sql} {params}")
+        return ParsedQuery(sql, params, spec, source)
+    
+    def _fallback(self, compiled: Optional[CompiledQuery]) -> ParsedQuery:
+        """Ответ при ошибке API: вариант быстрого пути с пониженным порогом уверенности"""
+        if not self.fast_path.is_usable_fallback(compiled):
+            print("⚠️ Ни одно правило не подошло уверенно, SQL не сгенерирован")
+            self.stats["unparsed"] += 1
+            return ParsedQuery(None)
+        print(f"🧩 Fallback по правилу {compiled.rule} (уверенность {compiled.confidence})")
+        self.stats["fallbacks"] += 1
+        return self._compile(compiled.spec, 'fallback')
@@ -0,0 +1,315 @@
+import re
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple, Dict, Any, List
+from database.rollups import METRICS, DAILY_TABLE, CREATOR_TABLE, CLOSING_TABLE
+
+AGGREGATIONS = ('count', 'sum', 'avg', 'min', 'max', 'count_distinct')
+TABLES = ('videos', 'video_snapshots')
+OPERATORS = ('>', '>=', '<', '<=', '=')
+# Разбивка результата на строки: по креаторам, дням (публикации или замера) или видео
+GROUPINGS = ('creator_id', 'day', 'video_id')
+ORDERS = ('asc', 'desc')
+_ID = re.compile(r'^[\w-]{1,100}$')
+
+class QuerySpecError(ValueError):
+    """Структура вопроса не прошла проверку (например, ответ LLM не по схеме)"""
+
+@dataclass(frozen=True)
+class MetricFilter:
+    """Порог метрики: views > 100000"""
+    metric: str
+    op: str
+    value: int
+
+@dataclass(frozen=True)
+class QuerySpec:
+    """Вопрос как структура: что считать, по какой таблице и с какими фильтрами
+
+    - videos: metric - итоговая метрика видео ({metric}_count), даты - день публикации;
+    - video_snapshots: metric - приращение за замер (delta_{metric}_count), даты - день замера;
+      count_distinct - число разных видео (с metric - с положительным приращением);
+    - video_id - один ролик; as_of - значения метрик видео на конец этого дня
+      (только videos), их дает таблица video_daily_closing;
+    - group_by - таблица вместо одного числа: значение по каждому креатору,
+      дню или видео, order и limit - порядок по значению и число строк ("топ 10").
+
+    Значения фильтров в SQL не подставляются: compile_sql возвращает запрос
+    с параметрами, поэтому один и тот же вопрос разных пользователей дает
+    один и тот же текст запроса.
+    """
+    aggregation: str
+    table: str = 'videos'
+    metric: Optional[str] = None
+    creator_id: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    filters: Tuple[MetricFilter, ...] = ()
+    video_id: Optional[str] = None
+    as_of: Optional[date] = None
+    group_by: Optional[str] = None
+    order: Optional[str] = None
+    limit: Optional[int] = None
+
+    def __post_init__(self):
+        if self.aggregation not in AGGREGATIONS:
+            raise QuerySpecError(f"неизвестная агрегация: {self.aggregation}")
+        if self.table not in TABLES:
+            raise QuerySpecError(f"неизвестная таблица: {self.table}")
+        if self.metric is not None and self.metric not in METRICS:
+            raise QuerySpecError(f"неизвестная метрика: {self.metric}")
+        if self.aggregation in ('sum', 'avg', 'min', 'max') and self.metric is None:
+            raise QuerySpecError(f"для {self.aggregation} нужна метрика")
+        if self.aggregation == 'count_distinct' and self.table != 'video_snapshots':
+            raise QuerySpecError("count_distinct считается только по video_snapshots")
+        if self.creator_id is not None and not _ID.match(self.creator_id):
+            raise QuerySpecError(f"некорректный id креатора: {self.creator_id}")
+        if self.video_id is not None and not _ID.match(self.video_id):
+            raise QuerySpecError(f"некорректный id видео: {self.video_id}")
+        if self.as_of is not None and self.table != 'videos':
+            raise QuerySpecError("значения на дату (as_of) есть только для videos")
+        if self.group_by is not None and self.group_by not in GROUPINGS:
+            raise QuerySpecError(f"неизвестная разбивка: {self.group_by}")
+        if self.group_by is None and (self.order is not None or self.limit is not None):
+            raise QuerySpecError("order и limit нужны только вместе с group_by")
+        if self.order is not None and self.order not in ORDERS:
+            raise QuerySpecError(f"неизвестный порядок: {self.order}")
+        if self.limit is not None and (not isinstance(self.limit, int) or isinstance(self.limit, bool) or self.limit < 1):
+            raise QuerySpecError(f"некорректный limit: {self.limit}")
+        if self.as_of is not None and self.group_by not in (None, 'video_id'):
+            raise QuerySpecError("значения на дату разбиваются только по видео")
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise QuerySpecError("начало периода позже конца")
+        for item in self.filters:
+            if item.metric not in METRICS or item.op not in OPERATORS \
+                    or not isinstance(item.value, int) or isinstance(item.value, bool):
+                raise QuerySpecError(f"некорректный фильтр: {item}")
+
+    @property
+    def date_range(self) -> Optional[Tuple[Optional[date], Optional[date]]]:
+        if self.date_from is None and self.date_to is None:
+            return None
+        return self.date_from, self.date_to
+
+    @property
+    def columns(self) -> Tuple[str, str]:
+        """Имена колонок таблицы-ответа (group_by): ключ строки и значение"""
+        if self.aggregation == 'count_distinct':
+            value = f"videos_with_new_{self.metric}" if self.metric else 'videos'
+        elif self.metric:
+            value = self.metric
+        elif self.table == 'video_snapshots' and self.aggregation == 'count':
+            value = 'snapshots'
+        else:
+            value = 'videos'
+        if self.aggregation in ('avg', 'min', 'max'):
+            value = f"{self.aggregation}_{value}"
+        return self.group_by or 'key', value
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuerySpec":
+        """Структура из JSON (ответ LLM, кэш трансляций); QuerySpecError - не по схеме"""
+        if not isinstance(data, dict):
+            raise QuerySpecError("ожидался объект JSON")
+        try:
+            return cls(
+                aggregation=data['aggregation'],
+                table=data.get('table') or 'videos',
+                metric=data.get('metric') or None,
+                creator_id=data.get('creator_id') or None,
+                date_from=_parse_date(data.get('date_from')),
+                date_to=_parse_date(data.get('date_to')),
+                filters=tuple(
+                    MetricFilter(item['metric'], item['op'], item['value']) for item in data.get('filters') or ()
+                ),
+                video_id=data.get('video_id') or None,
+                as_of=_parse_date(data.get('as_of')),
+                group_by=data.get('group_by') or None,
+                order=data.get('order') or None,
+                limit=data.get('limit'),
+            )
+        except (KeyError, TypeError) as e:
+            raise QuerySpecError(f"неполная структура: {e}")
+
+    @classmethod
+    def from_json(cls, text: str) -> "QuerySpec":
+        try:
+            return cls.from_dict(json.loads(text))
+        except json.JSONDecodeError as e:
+            raise QuerySpecError(f"некорректный JSON: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'aggregation': self.aggregation,
+            'table': self.table,
+            'metric': self.metric,
+            'creator_id': self.creator_id,
+            'date_from': self.date_from.isoformat() if self.date_from else None,
+            'date_to': self.date_to.isoformat() if self.date_to else None,
+            'filters': [{'metric': f.metric, 'op': f.op, 'value': f.value} for f in self.filters],
+            'video_id': self.video_id,
+            'as_of': self.as_of.isoformat() if self.as_of else None,
+            'group_by': self.group_by,
+            'order': self.order,
+            'limit': self.limit,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+def _parse_date(value) -> Optional[date]:
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise QuerySpecError(f"некорректная дата: {value}")
+
+def _midnight(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+def compile_sql(spec: QuerySpec) -> Tuple[str, Dict[str, Any]]:
+    """SQL с параметрами (:creator_id, :date_from, ...) и значения параметров
+
+    Имена колонок берутся только из списков выше, значения - только через параметры.
+    Даты - полуинтервал [date_from, date_to + 1 день) по самой колонке, чтобы
+    работали индексы. Суммы приращений и число видео с новыми метриками за один
+    день берутся из дневных итогов, значения на дату - из video_daily_closing
+    (database/rollups.py). С group_by запрос возвращает строки (ключ, значение)
+    с колонками spec.columns: по значению от большего (ряд по дням - по датам).
+    """
+    if spec.as_of:
+        return _compile_as_of(spec)
+    if spec.table == 'videos':
+        return _compile_videos(spec)
+    return _compile_snapshots(spec)
+
+def _aggregate(spec: QuerySpec, column: Optional[str]) -> str:
+    if spec.aggregation == 'count':
+        return "COUNT(*)"
+    return f"COALESCE({spec.aggregation.upper()}({column}), 0)"
+
+def _period(column: str, spec: QuerySpec, conditions: List[str], params: Dict[str, Any], day_column: bool = False):
+    # Колонка day - тип date, остальные - timestamp
+    if day_column and spec.date_from and spec.date_from == spec.date_to:
+        conditions.append(f"{column} = :date_from")
+        params['date_from'] = spec.date_from
+        return
+    if spec.date_from:
+        conditions.append(f"{column} >= :date_from")
+        params['date_from'] = spec.date_from if day_column else _midnight(spec.date_from)
+    if spec.date_to:
+        if day_column:
+            conditions.append(f"{column} <= :date_to")
+            params['date_to'] = spec.date_to
+        else:
+            conditions.append(f"{column} < :date_to")
+            params['date_to'] = _midnight(spec.date_to + timedelta(days=1))
+
+def _thresholds(spec: QuerySpec, column: str, conditions: List[str], params: Dict[str, Any]):
+    for i, item in enumerate(spec.filters):
+        conditions.append(f"{column.format(metric=item.metric)} {item.op} :threshold_{i}")
+        params[f"threshold_{i}"] = item.value
+
+def _select(spec: QuerySpec, value: str, key: Optional[str]) -> str:
+    if not spec.group_by:
+        return value
+    key_name, value_name = spec.columns
+    key = key if key == key_name else f"{key} AS {key_name}"
+    return f"{key}, {value} AS {value_name}"
+
+def _finish(sql: str, conditions: List[str], params: Dict[str, Any],
+            spec: QuerySpec = None) -> Tuple[str, Dict[str, Any]]:
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if spec is not None and spec.group_by:
+        sql += " GROUP BY 1"
+        if spec.group_by == 'day' and spec.order is None:
+            sql += " ORDER BY 1"
+        else:
+            sql += f" ORDER BY 2 {(spec.order or 'desc').upper()}, 1"
+        if spec.limit:
+            sql += " LIMIT :limit"
+            params['limit'] = spec.limit
+    return sql, params
+
+def _compile_videos(spec: QuerySpec) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = [], {}
+    if spec.video_id:
+        conditions.append("id = :video_id")
+        params['video_id'] = spec.video_id
+    if spec.creator_id:
+        conditions.append("creator_id = :creator_id")
+        params['creator_id'] = spec.creator_id
+    _period('video_created_at', spec, conditions, params)
+    _thresholds(spec, "{metric}_count", conditions, params)
+    column = f"{spec.metric}_count" if spec.metric else None
+    key = {'creator_id': 'creator_id', 'day': 'video_created_at::date', 'video_id': 'id'}.get(spec.group_by)
+    return _finish(f"SELECT {_select(spec, _aggregate(spec, column), key)} FROM videos", conditions, params, spec)
+
+def _compile_as_of(spec: QuerySpec) -> Tuple[str, Dict[str, Any]]:
+    # Строки итогов есть только за дни со снапшотами: значение на дату - последняя строка видео не позже as_of
+    closing = ', '.join(f"{metric}_count" for metric in METRICS)
+    source = (
+        f"videos v CROSS JOIN LATERAL (SELECT {closing} FROM {CLOSING_TABLE} "
+        "WHERE video_id = v.id AND day <= :as_of ORDER BY day DESC LIMIT 1) c"
+    )
+    conditions, params = [], {'as_of': spec.as_of}
+    if spec.video_id:
+        conditions.append("v.id = :video_id")
+        params['video_id'] = spec.video_id
+    if spec.creator_id:
+        conditions.append("v.creator_id = :creator_id")
+        params['creator_id'] = spec.creator_id
+    _period('v.video_created_at', spec, conditions, params)
+    _thresholds(spec, "c.{metric}_count", conditions, params)
+    column = f"c.{spec.metric}_count" if spec.metric else None
+    return _finish(f"SELECT {_select(spec, _aggregate(spec, column), 'v.id')} FROM {source}", conditions, params, spec)
+
+def _compile_snapshots(spec: QuerySpec) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = [], {}
+    single_day = spec.date_from is not None and spec.date_from == spec.date_to
+
+    rollup_column = None
+    # Итоги хранятся по дням и креаторам, не по видео
+    by_video = spec.video_id is not None or spec.group_by == 'video_id'
+    if not by_video and not spec.filters and spec.aggregation == 'sum':
+        # Суммы приращений складываются по дням
+        rollup_column = f"delta_{spec.metric}_count"
+    elif not by_video and not spec.filters and spec.aggregation == 'count_distinct' and spec.metric \
+            and (single_day or spec.group_by == 'day'):
+        # Число разных видео хранится за день; за период его не сложить, по дням - можно
+        rollup_column = f"videos_with_new_{spec.metric}"
+    if rollup_column:
+        table = DAILY_TABLE
+        if spec.creator_id or spec.group_by == 'creator_id':
+            table = CREATOR_TABLE
+        if spec.creator_id:
+            conditions.append("creator_id = :creator_id")
+            params['creator_id'] = spec.creator_id
+        _period('day', spec, conditions, params, day_column=True)
+        select = _select(spec, f"COALESCE(SUM({rollup_column}), 0)", spec.group_by)
+        return _finish(f"SELECT {select} FROM {table}", conditions, params, spec)
+
+    # Разбивка по креаторам - соединение с videos; колонки снапшотов тогда с алиасом s
+    joined = spec.group_by == 'creator_id'
+    s = 's.' if joined else ''
+    if spec.video_id:
+        conditions.append(f"{s}video_id = :video_id")
+        params['video_id'] = spec.video_id
+    _period(f'{s}created_at', spec, conditions, params)
+    if spec.creator_id:
+        conditions.append("v.creator_id = :creator_id" if joined
+                          else "video_id IN (SELECT id FROM videos WHERE creator_id = :creator_id)")
+        params['creator_id'] = spec.creator_id
+    _thresholds(spec, s + "delta_{metric}_count", conditions, params)
+    if spec.aggregation == 'count_distinct':
+        if spec.metric:
+            conditions.append(f"{s}delta_{spec.metric}_count > 0")
+        value = f"COUNT(DISTINCT {s}video_id)"
+    else:
+        value = _aggregate(spec, f"{s}delta_{spec.metric}_count" if spec.metric else None)
+    key = {'creator_id': 'v.creator_id', 'day': 'created_at::date', 'video_id': 'video_id'}.get(spec.group_by)
+    source = "video_snapshots s JOIN videos v ON v.id = s.video_id" if joined else "video_snapshots"
+    return _finish(f"SELECT {_select(spec, value, key)} FROM {source}", conditions, params, spec)
@@ -0,0 +1,298 @@
+import re
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict, Any, Callable, List
+from config import config
+
+# Все формы названий месяцев приводим к родительному падежу ("28 ноября 2025")
+MONTH_FORMS = {
+    'января': ('январь', 'января', 'январе'),
+    'февраля': ('февраль', 'февраля', 'феврале'),
+    'марта': ('март', 'марта', 'марте'),
+    'апреля': ('апрель', 'апреля', 'апреле'),
+    'мая': ('май', 'мая', 'мае'),
+    'июня': ('июнь', 'июня', 'июне'),
+    'июля': ('июль', 'июля', 'июле'),
+    'августа': ('август', 'августа', 'августе'),
+    'сентября': ('сентябрь', 'сентября', 'сентябре'),
+    'октября': ('октябрь', 'октября', 'октябре'),
+    'ноября': ('ноябрь', 'ноября', 'ноябре'),
+    'декабря': ('декабрь', 'декабря', 'декабре'),
+}
+MONTH_CANONICAL = {form: canonical for canonical, forms in MONTH_FORMS.items() for form in forms}
+MONTHS_BY_NUMBER = list(MONTH_FORMS.keys())
+
+# Вопросы с относительными датами нельзя кэшировать: ответ зависит от сегодняшнего дня
+RELATIVE_DATE_WORDS = ('сегодня', 'вчера', 'позавчера', 'последн', 'прошл', 'текущ', 'этой недел', 'этом месяц')
+
+DATE_PATTERN = re.compile(r'(\d{1,2})\s+(\w+)\s+(\d{4})')
+
+def normalize_question(query: str) -> str:
+    """Нормализация вопроса: регистр, пробелы, группы разрядов, даты и месяцы"""
+    # Регистр ID креатора сохраняем - он значим для SQL
+    parts = re.split(r'(\bid\s+[\w-]+)', query, flags=re.IGNORECASE)
+    text = ''.join(
+        re.sub(r'^id\s+', 'id ', part, flags=re.IGNORECASE) if i % 2 else part.lower()
+        for i, part in enumerate(parts)
+    ).replace('ё', 'е')
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = text.rstrip('?!. ')
+
+    # "100 000" / "100,000" -> "100000"
+    previous = None
+    while previous != text:
+        previous = text
+        text = re.sub(r'(?<=\d)[ ,](?=\d{3}\b)', '', text)
+
+    # "28.11.2025" -> "28 ноября 2025"
+    def _numeric_date(m):
+        month = int(m.group(2))
+        if not 1 <= month <= 12:
+            return m.group(0)
+        return f"{int(m.group(1))} {MONTHS_BY_NUMBER[month - 1]} {m.group(3)}"
+    text = re.sub(r'\b(\d{1,2})\.(\d{1,2})\.(\d{4})\b', _numeric_date, text)
+
+    # Формы месяцев и ведущие нули в днях
+    text = re.sub(r'[а-я]+', lambda m: MONTH_CANONICAL.get(m.group(0), m.group(0)), text)
+    text = re.sub(r'\b0(\d)\b', r'\1', text)
+    return text
+
+class TranslationCache:
+    """Кэш трансляции вопрос -> структура запроса (JSON QuerySpec) с вытеснением LRU + TTL
+
+    Два уровня ключей:
+    - точный: нормализованный вопрос;
+    - шаблонный: вопрос, в котором значения из extract_parameters заменены
+      плейсхолдерами. Для него хранится скелет JSON, в который подставляются
+      значения нового вопроса без обращения к LLM.
+    """
+
+    def __init__(
+        self,
+        extract_parameters: Callable[[str], Dict[str, Any]],
+        max_entries: int = None,
+        ttl: float = None,
+        path: str = None,
+    ):
+        self.extract_parameters = extract_parameters
+        self.max_entries = max_entries if max_entries is not None else config.TRANSLATION_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.TRANSLATION_CACHE_TTL
+        self.path = path if path is not None else config.TRANSLATION_CACHE_PATH
+
+        # ключ -> (значение, время истечения)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "template_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if self.path:
+            self._open_storage()
+
+    def get(self, query: str) -> Optional[str]:
+        """Найти структуру для вопроса (точное совпадение или шаблон)"""
+        normalized = normalize_question(query)
+        if self._is_relative(normalized):
+            self.stats["misses"] += 1
+            return None
+
+        sql = self._lookup("q:" + normalized)
+        if sql is not None:
+            self.stats["hits"] += 1
+            return sql
+
+        template = self._make_template(normalized)
+        if template is not None:
+            key, slots = template
+            skeleton = self._lookup("t:" + key)
+            if skeleton is not None:
+                self.stats["template_hits"] += 1
+                return self._bind(skeleton, slots)
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, query: str, value: str):
+        """Сохранить результат трансляции"""
+        normalized = normalize_question(query)
+        if self._is_relative(normalized):
+            return
+
+        self._store("q:" + normalized, value)
+
+        template = self._make_template(normalized)
+        if template is not None:
+            key, slots = template
+            skeleton = self._skeletonize(value, slots)
+            if skeleton is not None:
+                self._store("t:" + key, skeleton)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["template_hits"] + self.stats["misses"]
+        return (self.stats["hits"] + self.stats["template_hits"]) / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- шаблоны ---
+
+    @staticmethod
+    def _is_relative(normalized: str) -> bool:
+        return any(word in normalized for word in RELATIVE_DATE_WORDS)
+
+    def _make_template(self, normalized: str) -> Optional[Tuple[str, List[Tuple[str, str]]]]:
+        """Заменить значения параметров плейсхолдерами.
+
+        Возвращает (шаблон, [(плейсхолдер, значение в JSON)]) или None, если в
+        вопросе остаются числа, которые не удалось сопоставить параметрам -
+        тогда переиспользовать скелет небезопасно.
+        """
+        params = self.extract_parameters(normalized)
+        spans = []
+
+        date_match = DATE_PATTERN.search(normalized)
+        if 'date' in params and date_match:
+            spans.append((date_match.start(), date_match.end(), '{date}', json.dumps(params['date'])))
+
+        if 'creator_id' in params:
+            id_match = re.search(r'id\s+(' + re.escape(params['creator_id']) + r')', normalized)
+            if id_match:
+                spans.append((id_match.start(1), id_match.end(1), '{creator_id}', json.dumps(params['creator_id'])))
+
+        taken = [(start, end) for start, end, _, _ in spans]
+        for m in re.finditer(r'\b\d+\b', normalized):
+            if not any(start <= m.start() < end for start, end in taken):
+                spans.append((m.start(), m.end(), '{num}', str(int(m.group(0)))))
+
+        if not spans:
+            return None
+
+        spans.sort()
+        template, residual, slots, position, number_index = [], [], [], 0, 0
+        for start, end, placeholder, value in spans:
+            if start < position:
+                return None
+            if placeholder == '{num}':
+                placeholder = '{num_%s}' % chr(ord('a') + number_index)
+                number_index += 1
+            residual.append(normalized[position:start])
+            template.extend((normalized[position:start], placeholder))
+            slots.append((placeholder, value))
+            position = end
+        residual.append(normalized[position:])
+        template.append(normalized[position:])
+
+        if re.search(r'\d', ''.join(residual)):
+            return None
+        return ''.join(template), slots
+
+    @staticmethod
+    def _skeletonize(value: str, slots: List[Tuple[str, str]]) -> Optional[str]:
+        """Заменить значения в JSON на плейсхолдеры
+
+        Каждое значение должно встречаться ровно один раз, иначе непонятно, какое
+        из них взято из вопроса. Исключение - дата: одна дата вопроса бывает
+        и началом, и концом периода.
+        """
+        values = [slot_value for _, slot_value in slots]
+        if len(set(values)) != len(values):
+            return None
+
+        skeleton = value
+        for placeholder, slot_value in slots:
+            if slot_value.startswith('"'):
+                pattern = re.escape(slot_value)
+            else:
+                # число вне строк
+                pattern = r'(?<![\w".-])' + re.escape(slot_value) + r'(?![\w".-])'
+            matches = list(re.finditer(pattern, skeleton))
+            if not matches or len(matches) > 1 and placeholder != '{date}':
+                return None
+            skeleton = re.sub(pattern, placeholder, skeleton)
+        return skeleton
+
+    @staticmethod
+    def _bind(skeleton: str, slots: List[Tuple[str, str]]) -> str:
+        value = skeleton
+        for placeholder, slot_value in slots:
+            value = value.replace(placeholder, slot_value)
+        return value
+
+    # --- хранилище LRU + TTL ---
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            self._delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            self._persist_delete(old_key)
+        self._persist_store(key, value, expires_at)
+
+    def _delete(self, key: str):
+        self._entries.pop(key, None)
+        self._persist_delete(key)
+
+    # --- персистентность в SQLite ---
+
+    def _open_storage(self):
+        try:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM translations WHERE expires_at < ?", (time.time(),))
+            rows = self._db.execute(
+                "SELECT key, value, expires_at FROM translations ORDER BY expires_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            # Самые свежие записи - в конец очереди LRU
+            for key, value, expires_at in reversed(rows):
+                self._entries[key] = (value, expires_at)
+            self._db.commit()
+            print(f"💾 Кэш трансляций загружен: {len(self._entries)} записей из {self.path}")
+        except sqlite3.Error as e:
+            print(f"⚠️ Не удалось открыть кэш трансляций {self.path}: {e}")
+            self._db = None
+
+    def _persist_store(self, key: str, value: str, expires_at: float):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO translations (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Ошибка записи кэша трансляций: {e}")
+
+    def _persist_delete(self, key: str):
+        if self._db is None:
+            return
+        try:
+            self._db.execute("DELETE FROM translations WHERE key = ?", (key,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Ошибка записи кэша трансляций: {e}")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,53 @@
+import time
+import asyncio
+from typing import Any, Dict, Optional
+
+class DataReadiness:
+    """Готовность данных к вопросам
+
+    Бот начинает принимать сообщения сразу после старта, а данные загружаются
+    в фоне. Пока загрузка не закончилась, вопросы о данных получают ответ
+    "данные загружаются", а /readyz вебхука - 503.
+
+    Состояния: starting -> loading -> ready | failed.
+    """
+
+    def __init__(self):
+        self.state = "starting"
+        self.error: Optional[str] = None
+        self.started = time.perf_counter()
+        self.ready_seconds: Optional[float] = None
+        self._ready = asyncio.Event()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def mark_loading(self):
+        if not self.is_ready:
+            self.state = "loading"
+
+    def mark_ready(self):
+        if self.is_ready:
+            return
+        self.state = "ready"
+        self.ready_seconds = time.perf_counter() - self.started
+        self._ready.set()
+        print(f"✅ Данные готовы к вопросам через {self.ready_seconds:.2f} с после старта")
+
+    def mark_failed(self, error: Exception):
+        """Загрузка не удалась; если данные прошлого запуска уже отвечают - остаемся готовыми"""
+        self.error = f"{type(error).__name__}: {error}"
+        if not self.is_ready:
+            self.state = "failed"
+
+    async def wait(self, timeout: float = None) -> bool:
+        """Дождаться готовности; False - не дождались за timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {"data": self.state, "data_ready_seconds": self.ready_seconds, "data_error": self.error}
@@ -16,6 +16,11 @@ async def reset_database():
         # Удаляем таблицы с каскадом
         await conn.execute(text("DROP TABLE IF EXISTS video_snapshots CASCADE"))
         await conn.execute(text("DROP TABLE IF EXISTS videos CASCADE"))
+        await conn.execute(text("DROP TABLE IF EXISTS ingest_state CASCADE"))
+        await conn.execute(text("DROP TABLE IF EXISTS snapshot_daily_stats CASCADE"))
+        await conn.execute(text("DROP TABLE IF EXISTS snapshot_daily_creator_stats CASCADE"))
+        await conn.execute(text("DROP TABLE IF EXISTS video_daily_closing CASCADE"))
+        await conn.execute(text("DROP TABLE IF EXISTS data_version CASCADE"))
         
         print("✅ Таблицы удалены")
     
@@ -0,0 +1,148 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message
+from config import config
+from metrics import QUEUE_WAIT_SECONDS
+
+class SchedulerFull(Exception):
+    """Очередь пользователя или общая очередь заполнена"""
+
+class FairScheduler:
+    """Очереди вопросов по пользователям с круговой выдачей
+
+    - у каждого пользователя своя очередь не глубже max_depth (считая выполняемые);
+    - свободный слот получает следующий по кругу пользователь, поэтому пятьдесят
+      вопросов одного не задерживают единственный вопрос другого;
+    - одновременно выполняется не больше max_concurrency заданий - это потолок
+      для этапов LLM и базы вместе (внутри LLM ограничен еще LLM_MAX_CONCURRENCY);
+    - при полной очереди submit сразу бросает SchedulerFull, ничего не ожидая.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_depth: int = None, max_queued: int = None):
+        self.max_concurrency = max_concurrency or config.SCHEDULER_MAX_CONCURRENCY
+        self.max_depth = max_depth or config.USER_QUEUE_DEPTH
+        self.max_queued = max_queued or config.SCHEDULER_MAX_QUEUED
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        # Пользователь -> ожидающие задания; порядок ключей - очередь круговой выдачи
+        self.queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self.active: Dict[Hashable, int] = {}
+        self.queued = 0
+        self.running = 0
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def depth(self, user_id: Hashable) -> int:
+        """Задания пользователя в очереди и в работе"""
+        return len(self.queues.get(user_id, ())) + self.active.get(user_id, 0)
+
+    async def submit(self, user_id: Hashable, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Поставить задание в очередь пользователя и дождаться результата"""
+        if self.depth(user_id) >= self.max_depth or self.queued >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise SchedulerFull()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (job, future, time.perf_counter())
+        self.queues.setdefault(user_id, deque()).append(entry)
+        self.active.setdefault(user_id, 0)
+        self.queued += 1
+        self.stats["submitted"] += 1
+        self._wakeup.set()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Отмененный ожидающий сразу освобождает место в очередях, не дожидаясь своей очереди
+            self._withdraw(user_id, entry)
+            raise
+
+    def _withdraw(self, user_id: Hashable, entry: tuple):
+        queue = self.queues.get(user_id)
+        if queue is None or not any(item is entry for item in queue):
+            # Уже выдано: задание выполняется, его результат просто никто не ждет
+            return
+        queue.remove(entry)
+        self.queued -= 1
+        if not queue:
+            del self.queues[user_id]
+        self._forget(user_id)
+
+    async def _dispatch(self):
+        """Выдача заданий: свободный слот -> первый пользователь в круге -> в конец круга"""
+        while True:
+            await self.slots.acquire()
+            while not self.queues:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            user_id, queue = next(iter(self.queues.items()))
+            job, future, enqueued = queue.popleft()
+            if queue:
+                self.queues.move_to_end(user_id)
+            else:
+                del self.queues[user_id]
+            self.queued -= 1
+
+            if future.done():
+                # Ожидавший отменен (например, остановка бота)
+                self.slots.release()
+                self._forget(user_id)
+                continue
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - enqueued)
+            self.active[user_id] += 1
+            self.running += 1
+            asyncio.create_task(self._run(user_id, job, future))
+
+    async def _run(self, user_id: Hashable, job: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        try:
+            result = await job()
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.stats["completed"] += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self.running -= 1
+            self.active[user_id] -= 1
+            self._forget(user_id)
+            self.slots.release()
+
+    def _forget(self, user_id: Hashable):
+        if not self.active.get(user_id) and user_id not in self.queues:
+            self.active.pop(user_id, None)
+
+    async def close(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+
+class FairSchedulerMiddleware(BaseMiddleware):
+    """Проводит через FairScheduler обработчики с флагом fair_queue
+
+    Команды (/start, /help) отвечают сразу; вопросы встают в очередь отправителя.
+    """
+
+    def __init__(self, scheduler: FairScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not get_flag(data, "fair_queue") or event.from_user is None:
+            return await handler(event, data)
+        try:
+            return await self.scheduler.submit(event.from_user.id, lambda: handler(event, data))
+        except SchedulerFull:
+            await event.answer("⏳ Слишком много запросов, подождите, пока я отвечу на предыдущие.")
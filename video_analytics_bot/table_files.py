@@ -0,0 +1,152 @@
+import os
+import csv
+import asyncio
+import tempfile
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+from config import config
+
+FORMATS = ('csv', 'xlsx')
+# Оценка служебных байт строки XLSX (теги строки и ячеек) - размер файла известен только после сохранения
+XLSX_ROW_OVERHEAD = 40
+
+def _openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("Для TABLE_FILE_FORMAT=xlsx установите пакет openpyxl")
+    return openpyxl
+
+def cell_value(value: Any) -> Any:
+    """Значение для файла: целые суммы (numeric) - целыми, дроби - float"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+class CsvWriter:
+    """CSV прямо в файл на диске; UTF-8 с BOM - Excel открывает его без выбора кодировки"""
+
+    extension = 'csv'
+
+    def __init__(self, path: str, columns: Sequence[str]):
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    @property
+    def size(self) -> int:
+        return self._file.tell()
+
+    def write(self, rows: Sequence[tuple]):
+        self._writer.writerows([cell_value(value) for value in row] for row in rows)
+
+    def close(self):
+        self._file.close()
+
+class XlsxWriter:
+    """XLSX в режиме write_only: openpyxl пишет строки во временный файл, а не держит лист в памяти
+
+    Размер до сохранения неизвестен, поэтому size - оценка по длине значений.
+    """
+
+    extension = 'xlsx'
+
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.path = path
+        self._book = _openpyxl().Workbook(write_only=True)
+        self._sheet = self._book.create_sheet()
+        self._sheet.append(list(columns))
+        self.size = 0
+
+    def write(self, rows: Sequence[tuple]):
+        for row in rows:
+            values = [cell_value(value) for value in row]
+            self._sheet.append(values)
+            self.size += XLSX_ROW_OVERHEAD + sum(len(str(value)) for value in values)
+
+    def close(self):
+        self._book.save(self.path)
+
+@dataclass
+class TableFile:
+    """Таблица, записанная в файл: путь, имя для пользователя и сколько строк попало"""
+    path: str
+    filename: str
+    rows: int
+    truncated: bool
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+@dataclass
+class TableResult:
+    """Ответ-таблица: маленькая - строками (rows), большая - файлом (file)"""
+    columns: Tuple[str, str]
+    rows: List[tuple] = field(default_factory=list)
+    file: Optional[TableFile] = None
+
+async def build_table(
+    columns: Tuple[str, str], batches: AsyncIterator[List[tuple]], inline_rows: int = None,
+    fmt: str = None, max_rows: int = None, max_bytes: int = None
+) -> TableResult:
+    """Прочитать строки запроса: до inline_rows строк - в ответ сообщением, больше - в файл
+
+    Строки пишутся в файл пачками по мере чтения курсора, в памяти - только
+    текущая пачка. Запись останавливается после max_rows строк или когда файл
+    превысил max_bytes (лимит проверяется после каждой пачки); тогда truncated.
+    """
+    inline_rows = inline_rows if inline_rows is not None else config.TABLE_INLINE_ROWS
+    fmt = fmt or config.TABLE_FILE_FORMAT
+    max_rows = max_rows or config.TABLE_MAX_ROWS
+    max_bytes = max_bytes or config.TABLE_MAX_BYTES
+    if fmt not in FORMATS:
+        raise RuntimeError(f"Неизвестный TABLE_FILE_FORMAT: {fmt} (ожидается {', '.join(FORMATS)})")
+
+    try:
+        # Первые строки копятся, пока не ясно, поместится ли таблица в сообщение
+        head: List[tuple] = []
+        async for batch in batches:
+            head.extend(batch)
+            if len(head) > inline_rows:
+                break
+        else:
+            return TableResult(columns, rows=head)
+        return TableResult(columns, file=await _write_file(columns, head, batches, fmt, max_rows, max_bytes))
+    finally:
+        # Обрезанная таблица не дочитывается: курсор закрывается сразу
+        await batches.aclose()
+
+async def _write_file(columns: Tuple[str, str], head: List[tuple], batches: AsyncIterator[List[tuple]],
+                      fmt: str, max_rows: int, max_bytes: int) -> TableFile:
+    writer_class = XlsxWriter if fmt == 'xlsx' else CsvWriter
+    descriptor, path = tempfile.mkstemp(prefix='table-', suffix=f'.{writer_class.extension}')
+    os.close(descriptor)
+    table = TableFile(path, f"{columns[1]}_by_{columns[0]}.{writer_class.extension}", 0, False)
+    try:
+        writer = writer_class(path, columns)
+        try:
+            pending = head
+            while True:
+                rows = pending[:max_rows - table.rows]
+                # Запись - в потоке: большая пачка XLSX не задерживает event loop
+                await asyncio.to_thread(writer.write, rows)
+                table.rows += len(rows)
+                if len(rows) < len(pending):
+                    table.truncated = True
+                    break
+                pending = await anext(batches, None)
+                if pending is None:
+                    break
+                if table.rows >= max_rows or writer.size > max_bytes:
+                    table.truncated = True
+                    break
+        finally:
+            await asyncio.to_thread(writer.close)
+    except BaseException:
+        table.remove()
+        raise
+    return table
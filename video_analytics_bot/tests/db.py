@@ -0,0 +1,50 @@
+import os
+import json
+import tempfile
+import unittest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from config import config
+
+# Отдельная база для тестов с Postgres: тесты удаляют и создают в ней таблицы.
+# Без TEST_DB_NAME такие тесты пропускаются; сервер и пользователь - из DB_* конфига
+TEST_DB_NAME = os.getenv("TEST_DB_NAME")
+
+requires_db = unittest.skipUnless(
+    TEST_DB_NAME and TEST_DB_NAME != config.DB_NAME, "TEST_DB_NAME не задан (или совпадает с DB_NAME)"
+)
+
+def create_test_engine() -> AsyncEngine:
+    return create_async_engine(
+        f"postgresql+asyncpg://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{TEST_DB_NAME}"
+    )
+
+async def reset_schema(engine: AsyncEngine):
+    """Пустая схема public"""
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+
+def video(video_id: str, created_at: str, snapshots: int = 2, creator_id: str = 'c1', **fields) -> dict:
+    """Видео в формате выгрузки с почасовыми снапшотами после created_at ('2025-11-05T10')"""
+    return {
+        "id": video_id, "creator_id": creator_id, "video_created_at": f"{created_at}:00:00+00:00",
+        "views_count": 10 * snapshots, "likes_count": snapshots, "comments_count": 0, "reports_count": 0,
+        "created_at": f"{created_at}:00:00+00:00", "updated_at": f"{created_at}:00:00+00:00",
+        "snapshots": [
+            {
+                "id": f"{video_id}_{i}", "video_id": video_id, "views_count": 10 * (i + 1), "likes_count": i + 1,
+                "comments_count": 0, "reports_count": 0, "delta_views_count": 10, "delta_likes_count": 1,
+                "delta_comments_count": 0, "delta_reports_count": 0,
+                "created_at": f"{created_at}:{i:02d}:00+00:00", "updated_at": f"{created_at}:{i:02d}:00+00:00",
+                **fields,
+            }
+            for i in range(snapshots)
+        ],
+    }
+
+def write_dump(videos: list) -> str:
+    """Временный файл выгрузки {"videos": [...]}; удаляет вызывающий"""
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump({"videos": videos}, f)
+    return f.name
@@ -0,0 +1,119 @@
+import re
+import json
+import unittest
+from datetime import datetime
+from sqlalchemy import text
+from database.init_db import DatabaseInitializer
+from database.partitions import ensure_partitions
+from nlp.prompt_builder import SEED_EXAMPLES
+from nlp.query_spec import QuerySpec, compile_sql
+from tests.db import requires_db, create_test_engine, reset_schema
+
+# Запросы к сырым снапшотам, которые не закрывают дневные итоги
+RAW_SNAPSHOT_SPECS = [
+    {"aggregation": "sum", "table": "video_snapshots", "metric": "views", "video_id": "v1",
+     "date_from": "2025-11-28", "date_to": "2025-11-28"},
+    {"aggregation": "sum", "table": "video_snapshots", "metric": "likes", "date_from": "2025-11-01",
+     "date_to": "2025-11-05", "filters": [{"metric": "likes", "op": ">", "value": 1}]},
+    {"aggregation": "sum", "table": "video_snapshots", "metric": "views", "creator_id": "c1",
+     "date_from": "2025-11-28", "date_to": "2025-11-28", "filters": [{"metric": "views", "op": ">", "value": 5}]},
+    {"aggregation": "sum", "table": "video_snapshots", "metric": "views", "date_from": "2025-11-01",
+     "date_to": "2025-11-05", "group_by": "video_id", "order": "desc", "limit": 10},
+    {"aggregation": "count", "table": "video_snapshots", "date_from": "2025-11-01", "date_to": "2025-11-05",
+     "group_by": "creator_id", "filters": [{"metric": "views", "op": ">", "value": 5}]},
+]
+
+# 1000 видео и ~100 тыс. почасовых снапшотов 100 из них за 40 дней, по порядку времени (как пишет загрузка)
+DATA_SQL = [
+    "INSERT INTO videos (id, creator_id, video_created_at, views_count, likes_count, comments_count, "
+    "reports_count, created_at, updated_at) "
+    "SELECT 'v' || g, 'c' || g % 50, timestamp '2025-11-01' + g % 960 * interval '1 hour', g, g % 100, 0, 0, "
+    "timestamp '2025-11-01', timestamp '2025-11-01' FROM generate_series(1, 1000) g",
+    "INSERT INTO video_snapshots (id, video_id, views_count, likes_count, comments_count, reports_count, "
+    "delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count, created_at, updated_at) "
+    "SELECT 's' || h || '_' || v, 'v' || v, h * 10, h, 0, 0, 10, 1, 0, 0, "
+    "timestamp '2025-11-01' + h * interval '1 hour', timestamp '2025-11-01' + h * interval '1 hour' "
+    "FROM generate_series(0, 959) h, generate_series(1, 100) v ORDER BY h, v",
+]
+
+# Первая колонка каждого индекса
+INDEXES_SQL = """
+SELECT c.relname AS index_name, t.relname AS table_name, a.attname AS leading_column
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_class t ON t.oid = i.indrelid
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+"""
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _nodes(child)
+
+def _range_condition(column: str, condition: str) -> bool:
+    """Условие сравнивает саму колонку (а не функцию от нее): "(created_at >= ...", "((video_id)::text = ..." """
+    return re.search(r'\(\(?' + column + r'\)?(?:::\w+)?\s*(?:=|>=|<=|<|>)\s', condition) is not None
+
+@requires_db
+class DatePredicatesUseIndexesTest(unittest.IsolatedAsyncioTestCase):
+    """Условия по датам из compile_sql - диапазоны по самой колонке, их закрывают индексы
+
+    enable_seqscan = off: проверяется, что индекс можно использовать, а не выбор
+    планировщика на тестовом объеме. Каждое чтение video_snapshots (и videos в
+    вопросах о периоде публикации) должно идти по индексу, первая колонка которого
+    есть в условии индекса, - то есть диапазоном, а не полным обходом индекса.
+    Условие вида DATE(created_at) = ... так использовать нельзя.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_test_engine()
+        await reset_schema(self.engine)
+        await DatabaseInitializer(self.engine).create_tables()
+        async with self.engine.begin() as conn:
+            raw = (await conn.get_raw_connection()).driver_connection
+            await ensure_partitions(raw, [datetime(2025, 11, 1), datetime(2025, 12, 1)])
+            for sql in DATA_SQL:
+                await conn.execute(text(sql))
+            await conn.execute(text("ANALYZE"))
+            self.indexes = {row.index_name: row for row in await conn.execute(text(INDEXES_SQL))}
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def plan(self, sql: str, params: dict = None) -> dict:
+        async with self.engine.begin() as conn:
+            await conn.execute(text("SET LOCAL enable_seqscan = off"))
+            plan = (await conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params or {})).scalar()
+        return (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+
+    def assertRangeScans(self, plan: dict, tables, message):
+        """Чтения таблиц tables - только диапазоном по индексу"""
+        for node in _nodes(plan):
+            relation = node.get('Relation Name', '')
+            if node['Node Type'] == 'Seq Scan' and relation.startswith(tables):
+                self.fail(f"Seq Scan по {relation}: {message}")
+            index = self.indexes.get(node.get('Index Name'))
+            if index is not None and index.table_name.startswith(tables):
+                self.assertTrue(
+                    _range_condition(index.leading_column, node.get('Index Cond', '')),
+                    f"{node['Index Name']} без условия на {index.leading_column}: {message}"
+                )
+
+    async def test_canonical_questions(self):
+        specs = [QuerySpec.from_dict(spec) for _, spec in SEED_EXAMPLES] \
+            + [QuerySpec.from_dict(spec) for spec in RAW_SNAPSHOT_SPECS]
+        for spec in specs:
+            sql, params = compile_sql(spec)
+            tables = ('video_snapshots',)
+            if spec.table == 'videos' and spec.date_range:
+                tables += ('videos',)
+            self.assertRangeScans(await self.plan(sql, params), tables, sql)
+
+    async def test_date_function_is_not_sargable(self):
+        # Проверка самой проверки: DATE() от колонки диапазоном по индексу не читается
+        plan = await self.plan("SELECT count(*) FROM video_snapshots WHERE DATE(created_at) = '2025-11-28'")
+        with self.assertRaises(AssertionError):
+            self.assertRangeScans(plan, ('video_snapshots',), "DATE(created_at)")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from datetime import date
+from nlp.fast_path import RuleBasedCompiler
+from nlp.query_spec import MetricFilter
+
+TODAY = date(2025, 12, 1)
+
+class CompilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.compiler = RuleBasedCompiler(min_confidence=0.8)
+
+    def compile(self, question):
+        compiled = self.compiler.compile(question, TODAY)
+        self.assertIsNotNone(compiled, question)
+        return compiled
+
+    def assertConfident(self, question):
+        compiled = self.compile(question)
+        self.assertTrue(self.compiler.is_confident(compiled), (question, compiled))
+        return compiled.spec
+
+    def assertNotConfident(self, question):
+        compiled = self.compiler.compile(question, TODAY)
+        self.assertFalse(self.compiler.is_confident(compiled), (question, compiled))
+        self.assertFalse(RuleBasedCompiler.is_usable_fallback(compiled), (question, compiled))
+
+class FastPathTemplatesTest(CompilerTestCase):
+    """Типовые вопросы разбираются без LLM с полной уверенностью"""
+
+    def test_count_all_videos(self):
+        spec = self.assertConfident("Сколько всего видео есть в системе?")
+        self.assertEqual((spec.aggregation, spec.table), ('count', 'videos'))
+
+    def test_count_creator_period(self):
+        spec = self.assertConfident(
+            "Сколько видео у креатора с id abc123 вышло с 1 ноября 2025 по 5 ноября 2025 включительно?")
+        self.assertEqual(spec.creator_id, 'abc123')
+        self.assertEqual((spec.date_from, spec.date_to), (date(2025, 11, 1), date(2025, 11, 5)))
+
+    def test_delta_sum_day(self):
+        spec = self.assertConfident("На сколько просмотров в сумме выросли все видео 28 ноября 2025?")
+        self.assertEqual((spec.aggregation, spec.table, spec.metric), ('sum', 'video_snapshots', 'views'))
+        self.assertEqual((spec.date_from, spec.date_to), (date(2025, 11, 28), date(2025, 11, 28)))
+
+    def test_distinct_new(self):
+        spec = self.assertConfident("Сколько разных видео получали новые лайки с 1 по 5 ноября 2025?")
+        self.assertEqual((spec.aggregation, spec.metric), ('count_distinct', 'likes'))
+
+    def test_threshold(self):
+        spec = self.assertConfident("Сколько видео набрало больше 100000 просмотров за всё время?")
+        self.assertEqual(spec.filters, (MetricFilter('views', '>', 100000),))
+
+    def test_as_of(self):
+        spec = self.assertConfident("Сколько видео имели больше 10000 лайков на конец дня 27 ноября 2025?")
+        self.assertEqual(spec.as_of, date(2025, 11, 27))
+        self.assertEqual(spec.filters, (MetricFilter('likes', '>', 10000),))
+
+    def test_top_creators(self):
+        spec = self.assertConfident("Топ 10 креаторов по приросту просмотров с 1 по 5 ноября 2025")
+        self.assertEqual((spec.group_by, spec.order, spec.limit), ('creator_id', 'desc', 10))
+
+    def test_unsupported_goes_to_llm(self):
+        self.assertNotConfident("Какой процент видео набрал больше 1000 лайков?")
+
+class FastPathRegressionTest(CompilerTestCase):
+    """Формулировки, на которые быстрый путь раньше уверенно отвечал неверно"""
+
+    def period(self, question):
+        spec = self.assertConfident(question)
+        return spec.date_from, spec.date_to
+
+    def test_before(self):
+        self.assertEqual(self.period("Сколько видео вышло до 5 ноября 2025"), (None, date(2025, 11, 4)))
+        self.assertEqual(self.period("Сколько видео вышло раньше 5 ноября 2025?"), (None, date(2025, 11, 4)))
+        self.assertEqual(self.period("Сколько видео вышло не позже 5 ноября 2025?"), (None, date(2025, 11, 5)))
+
+    def test_after(self):
+        self.assertEqual(self.period("Сколько видео вышло после 5 ноября 2025"), (date(2025, 11, 6), None))
+        self.assertEqual(self.period("Сколько видео вышло позже 5 ноября 2025?"), (date(2025, 11, 6), None))
+
+    def test_since(self):
+        self.assertEqual(self.period("Сколько видео вышло начиная с 5 ноября 2025?"), (date(2025, 11, 5), None))
+        self.assertEqual(self.period("Сколько видео вышло с 5 ноября 2025?"), (date(2025, 11, 5), None))
+
+    def test_open_range_invalid_day(self):
+        self.assertNotConfident("Сколько видео вышло до 31 ноября 2025?")
+
+    def test_thousands(self):
+        spec = self.assertConfident("Сколько видео набрало больше 100 тысяч просмотров?")
+        self.assertEqual(spec.filters, (MetricFilter('views', '>', 100000),))
+        spec = self.assertConfident("Сколько видео набрало больше 100 тыс. просмотров?")
+        self.assertEqual(spec.filters, (MetricFilter('views', '>', 100000),))
+
+    def test_millions(self):
+        spec = self.assertConfident("Сколько видео набрало не менее 1,5 млн просмотров?")
+        self.assertEqual(spec.filters, (MetricFilter('views', '>=', 1500000),))
+
+    def test_negation(self):
+        self.assertNotConfident("Сколько разных видео не получили новых просмотров 28 ноября 2025?")
+        self.assertNotConfident("Сколько видео без лайков?")
+
+    def test_unparsed_entity(self):
+        # Раньше: счет по всем видео или фильтр только по первому id с уверенностью 1.0
+        for question in [
+            "Сколько видео у креатора abc?",
+            "Сколько лайков у видео abc?",
+            "Сколько видео у креаторов с id abc и id def?",
+            "Сколько видео у креатора с id abc и у креатора с id def?",
+        ]:
+            with self.subTest(question=question):
+                self.assertNotConfident(question)
+
+    def test_entity_with_id(self):
+        self.assertEqual(self.assertConfident("Сколько видео у креатора с id Abc-1?").creator_id, "Abc-1")
+        self.assertEqual(self.assertConfident("Сколько лайков у видео с id v_12?").video_id, "v_12")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from database.guard import QueryGuard, QueryRejected
+
+class QueryGuardValidateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.guard = QueryGuard(max_cost=1, max_rows=1, timeout_ms=1)
+
+    def assertAllowed(self, sql):
+        self.assertEqual(self.guard.validate(sql + ';'), sql)
+
+    def assertRejected(self, sql):
+        with self.assertRaises(QueryRejected, msg=sql):
+            self.guard.validate(sql)
+
+    def test_compiled_queries(self):
+        self.assertAllowed("SELECT COUNT(*) FROM videos WHERE creator_id = :creator_id")
+        self.assertAllowed(
+            "SELECT v.creator_id, COALESCE(SUM(s.delta_views_count), 0) AS views "
+            "FROM video_snapshots s JOIN videos v ON v.id = s.video_id GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT :limit")
+        self.assertAllowed("SELECT video_created_at::date AS day, COUNT(*) AS videos FROM videos GROUP BY 1 ORDER BY 1")
+        self.assertAllowed(
+            "SELECT COALESCE(SUM(c.views_count), 0) FROM videos v CROSS JOIN LATERAL "
+            "(SELECT views_count FROM video_daily_closing WHERE video_id = v.id AND day <= :as_of "
+            "ORDER BY day DESC LIMIT 1) c WHERE v.creator_id = :creator_id")
+
+    def test_aliases_and_subqueries(self):
+        self.assertAllowed(
+            "WITH t AS (SELECT video_id, SUM(delta_likes_count) AS d FROM video_snapshots GROUP BY 1) "
+            "SELECT COUNT(*) FROM t WHERE d > 10")
+        self.assertAllowed("SELECT COUNT(*) FROM (SELECT DISTINCT video_id FROM video_snapshots) AS x")
+        self.assertAllowed("SELECT COUNT(*) FROM videos v, video_snapshots s WHERE v.id = s.video_id")
+        self.assertAllowed("SELECT EXTRACT(epoch FROM created_at) FROM video_snapshots")
+
+    def test_statement_shape(self):
+        self.assertRejected("DELETE FROM videos")
+        self.assertRejected("SELECT 1; DROP TABLE videos")
+        self.assertRejected("SELECT COUNT(*) FROM videos -- comment")
+        self.assertRejected("SELECT pg_sleep(10) FROM videos")
+        self.assertRejected("SELECT COUNT(*) FROM ingest_state")
+
+    def test_catalog_tables_rejected_even_when_aliased(self):
+        for sql in [
+            "SELECT rolpassword AS pg_authid FROM pg_authid",
+            "SELECT rolpassword FROM pg_authid AS videos",
+            "SELECT count(*) pg_authid FROM pg_authid",
+            "SELECT * FROM videos pg_authid, pg_authid",
+            "SELECT passwd AS pg_shadow FROM pg_shadow",
+            "SELECT 1 AS pg_shadow, passwd FROM videos v JOIN video_snapshots s ON s.video_id = v.id, pg_shadow",
+            "SELECT 1 FROM videos LEFT JOIN pg_authid p ON true",
+            "SELECT 1 FROM videos v CROSS JOIN LATERAL pg_authid p",
+            "SELECT 1 FROM videos v CROSS JOIN LATERAL (SELECT rolpassword AS id FROM pg_authid) p",
+            "SELECT table_name AS information_schema FROM information_schema.tables",
+            "SELECT column_name AS columns FROM information_schema.columns AS videos",
+            "SELECT x FROM (SELECT rolpassword AS x FROM pg_authid) AS pg_authid",
+            "SELECT 1 AS pg_authid FROM videos WHERE id IN (SELECT rolname AS id FROM pg_authid)",
+            "WITH x AS (SELECT rolpassword AS r FROM pg_authid) SELECT r FROM x",
+        ]:
+            self.assertRejected(sql)
+
+if __name__ == '__main__':
+    unittest.main()
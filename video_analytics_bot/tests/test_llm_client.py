@@ -0,0 +1,137 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from openai import APIStatusError
+from nlp.llm_client import LLMClient
+
+MESSAGES = [{"role": "user", "content": "Сколько всего видео?"}]
+
+class StubServer:
+    """Chat completions API: заданные статусы по очереди (потом 200), задержка, учет одновременных запросов"""
+
+    def __init__(self, statuses=(), latency: float = 0.05, retry_after: str = None):
+        self.statuses = list(statuses)
+        self.latency = latency
+        self.retry_after = retry_after
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status != 200:
+            headers = {"Retry-After": self.retry_after} if self.retry_after else None
+            return web.json_response({"error": {"message": "stub"}}, status=status, headers=headers)
+        return web.json_response({
+            "id": f"stub-{self.requests}", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": body["messages"][-1]["content"]}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        })
+
+class LLMClientTest(unittest.IsolatedAsyncioTestCase):
+
+    async def start(self, stub: StubServer, **kwargs) -> LLMClient:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", stub.completions)
+        server = TestServer(app)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+        options = dict(api_key="test", model="stub", max_concurrency=4, timeout=5, max_retries=2,
+                       backoff_base=0.01, backoff_max=1)
+        options.update(kwargs)
+        client = LLMClient(base_url=str(server.make_url("/v1")), **options)
+        self.addAsyncCleanup(client.close)
+        return client
+
+    async def test_identical_requests_share_one_call(self):
+        stub = StubServer(latency=0.1)
+        client = await self.start(stub)
+        answers = await asyncio.gather(*(client.complete(MESSAGES) for _ in range(10)))
+        self.assertEqual(answers, ["Сколько всего видео?"] * 10)
+        self.assertEqual(stub.requests, 1)
+        self.assertEqual(client.stats["coalesced"], 9)
+        # После ответа запрос больше не "в полете": следующий идет в API
+        await client.complete(MESSAGES)
+        self.assertEqual(stub.requests, 2)
+
+    async def test_cancelled_waiter_does_not_cancel_shared_call(self):
+        stub = StubServer(latency=0.1)
+        client = await self.start(stub)
+        first = asyncio.create_task(client.complete(MESSAGES))
+        second = asyncio.create_task(client.complete(MESSAGES))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        self.assertEqual(await second, "Сколько всего видео?")
+        self.assertEqual(stub.requests, 1)
+
+    async def test_retries_429_then_succeeds(self):
+        stub = StubServer(statuses=[429])
+        client = await self.start(stub)
+        self.assertEqual(await client.complete(MESSAGES), "Сколько всего видео?")
+        self.assertEqual(stub.requests, 2)
+        self.assertEqual((client.stats["retries"], client.stats["errors"]), (1, 0))
+
+    async def test_retries_5xx_until_limit(self):
+        stub = StubServer(statuses=[503, 503, 503])
+        client = await self.start(stub, max_retries=2)
+        with self.assertRaises(APIStatusError):
+            await client.complete(MESSAGES)
+        self.assertEqual(stub.requests, 3)
+        self.assertEqual(client.stats["errors"], 1)
+
+    async def test_client_errors_are_not_retried(self):
+        stub = StubServer(statuses=[400])
+        client = await self.start(stub)
+        with self.assertRaises(APIStatusError):
+            await client.complete(MESSAGES)
+        self.assertEqual(stub.requests, 1)
+
+    async def test_retry_after_is_respected(self):
+        stub = StubServer(statuses=[429], latency=0, retry_after="0.3")
+        client = await self.start(stub)
+        started = time.perf_counter()
+        await client.complete(MESSAGES)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.3)
+
+    async def test_backoff_jitter_is_bounded(self):
+        client = await self.start(StubServer(), backoff_base=0.5, backoff_max=3)
+        error = RuntimeError()
+        for attempt, bound in [(0, 0.5), (1, 1.0), (2, 2.0), (5, 3.0)]:
+            delays = [client._backoff_delay(attempt, error) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= bound for delay in delays), (attempt, max(delays)))
+            # Полный jitter: задержки разные, а не одна и та же граница
+            self.assertGreater(len(set(delays)), 1)
+        with patch.object(LLMClient, "_retry_after", return_value=60.0):
+            self.assertEqual(client._backoff_delay(0, error), 3)
+
+    async def test_timeout(self):
+        stub = StubServer(latency=1.0)
+        client = await self.start(stub, timeout=0.1, max_retries=0)
+        started = time.perf_counter()
+        with self.assertRaises(asyncio.TimeoutError):
+            await client.complete(MESSAGES)
+        self.assertLess(time.perf_counter() - started, 0.9)
+        self.assertEqual(client.stats["errors"], 1)
+
+    async def test_concurrency_limit(self):
+        stub = StubServer(latency=0.05)
+        client = await self.start(stub, max_concurrency=3)
+        questions = [[{"role": "user", "content": f"вопрос {i}"}] for i in range(12)]
+        await asyncio.gather(*(client.complete(messages) for messages in questions))
+        self.assertEqual(stub.requests, 12)
+        self.assertEqual(stub.max_active, 3)
+
+if __name__ == '__main__':
+    unittest.main()
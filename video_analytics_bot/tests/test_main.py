@@ -0,0 +1,99 @@
+import socket
+import unittest
+from unittest.mock import AsyncMock, patch
+from asyncpg import exceptions as pg_errors
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from config import config
+from database.engine import is_connection_error
+from main import data_load_mode, message_questions, load_data_in_background
+from readiness import DataReadiness
+from nlp.fast_path import RuleBasedCompiler
+
+class DataLoadModeTest(unittest.TestCase):
+
+    def test_documented_values(self):
+        for value, mode in [("background", "background"), ("blocking", "blocking"), ("off", "off"),
+                            (" Off ", "off")]:
+            with self.subTest(value=value), patch.object(config, 'DATA_LOAD_ON_START', value):
+                self.assertEqual(data_load_mode(), mode)
+
+    def test_unknown_value_fails_startup(self):
+        # Раньше любое другое значение объявляло данные готовыми без загрузки
+        for value in ["backgroud", "true", "0", ""]:
+            with self.subTest(value=value), patch.object(config, 'DATA_LOAD_ON_START', value):
+                with self.assertRaises(RuntimeError):
+                    data_load_mode()
+
+class MessageQuestionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fast_path = RuleBasedCompiler(min_confidence=0.8)
+
+    def test_single_line(self):
+        self.assertEqual(message_questions("  Сколько всего видео есть в системе?\n", self.fast_path),
+                         ["Сколько всего видео есть в системе?"])
+
+    def test_list_items(self):
+        text = "1. Сколько всего видео?\n2) Что-то непонятное\n\n- Топ 10 видео по лайкам"
+        self.assertEqual(message_questions(text, self.fast_path),
+                         ["Сколько всего видео?", "Что-то непонятное", "Топ 10 видео по лайкам"])
+
+    def test_lines_parsed_confidently(self):
+        text = "Сколько всего видео есть в системе?\nСколько видео набрало больше 100000 просмотров за всё время?"
+        self.assertEqual(message_questions(text, self.fast_path), text.splitlines())
+        # Проверка строк не попадает в статистику быстрого пути
+        self.assertEqual(self.fast_path.stats["total"], 0)
+
+    def test_wrapped_question_is_one_question(self):
+        # Раньше каждая строка становилась отдельным (непонятным) вопросом пакета
+        for text in [
+            "Сколько видео у креатора с id abc123 вышло\nс 1 ноября 2025 по 5 ноября 2025 включительно?",
+            "Сколько всего видео есть в системе?\nи как это посчитать",
+            "1. Сколько всего видео?\nи сколько у них лайков",
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(message_questions(text, self.fast_path), [text])
+
+class LoadDataInBackgroundTest(unittest.IsolatedAsyncioTestCase):
+
+    async def load(self, *errors):
+        readiness = DataReadiness()
+        load_data = AsyncMock(side_effect=list(errors) + [None])
+        with patch('main.load_data', load_data):
+            await load_data_in_background(None, readiness, delay=0)
+        return readiness, load_data.await_count
+
+    async def test_retries_while_database_unavailable(self):
+        _, calls = await self.load(ConnectionRefusedError(111, "refused"), socket.gaierror(-2, "unknown host"))
+        self.assertEqual(calls, 3)
+
+    async def test_permanent_error_stops(self):
+        # Раньше битый файл данных повторялся бесконечно, а ошибка не выводилась
+        for error in [ValueError("Expecting value: line 1 column 1"), FileNotFoundError("data/videos.json"),
+                      ProgrammingError("CREATE TABLE", {}, Exception("syntax error"))]:
+            with self.subTest(error=type(error).__name__):
+                readiness, calls = await self.load(error)
+                self.assertEqual(calls, 1)
+                self.assertEqual(readiness.state, "failed")
+                self.assertTrue(readiness.error.startswith(type(error).__name__))
+
+class ConnectionErrorTest(unittest.TestCase):
+
+    def test_classification(self):
+        wrapped = OperationalError("SELECT 1", {}, Exception("wrapped"))
+        wrapped.__cause__ = pg_errors.CannotConnectNowError("the database system is starting up")
+        for error, expected in [
+            (ConnectionRefusedError(111, "refused"), True),
+            (socket.gaierror(-2, "unknown host"), True),
+            (TimeoutError(), True),
+            (pg_errors.TooManyConnectionsError("too many clients"), True),
+            (wrapped, True),
+            (FileNotFoundError("data/videos.json"), False),
+            (pg_errors.UndefinedTableError("relation does not exist"), False),
+            (ValueError("bad json"), False),
+        ]:
+            with self.subTest(error=error):
+                self.assertEqual(is_connection_error(error), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import json
+import tempfile
+import unittest
+from nlp.prompt_builder import ExampleLibrary, PromptBuilder, SEED_EXAMPLES, estimate_tokens
+from nlp.query_parser import NaturalLanguageParser
+from nlp.query_spec import QuerySpec
+from nlp.translation_cache import TranslationCache
+
+LLM_QUESTION = "Какой креатор набрал больше всего лайков 28 ноября 2025?"
+LLM_SPEC = {"aggregation": "max", "metric": "likes", "date_from": "2025-11-28", "date_to": "2025-11-28"}
+
+class FakeLLM:
+    """Клиент LLM с готовым ответом - вместо сети"""
+    model = 'test'
+
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    async def complete(self, **kwargs):
+        self.calls += 1
+        return self.content
+
+class PromptBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = PromptBuilder(ExampleLibrary(path=''), token_budget=700, max_examples=2)
+
+    def test_prompt_fits_budget(self):
+        for question, _ in SEED_EXAMPLES:
+            prompt = self.builder.build(question)
+            self.assertLessEqual(prompt.tokens, 700, question)
+            self.assertEqual(prompt.tokens, estimate_tokens(prompt.text))
+            self.assertTrue(1 <= len(prompt.examples) <= 2, question)
+
+    def test_most_similar_example_first(self):
+        prompt = self.builder.build("На сколько выросли лайки видео креатора с id x1 с 3 по 7 ноября 2025?")
+        self.assertEqual(prompt.examples[0].spec.table, 'video_snapshots')
+        self.assertIn('video_snapshots', prompt.tables)
+
+    def test_small_budget_drops_examples(self):
+        builder = PromptBuilder(self.builder.library, token_budget=100, max_examples=2)
+        prompt = builder.build("Сколько всего видео есть в системе?")
+        self.assertEqual(prompt.examples, [])
+
+class ExampleLibraryTest(unittest.TestCase):
+
+    def test_duplicate_template_not_added(self):
+        library = ExampleLibrary(path='')
+        spec = QuerySpec.from_dict(LLM_SPEC)
+        self.assertTrue(library.add(LLM_QUESTION, spec))
+        self.assertFalse(library.add(LLM_QUESTION.replace('28', '3'), spec))
+
+    def test_cap_per_shape(self):
+        library = ExampleLibrary(path='', per_shape=2)
+        spec = QuerySpec.from_dict(LLM_SPEC)
+        size = len(library)
+        added = [
+            library.add(question, spec) for question in (
+                "Какой креатор набрал больше всего лайков 28 ноября 2025?",
+                "У какого креатора больше всего лайков 28 ноября 2025?",
+                "Чей ролик собрал максимум лайков 28 ноября 2025?",
+            )
+        ]
+        self.assertEqual(added, [True, True, False])
+        self.assertEqual(len(library), size + 2)
+
+    def test_curated_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as f:
+            f.write(json.dumps({"question": LLM_QUESTION, "spec": LLM_SPEC}, ensure_ascii=False) + "\n")
+            f.write("не json\n")
+        try:
+            library = ExampleLibrary(path=f.name, per_shape=1)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(len(library), len(SEED_EXAMPLES) + 1)
+        # Проверенная вручную пара не занимает лимит пополнений своей формы
+        self.assertTrue(library.add("У какого креатора больше всего лайков 28 ноября 2025?", QuerySpec.from_dict(LLM_SPEC)))
+
+class LearningTest(unittest.IsolatedAsyncioTestCase):
+    """В библиотеку примеров попадают только выполненные ответы LLM"""
+
+    def parser(self, content):
+        return NaturalLanguageParser(
+            llm=FakeLLM(content), cache=TranslationCache(lambda query: {}, path=''),
+            prompts=PromptBuilder(ExampleLibrary(path='')),
+        )
+
+    async def test_fast_path_not_learned(self):
+        parser = self.parser('{}')
+        size = len(parser.prompts.library)
+        parsed = await parser.parse_query("Сколько видео вышло с 3 ноября 2025 по 9 ноября 2025?")
+        self.assertEqual(parsed.source, 'fast_path')
+        parser.confirm("Сколько видео вышло с 3 ноября 2025 по 9 ноября 2025?", parsed)
+        self.assertEqual(len(parser.prompts.library), size)
+
+    async def test_llm_learned_after_confirm(self):
+        parser = self.parser(json.dumps(LLM_SPEC))
+        size = len(parser.prompts.library)
+        parsed = await parser.parse_query(LLM_QUESTION)
+        self.assertEqual(parsed.source, 'llm')
+        self.assertEqual(len(parser.prompts.library), size)
+        parser.confirm(LLM_QUESTION, parsed)
+        self.assertEqual(len(parser.prompts.library), size + 1)
+
+        # Тот же вопрос второй раз - из кэша трансляций, повторно не добавляется
+        cached = await parser.parse_query(LLM_QUESTION)
+        self.assertEqual(cached.source, 'cache')
+        parser.confirm(LLM_QUESTION, cached)
+        self.assertEqual(len(parser.prompts.library), size + 1)
+
+    async def test_invalid_llm_answer_not_learned(self):
+        parser = self.parser('{"aggregation": "median"}')
+        size = len(parser.prompts.library)
+        parsed = await parser.parse_query(LLM_QUESTION)
+        self.assertNotEqual(parsed.source, 'llm')
+        parser.confirm(LLM_QUESTION, parsed)
+        self.assertEqual(len(parser.prompts.library), size)
+
+if __name__ == '__main__':
+    unittest.main()
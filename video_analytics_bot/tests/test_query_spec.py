@@ -0,0 +1,133 @@
+import unittest
+from datetime import date, datetime
+from nlp.query_spec import QuerySpec, QuerySpecError, compile_sql
+
+class QuerySpecValidationTest(unittest.TestCase):
+
+    def test_invalid(self):
+        for data in [
+            {"aggregation": "median", "metric": "views"},
+            {"aggregation": "count", "table": "pg_authid"},
+            {"aggregation": "sum", "metric": "shares"},
+            {"aggregation": "sum"},
+            {"aggregation": "count_distinct"},
+            {"aggregation": "count", "creator_id": "abc' OR 1=1 --"},
+            {"aggregation": "count", "video_id": "a b"},
+            {"aggregation": "sum", "table": "video_snapshots", "metric": "views", "as_of": "2025-11-27"},
+            {"aggregation": "count", "group_by": "month"},
+            {"aggregation": "count", "order": "desc"},
+            {"aggregation": "count", "limit": 10},
+            {"aggregation": "count", "group_by": "creator_id", "order": "random"},
+            {"aggregation": "count", "group_by": "creator_id", "limit": 0},
+            {"aggregation": "count", "group_by": "creator_id", "limit": True},
+            {"aggregation": "count", "group_by": "creator_id", "limit": "10"},
+            {"aggregation": "sum", "metric": "views", "as_of": "2025-11-27", "group_by": "creator_id"},
+            {"aggregation": "count", "date_from": "2025-11-05", "date_to": "2025-11-01"},
+            {"aggregation": "count", "date_from": "5 ноября"},
+            {"aggregation": "count", "filters": [{"metric": "views", "op": "<>", "value": 1}]},
+            {"aggregation": "count", "filters": [{"metric": "views", "op": ">", "value": "100"}]},
+            {"aggregation": "count", "filters": [{"metric": "views", "op": ">", "value": True}]},
+            {"aggregation": "count", "filters": [{"metric": "views", "op": ">"}]},
+            {"metric": "views"},
+            ["count"],
+        ]:
+            with self.subTest(data=data), self.assertRaises(QuerySpecError):
+                QuerySpec.from_dict(data)
+
+    def test_invalid_json(self):
+        with self.assertRaises(QuerySpecError):
+            QuerySpec.from_json('{"aggregation": "count"')
+
+    def test_valid(self):
+        for data in [
+            {"aggregation": "count"},
+            {"aggregation": "count_distinct", "table": "video_snapshots"},
+            {"aggregation": "sum", "metric": "views", "as_of": "2025-11-27", "group_by": "video_id", "limit": 5},
+            {"aggregation": "count", "group_by": "day"},
+            {"aggregation": "count", "date_from": "2025-11-01", "date_to": "2025-11-01"},
+        ]:
+            with self.subTest(data=data):
+                QuerySpec.from_dict(data)
+
+    def test_json_round_trip(self):
+        spec = QuerySpec.from_dict({
+            "aggregation": "sum", "table": "video_snapshots", "metric": "views", "creator_id": "abc",
+            "date_from": "2025-11-01", "date_to": "2025-11-05",
+            "filters": [{"metric": "likes", "op": ">=", "value": 10}],
+        })
+        self.assertEqual(QuerySpec.from_json(spec.to_json()), spec)
+
+class CompileSqlTest(unittest.TestCase):
+
+    def compile(self, **data):
+        return compile_sql(QuerySpec.from_dict(data))
+
+    def test_count_all(self):
+        self.assertEqual(self.compile(aggregation="count"), ("SELECT COUNT(*) FROM videos", {}))
+
+    def test_period_is_half_open_range_on_column(self):
+        sql, params = self.compile(aggregation="count", creator_id="abc", date_from="2025-11-01", date_to="2025-11-05")
+        self.assertEqual(sql, "SELECT COUNT(*) FROM videos WHERE creator_id = :creator_id "
+                              "AND video_created_at >= :date_from AND video_created_at < :date_to")
+        self.assertEqual(params, {'creator_id': 'abc', 'date_from': datetime(2025, 11, 1),
+                                  'date_to': datetime(2025, 11, 6)})
+
+    def test_open_ended_period(self):
+        sql, params = self.compile(aggregation="count", date_to="2025-11-04")
+        self.assertEqual(sql, "SELECT COUNT(*) FROM videos WHERE video_created_at < :date_to")
+        self.assertEqual(params, {'date_to': datetime(2025, 11, 5)})
+
+    def test_sum_of_deltas_uses_daily_rollup(self):
+        self.assertEqual(
+            self.compile(aggregation="sum", table="video_snapshots", metric="views",
+                         date_from="2025-11-28", date_to="2025-11-28"),
+            ("SELECT COALESCE(SUM(delta_views_count), 0) FROM snapshot_daily_stats WHERE day = :date_from",
+             {'date_from': date(2025, 11, 28)})
+        )
+
+    def test_distinct_videos_over_period_reads_snapshots(self):
+        # Число разных видео за несколько дней из дневных итогов не сложить
+        sql, params = self.compile(aggregation="count_distinct", table="video_snapshots", metric="likes",
+                                   date_from="2025-11-01", date_to="2025-11-05")
+        self.assertEqual(sql, "SELECT COUNT(DISTINCT video_id) FROM video_snapshots WHERE created_at >= :date_from "
+                              "AND created_at < :date_to AND delta_likes_count > 0")
+        self.assertEqual(params, {'date_from': datetime(2025, 11, 1), 'date_to': datetime(2025, 11, 6)})
+
+    def test_as_of_with_threshold(self):
+        sql, params = self.compile(aggregation="count", as_of="2025-11-27",
+                                   filters=[{"metric": "likes", "op": ">", "value": 10000}])
+        self.assertEqual(sql, "SELECT COUNT(*) FROM videos v CROSS JOIN LATERAL "
+                              "(SELECT views_count, likes_count, comments_count, reports_count "
+                              "FROM video_daily_closing WHERE video_id = v.id AND day <= :as_of "
+                              "ORDER BY day DESC LIMIT 1) c "
+                              "WHERE c.likes_count > :threshold_0")
+        self.assertEqual(params, {'as_of': date(2025, 11, 27), 'threshold_0': 10000})
+
+    def test_group_by_order_limit(self):
+        self.assertEqual(
+            self.compile(aggregation="sum", table="video_snapshots", metric="views", date_from="2025-11-01",
+                         group_by="creator_id", order="asc", limit=3),
+            ("SELECT creator_id, COALESCE(SUM(delta_views_count), 0) AS views FROM snapshot_daily_creator_stats "
+             "WHERE day >= :date_from GROUP BY 1 ORDER BY 2 ASC, 1 LIMIT :limit",
+             {'date_from': date(2025, 11, 1), 'limit': 3})
+        )
+        self.assertEqual(
+            self.compile(aggregation="sum", metric="likes", group_by="video_id", limit=10),
+            ("SELECT id AS video_id, COALESCE(SUM(likes_count), 0) AS likes FROM videos "
+             "GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT :limit", {'limit': 10})
+        )
+
+    def test_days_are_ordered_by_date(self):
+        sql, _ = self.compile(aggregation="count", group_by="day")
+        self.assertEqual(sql, "SELECT video_created_at::date AS day, COUNT(*) AS videos FROM videos "
+                              "GROUP BY 1 ORDER BY 1")
+
+    def test_values_only_in_params(self):
+        # Один текст запроса для разных значений: подходит для кэша планов и трансляций
+        first = self.compile(aggregation="count", creator_id="abc", filters=[{"metric": "views", "op": ">", "value": 1}])
+        second = self.compile(aggregation="count", creator_id="xyz", filters=[{"metric": "views", "op": ">", "value": 2}])
+        self.assertEqual(first[0], second[0])
+        self.assertNotIn("abc", first[0])
+
+if __name__ == '__main__':
+    unittest.main()
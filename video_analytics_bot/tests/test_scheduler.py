@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from scheduler import FairScheduler, FairSchedulerMiddleware, SchedulerFull
+
+class FairSchedulerTest(unittest.IsolatedAsyncioTestCase):
+
+    def scheduler(self, **kwargs) -> FairScheduler:
+        scheduler = FairScheduler(**kwargs)
+        self.addAsyncCleanup(scheduler.close)
+        return scheduler
+
+    def assertIdle(self, scheduler: FairScheduler):
+        self.assertEqual((scheduler.queues, scheduler.active), ({}, {}))
+        self.assertEqual((scheduler.queued, scheduler.running), (0, 0))
+
+    async def test_round_robin(self):
+        scheduler = self.scheduler(max_concurrency=1, max_depth=100, max_queued=100)
+        started = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def run():
+                started.append(name)
+                await gate.wait()
+                return name
+            return run
+
+        tasks = [asyncio.create_task(scheduler.submit("a", job(f"a{i}"))) for i in range(50)]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(scheduler.submit("b", job("b"))))
+        gate.set()
+        results = await asyncio.gather(*tasks)
+
+        self.assertEqual(results, [f"a{i}" for i in range(50)] + ["b"])
+        # Единственный вопрос b ждет не больше одного задания a, а не все пятьдесят
+        self.assertLessEqual(started.index("b"), 2)
+        self.assertEqual(started[0], "a0")
+        self.assertEqual(scheduler.stats["completed"], 51)
+        self.assertIdle(scheduler)
+
+    async def test_concurrency_limit(self):
+        scheduler = self.scheduler(max_concurrency=3, max_depth=100, max_queued=100)
+        active, peak = 0, 0
+
+        async def job():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        await asyncio.gather(*(scheduler.submit(i % 4, job) for i in range(20)))
+        self.assertEqual(peak, 3)
+        self.assertIdle(scheduler)
+
+    async def test_user_depth_counts_running(self):
+        scheduler = self.scheduler(max_concurrency=4, max_depth=2, max_queued=100)
+        gate = asyncio.Event()
+        tasks = [asyncio.create_task(scheduler.submit("a", gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        self.assertEqual((scheduler.running, scheduler.depth("a")), (2, 2))
+        # Оба задания уже выполняются, но место в очереди пользователя они занимают
+        with self.assertRaises(SchedulerFull):
+            await asyncio.wait_for(scheduler.submit("a", gate.wait), timeout=0.1)
+        # Другого пользователя лимит не касается
+        tasks.append(asyncio.create_task(scheduler.submit("b", gate.wait)))
+        gate.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(scheduler.stats["rejected"], 1)
+        self.assertIdle(scheduler)
+
+    async def test_global_queue_limit(self):
+        scheduler = self.scheduler(max_concurrency=1, max_depth=10, max_queued=2)
+        gate = asyncio.Event()
+        tasks = [asyncio.create_task(scheduler.submit("a", gate.wait))]
+        await asyncio.sleep(0.01)
+        tasks += [asyncio.create_task(scheduler.submit(user, gate.wait)) for user in ("b", "c")]
+        await asyncio.sleep(0.01)
+        self.assertEqual((scheduler.running, scheduler.queued), (1, 2))
+        with self.assertRaises(SchedulerFull):
+            await asyncio.wait_for(scheduler.submit("d", gate.wait), timeout=0.1)
+        gate.set()
+        await asyncio.gather(*tasks)
+        self.assertIdle(scheduler)
+
+    async def test_cancelled_waiter_releases_place(self):
+        scheduler = self.scheduler(max_concurrency=1, max_depth=1, max_queued=1)
+        gate = asyncio.Event()
+        ran = []
+
+        async def job(name):
+            ran.append(name)
+            await gate.wait()
+
+        running = asyncio.create_task(scheduler.submit("a", lambda: job("a")))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(scheduler.submit("b", lambda: job("b")))
+        await asyncio.sleep(0.01)
+        self.assertEqual((scheduler.queued, scheduler.depth("b")), (1, 1))
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        self.assertEqual((scheduler.queued, scheduler.depth("b")), (0, 0))
+        self.assertNotIn("b", scheduler.active)
+        # Место сразу свободно: и в общей очереди, и у пользователя
+        retry = asyncio.create_task(scheduler.submit("b", lambda: job("b2")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(running, retry)
+        self.assertEqual(ran, ["a", "b2"])
+        self.assertIdle(scheduler)
+
+    async def test_failed_job(self):
+        scheduler = self.scheduler(max_concurrency=1, max_depth=2, max_queued=2)
+
+        async def job():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            await scheduler.submit("a", job)
+        self.assertEqual(scheduler.stats["failed"], 1)
+        self.assertIdle(scheduler)
+
+class FairSchedulerMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_full_queue_answers_user(self):
+        scheduler = FairScheduler(max_concurrency=1, max_depth=1, max_queued=10)
+        self.addAsyncCleanup(scheduler.close)
+        middleware = FairSchedulerMiddleware(scheduler)
+        gate = asyncio.Event()
+
+        async def handler(event, data):
+            await gate.wait()
+            return "answered"
+
+        def message():
+            return SimpleNamespace(from_user=SimpleNamespace(id=1), answer=AsyncMock())
+
+        data = {"handler": SimpleNamespace(flags={"fair_queue": True})}
+        first = asyncio.create_task(middleware(handler, message(), data))
+        await asyncio.sleep(0.01)
+        second = message()
+        self.assertIsNone(await middleware(handler, second, data))
+        second.answer.assert_awaited_once()
+        gate.set()
+        self.assertEqual(await first, "answered")
+
+    async def test_unflagged_handler_bypasses_queue(self):
+        scheduler = FairScheduler(max_concurrency=1, max_depth=1, max_queued=1)
+        self.addAsyncCleanup(scheduler.close)
+        handler = AsyncMock(return_value="help")
+        result = await FairSchedulerMiddleware(scheduler)(handler, SimpleNamespace(from_user=None), {})
+        self.assertEqual(result, "help")
+        self.assertEqual(scheduler.stats["submitted"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
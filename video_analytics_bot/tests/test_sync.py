@@ -0,0 +1,107 @@
+import os
+import unittest
+from datetime import date
+from sqlalchemy import text
+from database.init_db import DatabaseInitializer
+from database.sync import IncrementalSync
+from nlp.query_spec import QuerySpec, compile_sql
+from tests.db import requires_db, create_test_engine, reset_schema, video, write_dump
+
+@requires_db
+class IncrementalSyncTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_test_engine()
+        await reset_schema(self.engine)
+        await DatabaseInitializer(self.engine).create_tables()
+        self.path = None
+
+    async def asyncTearDown(self):
+        if self.path:
+            os.remove(self.path)
+        await self.engine.dispose()
+
+    async def sync(self, videos):
+        if self.path:
+            os.remove(self.path)
+        self.path = write_dump(videos)
+        return await IncrementalSync(self.engine, self.path).run(force=True)
+
+    async def scalar(self, sql, **params):
+        async with self.engine.connect() as conn:
+            return (await conn.execute(text(sql), params)).scalar()
+
+    async def snapshots(self, video_id):
+        return await self.scalar("SELECT count(*) FROM video_snapshots WHERE video_id = :video_id", video_id=video_id)
+
+    async def test_new_video_with_older_snapshots(self):
+        await self.sync([video('v1', '2025-11-20T10')])
+        # Новое видео со снапшотами старше всех снапшотов в базе
+        stats = await self.sync([video('v1', '2025-11-20T10'), video('v2', '2025-11-05T10', snapshots=3)])
+        self.assertEqual(stats['videos'], 1)
+        self.assertEqual(stats['snapshots'], 3)
+        self.assertEqual(await self.snapshots('v2'), 3)
+        views = await self.scalar(
+            "SELECT delta_views_count FROM snapshot_daily_stats WHERE day = :day", day=date(2025, 11, 5)
+        )
+        self.assertEqual(views, 30)
+
+    async def test_only_newer_snapshots_of_known_video(self):
+        await self.sync([video('v1', '2025-11-20T10', snapshots=2)])
+        stats = await self.sync([video('v1', '2025-11-20T10', snapshots=4)])
+        self.assertEqual(stats['snapshots'], 2)
+        self.assertEqual(await self.snapshots('v1'), 4)
+
+    async def test_reexported_snapshot_keeps_its_id_unique(self):
+        await self.sync([video('v1', '2025-11-20T10', snapshots=2)])
+        # Та же выгрузка с исправленным (более поздним) created_at снапшота и повтором id в пачке
+        corrected = video('v1', '2025-11-20T10', snapshots=2)
+        corrected['snapshots'][1]['created_at'] = '2025-11-21T09:00:00+00:00'
+        v2 = video('v2', '2025-11-22T10', snapshots=3)
+        v2['snapshots'][2]['id'] = 'v2_1'
+        stats = await self.sync([corrected, v2])
+        self.assertEqual(stats['snapshots'], 2)
+        self.assertEqual(await self.snapshots('v1'), 2)
+        self.assertEqual(await self.snapshots('v2'), 2)
+        self.assertEqual(await self.scalar("SELECT count(*) - count(DISTINCT id) FROM video_snapshots"), 0)
+        # Итоги не считают снапшот дважды
+        self.assertEqual(await self.scalar("SELECT sum(delta_views_count) FROM snapshot_daily_stats"), 40)
+
+    async def views_as_of(self, day):
+        sql, params = compile_sql(QuerySpec.from_dict({"aggregation": "sum", "metric": "views", "as_of": day}))
+        return await self.scalar(sql, **params)
+
+    async def test_closing_only_on_change_days(self):
+        await self.sync([video('v1', '2025-11-05T10'), video('v2', '2025-11-10T10', snapshots=3)])
+        # Новый снапшот v1 через неделю: меняется только строка его дня
+        v1 = video('v1', '2025-11-05T10')
+        v1['snapshots'].append({**v1['snapshots'][-1], "id": "v1_9", "views_count": 50,
+                                "created_at": '2025-11-12T09:00:00+00:00'})
+        await self.sync([v1, video('v2', '2025-11-10T10', snapshots=3)])
+        self.assertEqual(await self.scalar("SELECT count(*) FROM video_daily_closing"), 3)
+        # До первого снапшота видео не считается, после - последнее значение не позже даты
+        self.assertEqual(await self.views_as_of('2025-11-04'), 0)
+        self.assertEqual(await self.views_as_of('2025-11-07'), 20)
+        self.assertEqual(await self.views_as_of('2025-11-11'), 50)
+        self.assertEqual(await self.views_as_of('2025-12-31'), 80)
+
+    async def test_dense_closing_rebuilt(self):
+        # Таблица прежнего вида: строка за каждый день, ключ (day, video_id)
+        await reset_schema(self.engine)
+        async with self.engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE video_daily_closing (day date, video_id varchar, views_count bigint, "
+                "likes_count bigint, comments_count bigint, reports_count bigint, PRIMARY KEY (day, video_id))"
+            ))
+        await DatabaseInitializer(self.engine).create_tables()
+        key = await self.scalar(
+            "SELECT a.attname FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0] "
+            "WHERE i.indrelid = 'video_daily_closing'::regclass AND i.indisprimary"
+        )
+        self.assertEqual(key, 'video_id')
+        await self.sync([video('v1', '2025-11-05T10')])
+        self.assertEqual(await self.scalar("SELECT count(*) FROM video_daily_closing"), 1)
+        self.assertEqual(await self.views_as_of('2025-11-20'), 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime
+import pytz
+from database.timestamps import TimestampDecoder
+
+def parse_datetime(dt_str: str) -> datetime:
+    """Эталон: DatabaseInitializer.parse_datetime до перехода на TimestampDecoder"""
+    if not dt_str:
+        return datetime.utcnow()
+
+    try:
+        # Различные форматы дат
+        formats = [
+            '%Y-%m-%dT%H:%M:%S.%f%z',  # 2025-11-26T11:00:08.983295+00:00
+            '%Y-%m-%dT%H:%M:%S%z',     # 2025-08-19T08:54:35+00:00
+            '%Y-%m-%dT%H:%M:%S.%f',    # 2025-11-26T11:00:08.983295
+            '%Y-%m-%dT%H:%M:%S',       # 2025-11-26T11:00:09
+            '%Y-%m-%d %H:%M:%S',       # 2025-11-26 11:00:09
+        ]
+
+        for fmt in formats:
+            try:
+                dt = datetime.strptime(dt_str, fmt)
+                # Если есть информация о временной зоне, конвертируем в UTC
+                if dt.tzinfo is not None:
+                    dt = dt.astimezone(pytz.UTC).replace(tzinfo=None)
+                return dt
+            except ValueError:
+                continue
+
+        # Если ни один формат не подошел, возвращаем текущее время
+        print(f"⚠️ Не удалось распарсить дату: {dt_str}")
+        return datetime.utcnow()
+
+    except Exception as e:
+        print(f"⚠️ Ошибка парсинга даты '{dt_str}': {e}")
+        return datetime.utcnow()
+
+VALID = [
+    '2025-11-26T11:00:08.983295+00:00',
+    '2025-08-19T08:54:35+00:00',
+    '2025-11-26T11:00:08.983295',
+    '2025-11-26T11:00:09',
+    '2025-11-26 11:00:09',
+    # Смещения кроме +00:00 (в том числе через границу суток и без двоеточия)
+    '2025-11-26T01:30:00+03:00',
+    '2025-11-26T22:15:00.5-05:30',
+    '2025-12-31T23:59:59+14:00',
+    '2025-01-01T00:00:00-12:00',
+    '2025-11-26T11:00:09+0300',
+    '2025-11-26T11:00:09+03:00:30',
+    # Z
+    '2025-11-26T11:00:09Z',
+    '2025-11-26T11:00:09.123Z',
+    # Доли секунды из 1-6 цифр
+    '2025-11-26T11:00:09.1',
+    '2025-11-26T11:00:09.12',
+    '2025-11-26T11:00:09.123',
+    '2025-11-26T11:00:09.1234',
+    '2025-11-26T11:00:09.12345',
+    '2025-11-26T11:00:09.12345+02:00',
+    '2025-11-26T11:00:09.000001+00:00',
+]
+
+EMPTY = ['', None, 0]
+
+INVALID = [
+    'not a date',
+    '2025-11-26',
+    '2025-13-01T00:00:00',
+    '2025-02-30T00:00:00+00:00',
+    '2025-11-26T25:00:00',
+    '2025-11-26t11:00:09',
+    '2025-11-26 11:00:09.5',
+    '2025-11-26 11:00:09+00:00',
+    '2025-11-26T11:00:09.1234567',
+    '2025-11-26T11:00:09+25:00',
+    ' 2025-11-26T11:00:09',
+    '2025-11-26T11:00:09 ',
+    20251126,
+]
+
+class TimestampDecoderGoldenTest(unittest.TestCase):
+    """TimestampDecoder дает то же, что прежний parse_datetime, и печатает те же предупреждения
+
+    Для пустых и нераспознанных значений оба возвращают текущее время: сравнивается
+    не само значение, а то, что оно попадает в интервал вызова.
+    """
+
+    def run_both(self, values):
+        """(эталон, вывод эталона, decode, вывод decode, decode_many, вывод decode_many, начало, конец)"""
+        start = datetime.utcnow()
+        results = []
+        for convert in (
+            lambda: [parse_datetime(v) for v in values],
+            lambda: [TimestampDecoder().decode(v) for v in values],
+            lambda: TimestampDecoder().decode_many(values),
+        ):
+            out = io.StringIO()
+            with redirect_stdout(out):
+                results += [convert(), out.getvalue()]
+        return results + [start, datetime.utcnow()]
+
+    def assertSameAsReference(self, values):
+        expected, expected_out, decoded, decoded_out, many, many_out, start, end = self.run_both(values)
+        self.assertEqual(decoded_out, expected_out)
+        self.assertEqual(many_out, expected_out)
+        for value, want, got, got_many in zip(values, expected, decoded, many):
+            with self.subTest(value=value):
+                if start <= want <= end:
+                    self.assertTrue(start <= got <= end, got)
+                    self.assertTrue(start <= got_many <= end, got_many)
+                else:
+                    self.assertEqual(got, want)
+                    self.assertEqual(got_many, want)
+                    self.assertIsNone(got.tzinfo)
+
+    def test_valid(self):
+        self.assertSameAsReference(VALID)
+
+    def test_empty(self):
+        self.assertSameAsReference(EMPTY)
+
+    def test_invalid(self):
+        self.assertSameAsReference(INVALID)
+
+    def test_one_decoder_for_mixed_column(self):
+        # Один экземпляр на файл: кэш последнего значения и перестановка форматов не меняют результат
+        values = []
+        for value in VALID + INVALID + EMPTY:
+            values += [value, value, VALID[0]]
+        decoder = TimestampDecoder()
+        start = datetime.utcnow()
+        with redirect_stdout(io.StringIO()):
+            expected = [parse_datetime(v) for v in values]
+            single = [decoder.decode(v) for v in values]
+            many = TimestampDecoder().decode_many(values)
+        end = datetime.utcnow()
+        for value, want, got, got_many in zip(values, expected, single, many):
+            with self.subTest(value=value):
+                if start <= want <= end:
+                    self.assertTrue(start <= got <= end and start <= got_many <= end)
+                else:
+                    self.assertEqual((got, got_many), (want, want))
+
+if __name__ == '__main__':
+    unittest.main()
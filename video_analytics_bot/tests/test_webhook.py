@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot, Dispatcher
+from webhook import BoundedRequestHandler
+
+def update(update_id: int) -> dict:
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "вопрос"}}
+
+class BoundedRequestHandlerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+        self.handled = []
+        dispatcher = Dispatcher()
+
+        @dispatcher.message()
+        async def slow(message):
+            await self.release.wait()
+            self.handled.append(message.message_id)
+
+        self.bot = Bot("42:TEST")
+        self.handler = BoundedRequestHandler(dispatcher, self.bot, max_concurrency=2, secret_token="secret")
+        app = web.Application()
+        self.handler.register(app, path="/webhook")
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        self.release.set()
+        await self.client.close()
+
+    async def post(self, update_id: int, secret: str = "secret") -> int:
+        response = await self.client.post("/webhook", json=update(update_id),
+                                          headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+        return response.status
+
+    async def test_rejects_over_limit_without_queueing(self):
+        self.assertEqual([await self.post(i) for i in range(1, 6)], [200, 200, 429, 429, 429])
+        self.assertEqual(self.handler.in_flight, 2)
+        self.assertEqual(self.handler.rejected, 3)
+
+        self.release.set()
+        await asyncio.gather(*self.handler.tasks)
+        self.assertEqual(sorted(self.handled), [1, 2])
+        # Освободившиеся места снова принимают обновления (повтор от Telegram)
+        self.assertEqual(await self.post(3), 200)
+        await asyncio.gather(*self.handler.tasks)
+        self.assertEqual(self.handler.in_flight, 0)
+
+    async def test_secret(self):
+        self.assertEqual(await self.post(1, secret="wrong"), 401)
+        self.assertEqual(self.handler.in_flight, 0)
+
+    async def test_drain(self):
+        self.assertEqual(await self.post(1), 200)
+        drain = asyncio.create_task(self.handler.drain(timeout=5))
+        await asyncio.sleep(0)
+        self.assertEqual(await self.post(2), 503)
+        self.release.set()
+        self.assertTrue(await drain)
+        self.assertEqual(self.handled, [1])
+
+if __name__ == '__main__':
+    unittest.main()
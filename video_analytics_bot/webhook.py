@@ -0,0 +1,154 @@
+import signal
+import asyncio
+import logging
+from typing import Any, Dict, Set
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Прием обновлений Telegram по вебхуку
+
+    Telegram сразу получает 200, обновление обрабатывается в фоне. Пока в работе
+    max_concurrency обновлений, новые получают 429 еще до создания задачи:
+    Telegram повторит их позже, а очередь в памяти не растет. При остановке
+    новые обновления получают 503 (Telegram повторит их, возможно на другой
+    реплике), а начатые дорабатываются - см. drain().
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int = None, **kwargs: Any):
+        super().__init__(dispatcher, bot, **kwargs)
+        self.max_concurrency = max_concurrency or config.WEBHOOK_MAX_CONCURRENCY
+        self.tasks: Set[asyncio.Task] = set()
+        self.draining = False
+        self.rejected = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503, text="draining")
+        # Проверка и до чтения тела (перегруженная реплика его не разбирает), и после: между ними await
+        if self.in_flight >= self.max_concurrency:
+            return self._busy()
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(status=401, text="Unauthorized")
+        update = await request.json(loads=bot.session.json_loads)
+        if self.in_flight >= self.max_concurrency:
+            return self._busy()
+        task = asyncio.create_task(self.process(bot, update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def process(self, bot: Bot, update: Dict[str, Any]):
+        """Обработка одного обновления; ответ-метод обработчика отправляется отдельным запросом"""
+        try:
+            result = await self.dispatcher.feed_raw_update(bot, update, **self.data)
+            if isinstance(result, TelegramMethod):
+                await self.dispatcher.silent_call_request(bot, result)
+        except Exception as e:
+            logger.error(f"Error processing webhook update: {type(e).__name__}: {e}")
+
+    def _busy(self) -> web.Response:
+        self.rejected += 1
+        return web.Response(status=429, text="busy")
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.tasks)
+
+    async def drain(self, timeout: float = None) -> bool:
+        """Перестать принимать обновления и дождаться начатых; False - не успели за timeout"""
+        self.draining = True
+        tasks = set(self.tasks)
+        if not tasks:
+            return True
+        print(f"⏳ Дорабатываю {len(tasks)} обновлений...")
+        done, pending = await asyncio.wait(tasks, timeout=timeout or config.WEBHOOK_DRAIN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        return not pending
+
+def pool_status(engine: AsyncEngine) -> Dict[str, int]:
+    pool = engine.pool
+    return {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": pool.overflow()}
+
+def create_webhook_app(bot: Bot, dispatcher: Dispatcher, engine: AsyncEngine) -> web.Application:
+    """aiohttp-приложение: POST WEBHOOK_PATH, /healthz (процесс жив) и /readyz (готов принимать)
+
+    Пока данные загружаются при старте (readiness в workflow data диспетчера),
+    /readyz отвечает 503: балансировщик не шлет вопросы реплике без данных.
+    """
+    app = web.Application()
+    handler = BoundedRequestHandler(dispatcher, bot, secret_token=config.WEBHOOK_SECRET or None)
+    handler.register(app, path=config.WEBHOOK_PATH)
+    app["webhook_handler"] = handler
+    readiness = dispatcher.get("readiness")
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def readyz(request: web.Request) -> web.Response:
+        # Готовность: не идет остановка и пул отдает рабочее соединение
+        status = {"draining": handler.draining, "in_flight": handler.in_flight, "rejected": handler.rejected,
+                  "pool": pool_status(engine)}
+        if readiness:
+            status.update(readiness.status())
+        if handler.draining:
+            return web.json_response({"status": "draining", **status}, status=503)
+        if readiness and not readiness.is_ready:
+            return web.json_response({"status": "loading", **status}, status=503)
+        try:
+            async with engine.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=2)
+        except Exception as e:
+            return web.json_response({"status": "db_unavailable", "error": str(e), **status}, status=503)
+        return web.json_response({"status": "ready", **status})
+
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+async def run_webhook(bot: Bot, dispatcher: Dispatcher, engine: AsyncEngine):
+    """Работа в режиме вебхука до SIGTERM/SIGINT, затем плавная остановка
+
+    Вебхук при остановке не удаляется: с тем же URL продолжают работать другие реплики.
+    """
+    app = create_webhook_app(bot, dispatcher, engine)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT).start()
+    print(f"🌐 Вебхук слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+
+    if config.WEBHOOK_URL:
+        await bot.set_webhook(
+            config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET or None,
+            max_connections=min(100, config.WEBHOOK_MAX_CONCURRENCY),
+        )
+        print(f"✅ Вебхук зарегистрирован: {config.WEBHOOK_URL}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: останавливается через KeyboardInterrupt
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        print("🛑 Останавливаю вебхук...")
+        drained = await app["webhook_handler"].drain()
+        if not drained:
+            logger.warning("Webhook drain timed out, unfinished updates were cancelled")
+        await runner.cleanup()